@@ -0,0 +1,138 @@
+"""
+Benchmark: /clientes/all completo vs /clientes/buscar con el indice de prefijos.
+
+Requiere un MongoDB accesible (MONGODB_URL, por defecto localhost). Usa una
+base aparte que se llena con clientes sinteticos (con adeudos) y se borra al
+final:
+    python benchmarks/bench_buscar_clientes.py --clientes 100000
+
+Mide, por peticion, la descarga completa que hacen hoy las terminales
+(find + clientes_schema + serializar con response_model) contra la busqueda
+por prefijo con proyeccion y limite, e imprime el plan de cada busqueda para
+confirmar que usa IXSCAN sobre `busqueda`.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bson import Decimal128  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from pymongo import AsyncMongoClient  # noqa: E402
+
+from core.busqueda import CAMPO_ORDEN, campos_busqueda, filtro_busqueda  # noqa: E402
+from core.indices import INDICES, _etapas  # noqa: E402
+from models.cliente import Cliente, ClienteResumen  # noqa: E402
+from schemas.cliente import CAMPOS_RESUMEN, cliente_resumen_schema, clientes_schema  # noqa: E402
+
+NOMBRES = ["José", "María", "Juan", "Ana", "Luis", "Sofía", "Carlos", "Lucía", "Jorge", "Andrea", "Iván", "Martín"]
+APELLIDOS = ["Pérez", "Gómez", "Núñez", "López", "Hernández", "García", "Martínez", "Ramírez", "Sánchez", "Díaz"]
+CONSULTAS = ["jose", "maria lo", "nunez", "perez g", "662", "xaxx", "lucia ram", "zzz"]
+
+lista_clientes = TypeAdapter(list[Cliente])
+lista_resumen = TypeAdapter(list[ClienteResumen])
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def resumen(nombre: str, latencias: list[float], extra: str = "") -> None:
+    print(
+        f"{nombre:<26} p50={percentil(latencias, 50):9.2f} ms  "
+        f"p99={percentil(latencias, 99):9.2f} ms  media={statistics.fmean(latencias):9.2f} ms  {extra}"
+    )
+
+
+def cliente_sintetico(i: int, rnd: random.Random) -> dict:
+    nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+    cliente = {
+        "nombre": nombre,
+        "correo": f"cliente{i}@correo.com" if i % 3 else None,
+        "telefono": 6620000000 + i if i % 2 else None,
+        "razon_social": f"{nombre.upper()} SA DE CV" if i % 5 == 0 else None,
+        "rfc": f"XAXX{i:09d}",
+        "regimen_fiscal": "616",
+        "codigo_postal": 83000,
+        "direccion": "Calle Falsa",
+        "no_ext": i % 300,
+        "no_int": None,
+        "colonia": "Centro",
+        "localidad": "Hermosillo",
+        "adeudos": [
+            {"venta_id": f"{i:024x}", "monto_pendiente": Decimal128("150.00")} for _ in range(i % 3)
+        ],
+        "protegido": False,
+        "activo": True,
+    }
+    cliente.update(campos_busqueda(cliente))
+    return cliente
+
+
+async def main(args):
+    cliente_mongo = AsyncMongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    coleccion = cliente_mongo[args.db].clientes
+    try:
+        await coleccion.drop()
+        rnd = random.Random(7)
+        inicio = time.perf_counter()
+        for desde in range(0, args.clientes, 10000):
+            await coleccion.insert_many(
+                [cliente_sintetico(i, rnd) for i in range(desde, min(desde + 10000, args.clientes))]
+            )
+        await coleccion.create_indexes(INDICES["clientes"])
+        print(f"{args.clientes} clientes sembrados en {time.perf_counter() - inicio:.1f} s")
+
+        tamano = {}
+
+        async def lista_completa():
+            datos = clientes_schema(await coleccion.find().to_list())
+            tamano["all"] = len(lista_clientes.dump_json(lista_clientes.validate_python(datos)))
+
+        latencias = []
+        for _ in range(args.repeticiones_all):
+            inicio = time.perf_counter()
+            await lista_completa()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        resumen("/clientes/all", latencias, f"{tamano['all'] / 1024 / 1024:.1f} MB")
+
+        proyeccion = {campo: 1 for campo in CAMPOS_RESUMEN}
+        orden = [(CAMPO_ORDEN, 1), ("_id", 1)]
+        for q in CONSULTAS:
+            filtro = filtro_busqueda(q)
+            latencias = []
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                clientes = await coleccion.find(filtro, proyeccion).sort(orden).limit(args.limite).to_list()
+                cuerpo = lista_resumen.dump_json(lista_resumen.validate_python([cliente_resumen_schema(c) for c in clientes]))
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            plan = await coleccion.find(filtro, proyeccion).sort(orden).limit(args.limite).explain()
+            etapas = " > ".join(_etapas(plan.get("queryPlanner", {}).get("winningPlan", {})))
+            stats = plan.get("executionStats", {})
+            resumen(
+                f"/clientes/buscar q={q!r}", latencias,
+                f"{len(clientes)} res, {len(cuerpo)} B, {etapas}, "
+                f"claves={stats.get('totalKeysExamined', '?')} docs={stats.get('totalDocsExamined', '?')}",
+            )
+    finally:
+        if not args.conservar:
+            await cliente_mongo.drop_database(args.db)
+        await cliente_mongo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--repeticiones-all", type=int, default=5, help="La lista completa es lenta; menos repeticiones")
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--db", default="pbstation_bench")
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de prueba al terminar")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""
+Benchmark: lista y busqueda de productos desde Mongo vs catalogo en memoria.
+
+Requiere un MongoDB accesible (MONGODB_URL, por defecto localhost). Usa una
+base aparte que se llena con productos sinteticos y se borra al final:
+    python benchmarks/bench_catalogo_productos.py --productos 2000
+
+Compara, por peticion:
+- lista actual: productos_schema(find().to_list()) + serializar con response_model
+- lista catalogo: JSON ya armado en core.catalogo_productos
+- por id: find_one + producto_schema vs diccionario en memoria
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bson import Decimal128, ObjectId  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from pymongo import AsyncMongoClient  # noqa: E402
+
+from core.catalogo_productos import CatalogoProductos  # noqa: E402
+from models.producto import Producto  # noqa: E402
+from schemas.producto import producto_schema, productos_schema  # noqa: E402
+
+lista_productos = TypeAdapter(list[Producto])
+
+
+def percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def resumen(nombre: str, latencias: list[float]) -> None:
+    print(
+        f"{nombre:<24} n={len(latencias):<5} "
+        f"p50={percentil(latencias, 50):9.3f} ms  "
+        f"p99={percentil(latencias, 99):9.3f} ms  "
+        f"media={statistics.fmean(latencias):9.3f} ms"
+    )
+
+
+async def medir(funcion, repeticiones: int) -> list[float]:
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        await funcion()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+async def main(args):
+    cliente = AsyncMongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    coleccion = cliente[args.db].productos
+    try:
+        await coleccion.drop()
+        await coleccion.insert_many([
+            {
+                "codigo": i,
+                "descripcion": f"Producto de prueba {i}",
+                "unidad_sat": "H87",
+                "clave_sat": "82121500",
+                "precio": Decimal128(f"{i % 500}.50"),
+                "inventariable": False,
+                "imprimible": i % 2 == 0,
+                "valor_impresion": i % 10,
+                "requiere_medida": False,
+            }
+            for i in range(args.productos)
+        ])
+        ids = [str(d["_id"]) for d in await coleccion.find({}, {"_id": 1}).to_list()]
+
+        catalogo = CatalogoProductos(coleccion)
+        inicio = time.perf_counter()
+        await catalogo.cargar()
+        print(f"Carga inicial de {args.productos} productos: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        async def lista_actual():
+            datos = productos_schema(await coleccion.find().to_list())
+            return lista_productos.dump_json(lista_productos.validate_python(datos))
+
+        async def lista_catalogo():
+            return catalogo.json()
+
+        async def por_id_actual():
+            for producto_id in ids[:args.busquedas]:
+                producto_schema(await coleccion.find_one({"_id": ObjectId(producto_id)}))
+
+        async def por_id_catalogo():
+            for producto_id in ids[:args.busquedas]:
+                catalogo.obtener(producto_id)
+
+        assert await lista_actual() == await lista_catalogo()
+
+        resumen("/productos/all actual", await medir(lista_actual, args.repeticiones))
+        resumen("/productos/all catalogo", await medir(lista_catalogo, args.repeticiones))
+        resumen(f"{args.busquedas} por id actual", await medir(por_id_actual, args.repeticiones))
+        resumen(f"{args.busquedas} por id catalogo", await medir(por_id_catalogo, args.repeticiones))
+    finally:
+        if not args.conservar:
+            await cliente.drop_database(args.db)
+        await cliente.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--busquedas", type=int, default=10, help="Productos buscados por id en cada repeticion")
+    parser.add_argument("--db", default="pbstation_bench")
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de prueba al terminar")
+    asyncio.run(main(parser.parse_args()))
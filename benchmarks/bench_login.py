@@ -0,0 +1,95 @@
+"""
+Benchmark: latencia de un endpoint ajeno (/helloworld) mientras hay logins en curso.
+
+Requiere el servidor corriendo y un usuario valido:
+    uvicorn main:app --port 8000
+    python benchmarks/bench_login.py --url http://127.0.0.1:8000 --correo admin --psw <password>
+
+Primero mide la latencia base de /helloworld y despues la misma medicion con
+--logins peticiones de login concurrentes. Con bcrypt en el event loop el p99
+crece ~250 ms por cada login en cola; con el pool de hashing debe quedarse cerca
+de la base.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def medir_latencias(url: str, detener: threading.Event, intervalo: float) -> list[float]:
+    latencias = []
+    with requests.Session() as s:
+        while not detener.is_set():
+            inicio = time.perf_counter()
+            s.get(f"{url}/helloworld", timeout=30)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            time.sleep(intervalo)
+    return latencias
+
+
+def login(url: str, correo: str, psw: str) -> float:
+    inicio = time.perf_counter()
+    r = requests.post(f"{url}/login", json={"correo": correo, "psw": psw}, timeout=60)
+    r.raise_for_status()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def resumen(nombre: str, latencias: list[float]) -> None:
+    print(
+        f"{nombre:<22} n={len(latencias):<5} "
+        f"p50={percentil(latencias, 50):8.1f} ms  "
+        f"p99={percentil(latencias, 99):8.1f} ms  "
+        f"max={max(latencias, default=0):8.1f} ms  "
+        f"media={statistics.fmean(latencias) if latencias else 0:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--correo", required=True)
+    parser.add_argument("--psw", required=True)
+    parser.add_argument("--logins", type=int, default=40, help="Total de logins a lanzar")
+    parser.add_argument("--concurrencia", type=int, default=10, help="Logins simultaneos")
+    parser.add_argument("--base-segundos", type=float, default=3.0)
+    parser.add_argument("--intervalo", type=float, default=0.01, help="Pausa entre peticiones de sondeo")
+    args = parser.parse_args()
+
+    # Latencia base sin logins
+    detener = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futuro = pool.submit(medir_latencias, args.url, detener, args.intervalo)
+        time.sleep(args.base_segundos)
+        detener.set()
+        base = futuro.result()
+
+    # Latencia con logins concurrentes
+    detener = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as sondeo:
+        futuro = sondeo.submit(medir_latencias, args.url, detener, args.intervalo)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+            tiempos_login = list(pool.map(lambda _: login(args.url, args.correo, args.psw), range(args.logins)))
+        duracion = time.perf_counter() - inicio
+        detener.set()
+        con_logins = futuro.result()
+
+    resumen("/helloworld base", base)
+    resumen("/helloworld + logins", con_logins)
+    resumen("/login", tiempos_login)
+    print(f"{args.logins} logins en {duracion:.2f} s ({args.logins / duracion:.1f} logins/s)")
+
+
+if __name__ == "__main__":
+    main()
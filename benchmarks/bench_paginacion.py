@@ -0,0 +1,147 @@
+"""
+Benchmark: paginas profundas de /pedidos/historial con skip/limit vs cursor.
+
+Requiere un MongoDB accesible (MONGODB_URL, por defecto localhost). Usa una
+base aparte que se llena con pedidos entregados sinteticos y se borra al
+final:
+    python benchmarks/bench_paginacion.py --pedidos 200000 --paginas 1 10 100 1000
+
+Para cada pagina mide la consulta anterior (count_documents + skip/limit) y
+la de core.paginacion con el cursor de la pagina previa (sin total y con el
+total cacheado), e imprime documentos y claves examinadas de cada plan.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pymongo import AsyncMongoClient, DESCENDING  # noqa: E402
+
+from core.indices import INDICES  # noqa: E402
+from core.paginacion import decodificar_cursor, filtro_despues, paginar  # noqa: E402
+from schemas.pedido import pedidos_schema  # noqa: E402
+
+FILTROS = {"$or": [{"estado": "entregado"}, {"cancelado": True}]}
+ORDEN = [("fecha_entregado", DESCENDING), ("_id", DESCENDING)]
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def resumen(nombre: str, latencias: list[float], extra: str = "") -> None:
+    print(
+        f"{nombre:<30} p50={percentil(latencias, 50):9.2f} ms  "
+        f"p99={percentil(latencias, 99):9.2f} ms  media={statistics.fmean(latencias):9.2f} ms  {extra}"
+    )
+
+
+def pedido_sintetico(i: int, rnd: random.Random, inicio: datetime) -> dict:
+    fecha = inicio + timedelta(minutes=rnd.randrange(0, 60 * 24 * 365))
+    return {
+        "cliente_id": f"{i % 5000:024x}",
+        "usuario_id": f"{i % 20:024x}",
+        "usuario_id_entrego": f"{i % 20:024x}",
+        "sucursal_id": f"{i % 4:024x}",
+        "venta_id": f"{i:024x}",
+        "venta_folio": f"A{i}",
+        "folio": f"P{i}",
+        "descripcion": "Impresion",
+        "fecha": fecha,
+        "fecha_entrega": fecha,
+        "fecha_entregado": fecha + timedelta(hours=2),
+        "archivos": [],
+        "estado": "cancelado" if i % 50 == 0 else "entregado",
+        "cancelado": i % 50 == 0,
+    }
+
+
+async def main(args):
+    cliente_mongo = AsyncMongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    coleccion = cliente_mongo[args.db].pedidos
+    try:
+        await coleccion.drop()
+        rnd = random.Random(7)
+        inicio = datetime(2024, 1, 1)
+        t0 = time.perf_counter()
+        for desde in range(0, args.pedidos, 10000):
+            await coleccion.insert_many(
+                [pedido_sintetico(i, rnd, inicio) for i in range(desde, min(desde + 10000, args.pedidos))]
+            )
+        await coleccion.create_indexes(INDICES["pedidos"])
+        print(f"{args.pedidos} pedidos sembrados en {time.perf_counter() - t0:.1f} s")
+
+        # Cursor al inicio de cada pagina pedida (se obtiene recorriendo una vez)
+        cursores: dict[int, str] = {}
+        cursor, pagina = None, 1
+        objetivo = max(args.paginas)
+        while pagina <= objetivo:
+            cursores[pagina] = cursor
+            respuesta = await paginar(coleccion, FILTROS, "fecha_entregado", pedidos_schema,
+                                      page_size=args.page_size, cursor=cursor, con_total=False)
+            cursor = respuesta["pagination"]["next_cursor"]
+            if cursor is None:
+                break
+            pagina += 1
+
+        for pagina in args.paginas:
+            if pagina not in cursores:
+                print(f"pagina {pagina}: no hay tantos pedidos")
+                continue
+
+            async def con_skip():
+                await coleccion.count_documents(FILTROS)
+                documentos = await coleccion.find(FILTROS).sort(ORDEN)\
+                    .skip((pagina - 1) * args.page_size).limit(args.page_size).to_list()
+                pedidos_schema(documentos)
+
+            async def con_cursor(con_total: bool):
+                await paginar(coleccion, FILTROS, "fecha_entregado", pedidos_schema,
+                              page_size=args.page_size, cursor=cursores[pagina], con_total=con_total)
+
+            for nombre, funcion in (
+                ("skip + count", con_skip),
+                ("cursor", lambda: con_cursor(False)),
+                ("cursor + total cacheado", lambda: con_cursor(True)),
+            ):
+                latencias = []
+                for _ in range(args.repeticiones):
+                    t0 = time.perf_counter()
+                    await funcion()
+                    latencias.append((time.perf_counter() - t0) * 1000)
+                resumen(f"pag {pagina} {nombre}", latencias)
+
+            consulta = FILTROS
+            if cursores[pagina]:
+                posicion = decodificar_cursor(cursores[pagina], "fecha_entregado")
+                consulta = {"$and": [FILTROS, filtro_despues("fecha_entregado", posicion)]}
+            for nombre, buscar in (
+                ("skip", coleccion.find(FILTROS).sort(ORDEN).skip((pagina - 1) * args.page_size).limit(args.page_size)),
+                ("cursor", coleccion.find(consulta).sort(ORDEN).limit(args.page_size + 1)),
+            ):
+                stats = (await buscar.explain()).get("executionStats", {})
+                print(f"    plan {nombre:<6} claves={stats.get('totalKeysExamined', '?')} "
+                      f"docs={stats.get('totalDocsExamined', '?')}")
+    finally:
+        if not args.conservar:
+            await cliente_mongo.drop_database(args.db)
+        await cliente_mongo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=60)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--db", default="pbstation_bench")
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de prueba al terminar")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,197 @@
+"""
+Benchmark: reportes agregando `ventas` directo vs acumulados + $facet.
+
+Requiere un MongoDB accesible (MONGODB_URL, por defecto localhost). Usa una
+base aparte que se llena con ventas sinteticas (y sus acumulados, calculados
+con core.acumulados.aportes_de_venta) y se borra al final:
+    python benchmarks/bench_reportes.py --ventas 1000000
+
+Por cada periodo mide una carga de resumen + tendencias + cancelaciones:
+"antes" son los pipelines anteriores sobre `ventas`, uno tras otro (4 del
+resumen, 3 de tendencias, 2 de cancelaciones); "ahora" son los de
+routers/reportes.py (acumulados, $facet y adeudos en paralelo).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# routers.reportes importa validar_token, que exige la clave aunque aqui no se use
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from bson import Decimal128, ObjectId  # noqa: E402
+from pymongo import AsyncMongoClient  # noqa: E402
+
+from core.acumulados import CLAVES, VENTAS_POR_HORA, _bson, aportes_de_venta  # noqa: E402
+from core.indices import INDICES  # noqa: E402
+from routers.reportes import (  # noqa: E402
+    _filtro_periodo,
+    _pipeline_adeudos,
+    _pipeline_cancelaciones,
+    _pipeline_resumen,
+    _pipeline_tendencias,
+    _rango_anterior,
+    _rango_dias,
+)
+
+MOTIVOS = ["Error de captura", "Cliente desistio", "Precio incorrecto", None]
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def resumen(nombre: str, latencias: list[float], extra: str = "") -> None:
+    print(
+        f"{nombre:<26} p50={percentil(latencias, 50):9.2f} ms  "
+        f"p99={percentil(latencias, 99):9.2f} ms  media={statistics.fmean(latencias):9.2f} ms  {extra}"
+    )
+
+
+def venta_sintetica(rnd: random.Random, sucursales: list[str], clientes: list[str], productos: list[str],
+                    hoy: datetime, dias: int) -> dict:
+    total = rnd.randint(50, 2000)
+    cancelado = rnd.random() < 0.03
+    liquidado = cancelado or rnd.random() < 0.92
+    tarjeta = rnd.choice([None, "debito", "credito"])
+    return {
+        "_id": ObjectId(),
+        "folio": "A0",
+        "sucursal_id": rnd.choice(sucursales),
+        "cliente_id": rnd.choice(clientes),
+        "usuario_id": "u",
+        "fecha_venta": hoy - timedelta(days=rnd.randrange(dias), minutes=rnd.randrange(24 * 60)),
+        "detalles": [
+            {"producto_id": rnd.choice(productos), "cantidad": rnd.randint(1, 5),
+             "total": Decimal128(str(total)), "subtotal": Decimal128(str(total))}
+            for _ in range(rnd.randint(1, 3))
+        ],
+        "total": Decimal128(str(total)),
+        "tipo_tarjeta": tarjeta,
+        "recibido_mxn": Decimal128(str(total if tarjeta is None else 0)),
+        "recibido_us": None,
+        "recibido_tarj": Decimal128(str(total if tarjeta else 0)),
+        "recibido_trans": None,
+        "recibido_total": Decimal128(str(total)),
+        "liquidado": liquidado,
+        "cancelado": cancelado,
+        "was_deuda": not cancelado and rnd.random() < 0.05,
+        "motivo_cancelacion": rnd.choice(MOTIVOS) if cancelado else None,
+    }
+
+
+def pipelines_antes(match_periodo: dict, match_anterior: dict | None) -> list[list]:
+    """Los pipelines que corrian antes sobre `ventas` para resumen, tendencias y cancelaciones."""
+    base = {"liquidado": True, "cancelado": {"$ne": True}, **match_periodo}
+    directas = {**base, "was_deuda": {"$ne": True}}
+    canceladas = {"cancelado": True, **match_periodo}
+    suma = lambda grupo: {"_id": grupo, "total": {"$sum": "$total"}, "num": {"$sum": 1}}  # noqa: E731
+    pipelines = [
+        [{"$match": base}, {"$group": {**suma(None), "mxn": {"$sum": {"$ifNull": ["$recibido_mxn", 0]}}}}],
+        [{"$match": canceladas}, {"$group": suma(None)}],
+        [{"$match": {"liquidado": False, "cancelado": {"$ne": True}}}, {"$group": suma(None)}],
+        [{"$match": directas}, {"$group": suma({"$hour": "$fecha_venta"})}],
+        [{"$match": directas}, {"$group": suma({"$dayOfWeek": "$fecha_venta"})}],
+        [{"$match": directas}, {"$group": suma({"$dateToString": {"format": "%Y-%m-%d", "date": "$fecha_venta"}})}],
+        [{"$match": canceladas}, {"$group": suma(None)}],
+        [{"$match": canceladas}, {"$group": suma({"$ifNull": ["$motivo_cancelacion", "Sin motivo"]})},
+         {"$sort": {"num": -1}}, {"$limit": 10}],
+    ]
+    if match_anterior is not None:
+        pipelines.append([{"$match": {"liquidado": True, "cancelado": {"$ne": True}, **match_anterior}},
+                          {"$group": suma(None)}])
+    return pipelines
+
+
+async def agregar(coleccion, pipeline: list) -> list:
+    return await (await coleccion.aggregate(pipeline)).to_list()
+
+
+async def main(args):
+    cliente_mongo = AsyncMongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    base = cliente_mongo[args.db]
+    try:
+        await base.ventas.drop()
+        for coleccion in CLAVES:
+            await base[coleccion].drop()
+        rnd = random.Random(7)
+        sucursales = [str(ObjectId()) for _ in range(4)]
+        clientes = [str(ObjectId()) for _ in range(5000)]
+        productos = [str(ObjectId()) for _ in range(300)]
+        hoy = datetime.now()
+
+        inicio = time.perf_counter()
+        sumas: dict[tuple, dict] = {}
+        for desde in range(0, args.ventas, 10000):
+            lote = [venta_sintetica(rnd, sucursales, clientes, productos, hoy, args.dias)
+                    for _ in range(min(10000, args.ventas - desde))]
+            await base.ventas.insert_many(lote)
+            for venta in lote:
+                for clave, aporte in aportes_de_venta(venta).items():
+                    acumulado = sumas.setdefault(clave, {})
+                    for campo, valor in aporte.items():
+                        acumulado[campo] = acumulado.get(campo, 0) + valor
+        await base.ventas.create_indexes(INDICES["ventas"])
+        for coleccion, campos_clave in CLAVES.items():
+            documentos = [
+                {**dict(zip(campos_clave, clave)), **{c: _bson(v) for c, v in campos.items()}}
+                for (nombre, clave), campos in sumas.items() if nombre == coleccion
+            ]
+            for desde in range(0, len(documentos), 10000):
+                await base[coleccion].insert_many(documentos[desde:desde + 10000])
+            await base[coleccion].create_indexes(INDICES[coleccion])
+        print(f"{args.ventas} ventas sembradas (con acumulados) en {time.perf_counter() - inicio:.1f} s")
+
+        for periodo in args.periodos:
+            rango = _rango_dias(periodo)
+            rango_anterior = _rango_anterior(periodo)
+            match_anterior = None
+            if rango_anterior is not None:
+                match_anterior = {"fecha_venta": {"$gte": rango_anterior[0],
+                                                  "$lt": rango_anterior[1] + timedelta(days=1)}}
+
+            async def antes():
+                for pipeline in pipelines_antes(_filtro_periodo(periodo), match_anterior):
+                    await agregar(base.ventas, pipeline)
+
+            async def ahora():
+                await asyncio.gather(
+                    agregar(base[VENTAS_POR_HORA], _pipeline_resumen(rango, rango_anterior)),
+                    agregar(base.ventas, _pipeline_adeudos()),
+                    agregar(base[VENTAS_POR_HORA], _pipeline_tendencias(rango)),
+                    agregar(base.ventas, _pipeline_cancelaciones({"cancelado": True, **_filtro_periodo(periodo)})),
+                )
+
+            medias = {}
+            for nombre, funcion in (("antes (ventas)", antes), ("ahora (acumulados)", ahora)):
+                await funcion()  # calentar cache
+                latencias = []
+                for _ in range(args.repeticiones):
+                    t0 = time.perf_counter()
+                    await funcion()
+                    latencias.append((time.perf_counter() - t0) * 1000)
+                medias[nombre] = statistics.fmean(latencias)
+                resumen(f"{periodo} {nombre}", latencias)
+            print(f"    {medias['antes (ventas)'] / medias['ahora (acumulados)']:.1f}x mas rapido")
+    finally:
+        if not args.conservar:
+            await cliente_mongo.drop_database(args.db)
+        await cliente_mongo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ventas", type=int, default=1000000)
+    parser.add_argument("--dias", type=int, default=730, help="Las ventas se reparten en estos dias hacia atras")
+    parser.add_argument("--periodos", nargs="+", default=["semana", "mes", "todo"])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--db", default="pbstation_bench")
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de prueba al terminar")
+    asyncio.run(main(parser.parse_args()))
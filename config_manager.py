@@ -1,8 +1,9 @@
+from core.cambios import registrar_cambio
 from core.database import db
 import os
 
-def cargar_config():
-    config = db.configuracion.find_one({}, {"_id": 0})
+async def cargar_config():
+    config = await db.configuracion.find_one({}, {"_id": 0})
     if config is None:
         config = {
             "precio_dolar": 0,
@@ -22,8 +23,9 @@ def cargar_config():
             "facturama_user": os.getenv("FACTURAMA_USER", ""),
             "facturama_pass": os.getenv("FACTURAMA_PASS", "")
         }
-        db.configuracion.insert_one(config)
+        await db.configuracion.insert_one(config)
         config.pop("_id", None)
+        await registrar_cambio("configuracion", "configuracion")
     else:
         # Migración: asegurar que las nuevas llaves existan
         needs_update = False
@@ -42,10 +44,12 @@ def cargar_config():
                 needs_update = True
         
         if needs_update:
-            guardar_config(config.copy())
+            await guardar_config(config.copy())
             
     return config
 
-def guardar_config(data: dict):
+async def guardar_config(data: dict):
     data.pop("_id", None)
-    db.configuracion.replace_one({}, data, upsert=True)
\ No newline at end of file
+    await db.configuracion.replace_one({}, data, upsert=True)
+    # Nueva version para el ETag de GET /configuracion (tambien en la migracion de llaves)
+    await registrar_cambio("configuracion", "configuracion")
\ No newline at end of file
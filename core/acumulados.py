@@ -0,0 +1,380 @@
+"""
+Acumulados de ventas para /reportes.
+
+En lugar de agregar `ventas` completo en cada reporte, se mantienen tres
+colecciones con sumas (Decimal128) y conteos:
+
+    ventas_por_hora      (sucursal_id, dia, hora)
+    ventas_por_producto  (sucursal_id, dia, producto_id)
+    ventas_por_cliente   (sucursal_id, dia, cliente_id)
+
+aportes_de_venta() dice con que contribuye una venta segun su estado
+(liquidada, cancelada, pagada como deuda). Cada vez que pagar_venta,
+marcar_deuda_pagada o cancelar_venta cambian una venta se aplica la
+diferencia entre el aporte anterior y el nuevo con $inc, asi que el costo de
+un reporte depende de los dias del periodo y no de cuantas ventas hubo.
+
+Si algo se desfasa (un error a medio camino, ventas editadas a mano) se
+reconstruye desde `ventas` con el servidor detenido (los workers no se
+enteran de la reconstruccion y sus reportes cacheados quedarian viejos):
+    python -m core.acumulados
+
+La reconstruccion tambien corre sola en el primer arranque, con otros
+workers quiza atendiendo. Un documento en `bloqueos` deja que solo un worker
+la haga, y sus colecciones temporales llevan el id de la corrida. Mientras
+el bloqueo existe, aplicar_cambio_venta() anota en `acumulados_pendientes`
+los (sucursal, dia) que toco; antes y despues del cambio de colecciones esos
+dias se recalculan desde `ventas`, asi que un $inc que cae en las
+colecciones viejas no se pierde.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from bson import Decimal128, ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.database import db
+
+VENTAS_POR_HORA = "ventas_por_hora"
+VENTAS_POR_PRODUCTO = "ventas_por_producto"
+VENTAS_POR_CLIENTE = "ventas_por_cliente"
+
+CLAVES = {
+    VENTAS_POR_HORA: ("sucursal_id", "dia", "hora"),
+    VENTAS_POR_PRODUCTO: ("sucursal_id", "dia", "producto_id"),
+    VENTAS_POR_CLIENTE: ("sucursal_id", "dia", "cliente_id"),
+}
+
+COLECCION_BLOQUEOS = "bloqueos"
+BLOQUEO_RECONSTRUCCION = "reconstruir_acumulados"
+COLECCION_PENDIENTES = "acumulados_pendientes"
+# Un bloqueo sin renovar en este tiempo es de una corrida que murio
+RECONSTRUCCION_TTL = float(os.getenv("ACUMULADOS_RECONSTRUCCION_TTL", "600"))
+# Vueltas sobre los dias pendientes en cada etapa (lo que quede pasa a la siguiente)
+RECONSTRUCCION_VUELTAS = 3
+
+# Solo lo que lee aportes_de_venta (para la reconstruccion)
+CAMPOS_VENTA = ("sucursal_id", "cliente_id", "fecha_venta", "liquidado", "cancelado", "was_deuda", "total",
+                "tipo_tarjeta", "recibido_mxn", "recibido_us", "recibido_tarj", "recibido_trans",
+                "recibido_total", "detalles.producto_id", "detalles.cantidad", "detalles.total",
+                "detalles.subtotal")
+
+
+def _decimal(valor) -> Decimal:
+    if valor is None:
+        return Decimal(0)
+    return valor.to_decimal() if isinstance(valor, Decimal128) else Decimal(str(valor))
+
+
+def _fecha(venta: dict) -> datetime:
+    # Igual que el orden de /ventas: sin fecha_venta se usa la del _id
+    fecha = venta.get("fecha_venta")
+    if fecha is None:
+        fecha = venta["_id"].generation_time.replace(tzinfo=None)
+    return fecha
+
+
+def dia_de(fecha: datetime) -> datetime:
+    return fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aportes_de_venta(venta: Optional[dict]) -> dict[tuple, dict]:
+    """
+    {(coleccion, clave): {campo: valor}} con lo que `venta` suma a los
+    acumulados en su estado actual (None o pendiente de pago: nada).
+
+    - ventas/total: liquidadas no canceladas (resumen).
+    - ventas_directas/total_directo y recibidos: ademas sin was_deuda
+      (metodos de pago, por sucursal, tendencias, productos y clientes).
+    - canceladas/total_cancelado: canceladas.
+    """
+    if not venta:
+        return {}
+    cancelada = bool(venta.get("cancelado"))
+    liquidada = bool(venta.get("liquidado")) and not cancelada
+    directa = liquidada and not venta.get("was_deuda")
+    if not (liquidada or cancelada):
+        return {}
+
+    fecha = _fecha(venta)
+    dia = dia_de(fecha)
+    sucursal_id = venta.get("sucursal_id")
+    total = _decimal(venta.get("total"))
+
+    por_hora: dict = {}
+    if liquidada:
+        por_hora.update(ventas=1, total=total)
+    if directa:
+        tarjeta = _decimal(venta.get("recibido_tarj"))
+        por_hora.update(
+            ventas_directas=1,
+            total_directo=total,
+            recibido_mxn=_decimal(venta.get("recibido_mxn")),
+            recibido_us=_decimal(venta.get("recibido_us")),
+            tarjeta_debito=tarjeta if venta.get("tipo_tarjeta") == "debito" else Decimal(0),
+            tarjeta_credito=tarjeta if venta.get("tipo_tarjeta") == "credito" else Decimal(0),
+            recibido_trans=_decimal(venta.get("recibido_trans")),
+            recibido_total=_decimal(venta.get("recibido_total")),
+        )
+    if cancelada:
+        por_hora.update(canceladas=1, total_cancelado=total)
+
+    aportes = {(VENTAS_POR_HORA, (sucursal_id, dia, fecha.hour)): por_hora}
+    if directa:
+        aportes[(VENTAS_POR_CLIENTE, (sucursal_id, dia, venta.get("cliente_id")))] = {"num": 1, "total": total}
+        for detalle in venta.get("detalles") or []:
+            clave = (VENTAS_POR_PRODUCTO, (sucursal_id, dia, detalle.get("producto_id")))
+            producto = aportes.setdefault(clave, {"lineas": 0, "cantidad": 0, "total": Decimal(0), "subtotal": Decimal(0)})
+            producto["lineas"] += 1
+            producto["cantidad"] += detalle.get("cantidad") or 0
+            producto["total"] += _decimal(detalle.get("total"))
+            producto["subtotal"] += _decimal(detalle.get("subtotal"))
+    return aportes
+
+
+def diferencia(anterior: Optional[dict], actual: Optional[dict]) -> dict[tuple, dict]:
+    """Lo que hay que sumar a los acumulados para pasar de `anterior` a `actual`."""
+    antes, despues = aportes_de_venta(anterior), aportes_de_venta(actual)
+    cambios = {}
+    for clave in antes.keys() | despues.keys():
+        campos_antes, campos_despues = antes.get(clave, {}), despues.get(clave, {})
+        delta = {}
+        for campo in campos_antes.keys() | campos_despues.keys():
+            valor = campos_despues.get(campo, 0) - campos_antes.get(campo, 0)
+            if valor:
+                delta[campo] = valor
+        if delta:
+            cambios[clave] = delta
+    return cambios
+
+
+def _bson(valor):
+    return Decimal128(valor) if isinstance(valor, Decimal) else valor
+
+
+async def aplicar_cambio_venta(anterior: Optional[dict], actual: Optional[dict]) -> list[list[str]]:
+    """
+    Aplica a los acumulados el cambio de una venta (anterior=None al crearla).
+    Regresa los [sucursal_id, "AAAA-MM-DD"] afectados, para invalidar los
+    reportes cacheados. Como registrar_cambio, un error aqui no tumba la
+    venta: se reporta y se corrige con la reconstruccion.
+    """
+    cambios = diferencia(anterior, actual)
+    try:
+        operaciones: dict[str, list] = {}
+        for (coleccion, clave), delta in cambios.items():
+            operaciones.setdefault(coleccion, []).append(UpdateOne(
+                dict(zip(CLAVES[coleccion], clave)),
+                {"$inc": {campo: _bson(valor) for campo, valor in delta.items()}},
+                upsert=True,
+            ))
+        for coleccion, lote in operaciones.items():
+            await db[coleccion].bulk_write(lote, ordered=False)
+    except Exception as e:
+        venta = actual or anterior or {}
+        print(f"[ERROR] No se pudieron actualizar los acumulados de la venta {venta.get('_id')}: {e}")
+    # clave = (sucursal_id, dia, ...) en las tres colecciones
+    dias = {(clave[0], clave[1]) for _, clave in cambios}
+    # Despues del $inc: si la reconstruccion empieza despues de esta lectura,
+    # su recorrido de `ventas` ya ve la venta en su estado nuevo
+    if dias:
+        await _anotar_si_reconstruyendo(dias)
+    afectados = {(sucursal_id, dia.strftime("%Y-%m-%d")) for sucursal_id, dia in dias}
+    return [list(afectado) for afectado in sorted(afectados, key=str)]
+
+
+async def _anotar_si_reconstruyendo(dias: set):
+    try:
+        bloqueo = await db[COLECCION_BLOQUEOS].find_one(
+            {"_id": BLOQUEO_RECONSTRUCCION, "expira": {"$gt": datetime.now()}}, {"_id": 1}
+        )
+        if bloqueo is None:
+            return
+        for sucursal_id, dia in dias:
+            # `n` cambia con cada anotacion: la reconstruccion solo borra la que ya rehizo
+            await db[COLECCION_PENDIENTES].update_one(
+                {"_id": {"sucursal_id": sucursal_id, "dia": dia}}, {"$inc": {"n": 1}}, upsert=True
+            )
+    except Exception as e:
+        print(f"[ERROR] No se pudieron anotar los dias para la reconstruccion de acumulados: {e}")
+
+
+def _sumar(sumas: dict[tuple, dict], ventas: list) -> int:
+    """Agrega a `sumas` los aportes de `ventas`. Regresa cuantas sumo."""
+    for venta in ventas:
+        for clave, aporte in aportes_de_venta(venta).items():
+            acumulado = sumas.setdefault(clave, {})
+            for campo, valor in aporte.items():
+                acumulado[campo] = acumulado.get(campo, 0) + valor
+    return len(ventas)
+
+
+def _documentos(coleccion: str, sumas: dict[tuple, dict]) -> list[dict]:
+    campos_clave = CLAVES[coleccion]
+    return [
+        {**dict(zip(campos_clave, clave)), **{campo: _bson(valor) for campo, valor in campos.items()}}
+        for (nombre, clave), campos in sumas.items() if nombre == coleccion
+    ]
+
+
+async def _tomar_bloqueo(corrida: str) -> bool:
+    ahora = datetime.now()
+    datos = {"corrida": corrida, "inicio": ahora, "expira": ahora + timedelta(seconds=RECONSTRUCCION_TTL)}
+    try:
+        await db[COLECCION_BLOQUEOS].insert_one({"_id": BLOQUEO_RECONSTRUCCION, **datos})
+        return True
+    except DuplicateKeyError:
+        # Solo se toma si el dueño anterior dejo de renovarlo
+        tomado = await db[COLECCION_BLOQUEOS].find_one_and_update(
+            {"_id": BLOQUEO_RECONSTRUCCION, "expira": {"$lte": ahora}}, {"$set": datos}
+        )
+        return tomado is not None
+
+
+async def _renovar_bloqueo(corrida: str):
+    resultado = await db[COLECCION_BLOQUEOS].update_one(
+        {"_id": BLOQUEO_RECONSTRUCCION, "corrida": corrida},
+        {"$set": {"expira": datetime.now() + timedelta(seconds=RECONSTRUCCION_TTL)}},
+    )
+    if resultado.matched_count == 0:
+        raise RuntimeError("Otra corrida tomo el bloqueo de la reconstruccion de acumulados")
+
+
+async def _soltar_bloqueo(corrida: str):
+    await db[COLECCION_BLOQUEOS].delete_one({"_id": BLOQUEO_RECONSTRUCCION, "corrida": corrida})
+
+
+async def _rehacer_dia(destinos: dict[str, str], sucursal_id, dia: datetime):
+    """Recalcula desde `ventas` un (sucursal, dia) en las colecciones `destinos`."""
+    siguiente = dia + timedelta(days=1)
+    filtro = {"sucursal_id": sucursal_id, "$and": [
+        {"$or": [{"liquidado": True}, {"cancelado": True}]},
+        # Sin fecha_venta el dia sale del _id (como _fecha)
+        {"$or": [
+            {"fecha_venta": {"$gte": dia, "$lt": siguiente}},
+            {"fecha_venta": None, "_id": {"$gte": ObjectId.from_datetime(dia), "$lt": ObjectId.from_datetime(siguiente)}},
+        ]},
+    ]}
+    sumas: dict[tuple, dict] = {}
+    _sumar(sumas, await db.ventas.find(filtro, {campo: 1 for campo in CAMPOS_VENTA}).to_list())
+    for coleccion, destino in destinos.items():
+        await db[destino].delete_many({"sucursal_id": sucursal_id, "dia": dia})
+        documentos = _documentos(coleccion, sumas)
+        if documentos:
+            await db[destino].insert_many(documentos)
+
+
+async def _rehacer_pendientes(destinos: dict[str, str], corrida: Optional[str] = None) -> int:
+    """Recalcula en `destinos` los dias anotados durante la reconstruccion. Regresa cuantos rehizo."""
+    rehechos = 0
+    for _ in range(RECONSTRUCCION_VUELTAS):
+        pendientes = await db[COLECCION_PENDIENTES].find().to_list()
+        if not pendientes:
+            break
+        if corrida is not None:
+            await _renovar_bloqueo(corrida)
+        for pendiente in pendientes:
+            await _rehacer_dia(destinos, pendiente["_id"]["sucursal_id"], pendiente["_id"]["dia"])
+            # Si se volvio a anotar mientras tanto se queda para la siguiente vuelta
+            await db[COLECCION_PENDIENTES].delete_one({"_id": pendiente["_id"], "n": pendiente["n"]})
+            rehechos += 1
+    return rehechos
+
+
+async def reconstruir_acumulados() -> Optional[int]:
+    """
+    Recalcula las tres colecciones desde `ventas`. Se arman en colecciones
+    temporales con sus indices y se renombran al final, asi que los reportes
+    nunca ven acumulados a medias. Regresa cuantas ventas se procesaron, o
+    None si otro worker ya esta reconstruyendo.
+    """
+    from core.indices import INDICES
+
+    corrida = uuid.uuid4().hex[:12]
+    if not await _tomar_bloqueo(corrida):
+        return None
+    temporales = {coleccion: f"{coleccion}_reconstruccion_{corrida}" for coleccion in CLAVES}
+    suelto = False
+    try:
+        # Sobras de corridas que murieron a medias
+        for nombre in await db.list_collection_names():
+            if "_reconstruccion" in nombre and nombre not in temporales.values():
+                await db[nombre].drop()
+        # Lo anotado antes de este punto ya lo ve el recorrido
+        await db[COLECCION_PENDIENTES].delete_many({})
+
+        sumas: dict[tuple, dict] = {}
+        procesadas = 0
+        cursor = db.ventas.find(
+            {"$or": [{"liquidado": True}, {"cancelado": True}]},
+            {campo: 1 for campo in CAMPOS_VENTA},
+        )
+        lote: list = []
+        async for venta in cursor:
+            lote.append(venta)
+            if len(lote) >= 1000:
+                procesadas += _sumar(sumas, lote)
+                lote = []
+                await _renovar_bloqueo(corrida)
+        procesadas += _sumar(sumas, lote)
+
+        for coleccion, temporal in temporales.items():
+            # create_indexes crea la coleccion aunque quede vacia
+            await db[temporal].create_indexes(INDICES[coleccion])
+            documentos = _documentos(coleccion, sumas)
+            for desde in range(0, len(documentos), 1000):
+                await db[temporal].insert_many(documentos[desde:desde + 1000])
+
+        # Ventas que cambiaron durante el recorrido: su $inc cayo en las colecciones viejas
+        await _rehacer_pendientes(temporales, corrida)
+        await _renovar_bloqueo(corrida)
+        for coleccion, temporal in temporales.items():
+            await db[temporal].rename(coleccion, dropTarget=True)
+        # Lo anotado entre la ultima vuelta y el cambio de colecciones
+        vivas = {coleccion: coleccion for coleccion in CLAVES}
+        await _rehacer_pendientes(vivas, corrida)
+        await _soltar_bloqueo(corrida)
+        suelto = True
+        # Ventas que vieron el bloqueo justo antes de soltarlo
+        await _rehacer_pendientes(vivas)
+        return procesadas
+    finally:
+        if not suelto:
+            for temporal in temporales.values():
+                await db[temporal].drop()
+            await _soltar_bloqueo(corrida)
+
+
+async def asegurar_acumulados() -> Optional[int]:
+    """
+    Construye los acumulados si todavia no existen y ya hay ventas (primer
+    arranque). None si no hizo falta o si otro worker ya los esta construyendo.
+    """
+    if await db[VENTAS_POR_HORA].find_one({}, {"_id": 1}):
+        return None
+    if not await db.ventas.find_one({"$or": [{"liquidado": True}, {"cancelado": True}]}, {"_id": 1}):
+        return None
+    return await reconstruir_acumulados()
+
+
+async def _main() -> int:
+    from core.database import cerrar_conexion
+    try:
+        procesadas = await reconstruir_acumulados()
+        if procesadas is None:
+            print("[ERROR] Otra reconstruccion de acumulados esta en curso.")
+            return 1
+        print(f"[OK] Acumulados reconstruidos con {procesadas} venta(s).")
+        return 0
+    finally:
+        await cerrar_conexion()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,228 @@
+"""
+Adeudos de clientes en su propia coleccion.
+
+Cada adeudo es un documento {cliente_id, venta_id, monto_pendiente, fecha}
+con indice unico (cliente_id, venta_id): el duplicado lo rechaza Mongo en
+lugar de recorrer un arreglo. El cliente solo guarda el resumen
+`adeudo_total` / `num_adeudos`, que se ajusta con $inc por cada alta o baja,
+asi que su documento no crece con el historial de credito.
+
+El adeudo y el resumen son dos escrituras (sin transacciones: Mongo puede
+ser standalone). Si la segunda falla se recalcula el resumen de ese cliente
+desde la coleccion. El recalculo escribe con compare-and-set sobre los
+valores que leyo, asi que un $inc de otro worker en medio no se pisa: se
+vuelve a leer y a intentar.
+
+migrar_adeudos_embebidos() pasa el arreglo `clientes.adeudos` del esquema
+anterior a la coleccion y recalcula el resumen de esos clientes (corre al
+arrancar; despues de la primera vez no encuentra nada). Para corregir un
+desfase en todos los clientes (p. ej. un proceso que murio entre las dos
+escrituras):
+    python -m core.adeudos
+"""
+import asyncio
+import sys
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from bson import Decimal128, ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from core.database import db
+
+COLECCION_ADEUDOS = "adeudos"
+# Intentos del compare-and-set del resumen antes de rendirse (queda para la siguiente corrida)
+RESUMEN_INTENTOS = 5
+
+
+def _decimal(valor) -> Decimal:
+    return valor.to_decimal() if isinstance(valor, Decimal128) else Decimal(str(valor))
+
+
+def _oid(cliente_id):
+    return cliente_id if isinstance(cliente_id, ObjectId) else ObjectId(str(cliente_id))
+
+
+async def _ajustar_resumen(cliente_id, monto: Decimal, cantidad: int):
+    try:
+        await db.clientes.update_one(
+            {"_id": _oid(cliente_id)},
+            {"$inc": {"adeudo_total": Decimal128(monto), "num_adeudos": cantidad}},
+        )
+    except Exception as e:
+        # El adeudo ya se escribio: el resumen se rehace desde la coleccion
+        print(f"[ERROR] No se pudo ajustar el resumen de adeudos del cliente {cliente_id}: {e}")
+        await recalcular_resumen(cliente_id)
+
+
+async def agregar_adeudo(cliente_id, venta_id: str, monto_pendiente) -> bool:
+    """Registra el adeudo y suma al resumen del cliente. False si ya existia para esa venta."""
+    monto = _decimal(monto_pendiente)
+    try:
+        await db[COLECCION_ADEUDOS].insert_one({
+            "cliente_id": str(cliente_id),
+            "venta_id": str(venta_id),
+            "monto_pendiente": Decimal128(monto),
+            "fecha": datetime.now(),
+        })
+    except DuplicateKeyError:
+        return False
+    await _ajustar_resumen(cliente_id, monto, 1)
+    return True
+
+
+async def quitar_adeudo(cliente_id, venta_id: str) -> Optional[dict]:
+    """Elimina el adeudo y resta exactamente su monto del resumen. None si no existia."""
+    adeudo = await db[COLECCION_ADEUDOS].find_one_and_delete(
+        {"cliente_id": str(cliente_id), "venta_id": str(venta_id)}
+    )
+    if adeudo is None:
+        return None
+    await _ajustar_resumen(cliente_id, -adeudo["monto_pendiente"].to_decimal(), -1)
+    return adeudo
+
+
+async def reemplazar_adeudos(cliente_id, adeudos: Iterable[dict]) -> bool:
+    """
+    Deja los adeudos del cliente iguales a `adeudos` ({venta_id, monto_pendiente}),
+    para los PUT que todavia mandan la lista completa. Regresa True si cambio algo.
+    """
+    actuales = {a["venta_id"]: a["monto_pendiente"].to_decimal() for a in await adeudos_de_cliente(cliente_id)}
+    nuevos = {str(a["venta_id"]): _decimal(a["monto_pendiente"]) for a in adeudos}
+    cambio = False
+    for venta_id, monto in actuales.items():
+        if nuevos.get(venta_id) != monto:
+            await quitar_adeudo(cliente_id, venta_id)
+            cambio = True
+    for venta_id, monto in nuevos.items():
+        if actuales.get(venta_id) != monto:
+            await agregar_adeudo(cliente_id, venta_id, monto)
+            cambio = True
+    return cambio
+
+
+async def eliminar_adeudos_de_cliente(cliente_id) -> int:
+    return (await db[COLECCION_ADEUDOS].delete_many({"cliente_id": str(cliente_id)})).deleted_count
+
+
+async def adeudos_de_cliente(cliente_id) -> list[dict]:
+    return await db[COLECCION_ADEUDOS].find(
+        {"cliente_id": str(cliente_id)}, {"_id": 0, "venta_id": 1, "monto_pendiente": 1}
+    ).sort("fecha", 1).to_list()
+
+
+async def adeudos_por_cliente(clientes_ids: Optional[Iterable[str]] = None) -> dict[str, list[dict]]:
+    """Adeudos agrupados por cliente en una sola consulta (todos, o solo de `clientes_ids`)."""
+    filtro = {} if clientes_ids is None else {"cliente_id": {"$in": [str(c) for c in clientes_ids]}}
+    agrupados: dict[str, list[dict]] = {}
+    cursor = db[COLECCION_ADEUDOS].find(
+        filtro, {"_id": 0, "cliente_id": 1, "venta_id": 1, "monto_pendiente": 1}
+    ).sort([("cliente_id", 1), ("fecha", 1)])
+    async for adeudo in cursor:
+        agrupados.setdefault(adeudo["cliente_id"], []).append(adeudo)
+    return agrupados
+
+
+async def _sumas(filtro: dict) -> dict[str, tuple[Decimal, int]]:
+    """cliente_id -> (total pendiente, numero de adeudos) de los adeudos de `filtro`."""
+    cursor = await db[COLECCION_ADEUDOS].aggregate([
+        {"$match": filtro},
+        {"$group": {"_id": "$cliente_id", "total": {"$sum": "$monto_pendiente"}, "cantidad": {"$sum": 1}}},
+    ])
+    return {r["_id"]: (_decimal(r["total"]), r["cantidad"]) async for r in cursor}
+
+
+def _al_dia(cliente: dict, total: Decimal, cantidad: int) -> bool:
+    return _decimal(cliente.get("adeudo_total") or 0) == total and cliente.get("num_adeudos") == cantidad
+
+
+async def _fijar_resumen(cliente: dict, total: Decimal, cantidad: int) -> bool:
+    """$set del resumen solo si sigue como se leyo (un $inc en medio hace fallar el intento)."""
+    resultado = await db.clientes.update_one(
+        {"_id": cliente["_id"], "adeudo_total": cliente.get("adeudo_total"), "num_adeudos": cliente.get("num_adeudos")},
+        {"$set": {"adeudo_total": Decimal128(total), "num_adeudos": cantidad}},
+    )
+    return resultado.matched_count == 1
+
+
+async def recalcular_resumen(cliente_id, intentos: int = RESUMEN_INTENTOS) -> bool:
+    """Rehace adeudo_total / num_adeudos de un cliente. True si lo corrigio."""
+    for _ in range(intentos):
+        # El cliente se lee antes que los adeudos: un $inc posterior a la
+        # lectura hace fallar el compare-and-set y se vuelve a intentar
+        cliente = await db.clientes.find_one({"_id": _oid(cliente_id)}, {"adeudo_total": 1, "num_adeudos": 1})
+        if cliente is None:
+            return False
+        total, cantidad = (await _sumas({"cliente_id": str(cliente_id)})).get(str(cliente_id), (Decimal(0), 0))
+        if _al_dia(cliente, total, cantidad):
+            return False
+        if await _fijar_resumen(cliente, total, cantidad):
+            return True
+    print(f"[ERROR] No se pudo recalcular el resumen de adeudos del cliente {cliente_id}: cambio en cada intento")
+    return False
+
+
+async def recalcular_resumenes(clientes_ids: Optional[Iterable] = None) -> int:
+    """
+    Rehace el resumen de `clientes_ids` (o de todos los clientes, con una sola
+    agregacion para la primera pasada). Regresa cuantos clientes corrigio.
+    """
+    if clientes_ids is not None:
+        return sum([await recalcular_resumen(cliente_id) for cliente_id in clientes_ids])
+    corregidos = 0
+    proyeccion = {"adeudo_total": 1, "num_adeudos": 1}
+    # Primero los clientes y luego los adeudos, igual que recalcular_resumen
+    clientes = await db.clientes.find({}, proyeccion).to_list()
+    sumas = await _sumas({})
+    for cliente in clientes:
+        total, cantidad = sumas.get(str(cliente["_id"]), (Decimal(0), 0))
+        if _al_dia(cliente, total, cantidad):
+            continue
+        if await _fijar_resumen(cliente, total, cantidad) or await recalcular_resumen(cliente["_id"]):
+            corregidos += 1
+    return corregidos
+
+
+async def migrar_adeudos_embebidos() -> int:
+    """
+    Mueve `clientes.adeudos` a la coleccion y recalcula el resumen de esos
+    clientes. Se puede repetir: los adeudos ya migrados se ignoran.
+    """
+    migrados = 0
+    clientes_migrados = []
+    async for cliente in db.clientes.find({"adeudos": {"$exists": True}}, {"adeudos": 1}):
+        cliente_id = str(cliente["_id"])
+        for adeudo in cliente.get("adeudos") or []:
+            try:
+                await db[COLECCION_ADEUDOS].insert_one({
+                    "cliente_id": cliente_id,
+                    "venta_id": str(adeudo["venta_id"]),
+                    "monto_pendiente": Decimal128(_decimal(adeudo["monto_pendiente"])),
+                    "fecha": datetime.now(),
+                })
+                migrados += 1
+            except DuplicateKeyError:
+                pass
+        await db.clientes.update_one({"_id": cliente["_id"]}, {"$unset": {"adeudos": ""}})
+        clientes_migrados.append(cliente["_id"])
+    if clientes_migrados:
+        await recalcular_resumenes(clientes_migrados)
+    return migrados
+
+
+async def _main() -> int:
+    from core.database import cerrar_conexion
+    from core.indices import aplicar_indices
+    try:
+        if not await aplicar_indices(db):
+            return 1
+        print(f"[OK] {await migrar_adeudos_embebidos()} adeudo(s) migrados.")
+        print(f"[OK] Resumen de adeudos corregido en {await recalcular_resumenes()} cliente(s).")
+        return 0
+    finally:
+        await cerrar_conexion()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
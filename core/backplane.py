@@ -0,0 +1,145 @@
+"""
+Backplane de pub/sub para los broadcasts de WebSocket.
+
+Cada worker de uvicorn tiene su propio ConnectionManager con sus sockets.
+Los broadcasts se publican como eventos en el backplane y cada worker los
+entrega a sus propias conexiones:
+
+- BackplaneMemoria: un solo proceso; el evento se entrega directo.
+- BackplaneMongo: coleccion capped `ws_eventos` seguida con un cursor
+  tailable; funciona con un mongod standalone (no requiere replica set).
+  El worker que publica entrega localmente sin esperar el viaje a Mongo e
+  ignora su propio evento al leerlo de la coleccion.
+
+Se elige con WS_BACKPLANE=memoria|mongo (por defecto memoria).
+"""
+import asyncio
+import os
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from core.metricas import ws_backplane_eventos
+
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memoria")
+WS_BACKPLANE_BYTES = int(os.getenv("WS_BACKPLANE_BYTES", 16 * 1024 * 1024))
+COLECCION_EVENTOS = "ws_eventos"
+
+
+class BackplaneMemoria:
+    """Entrega local inmediata; suficiente para un solo worker."""
+
+    def __init__(self):
+        self._entregar: Optional[Callable[[dict], None]] = None
+
+    async def iniciar(self, entregar: Callable[[dict], None]):
+        self._entregar = entregar
+
+    async def publicar(self, evento: dict):
+        ws_backplane_eventos.inc(direccion="publicado")
+        if self._entregar:
+            self._entregar(evento)
+
+    async def detener(self):
+        self._entregar = None
+
+
+class BackplaneMongo:
+    # Margen para eventos de otros workers que llegan con ts un poco menor
+    MARGEN_REANUDAR = timedelta(seconds=2)
+
+    def __init__(self, db):
+        self.db = db
+        self.worker_id = uuid.uuid4().hex
+        self._entregar: Optional[Callable[[dict], None]] = None
+        self._tarea: Optional[asyncio.Task] = None
+        # _id recientes para no entregar dos veces al reabrir el cursor
+        self._vistos: deque = deque(maxlen=1000)
+        self._vistos_set: set = set()
+
+    async def iniciar(self, entregar: Callable[[dict], None]):
+        self._entregar = entregar
+        try:
+            await self.db.create_collection(COLECCION_EVENTOS, capped=True, size=WS_BACKPLANE_BYTES)
+        except CollectionInvalid:
+            pass  # ya existe (otro worker la creo)
+        # Un cursor tailable cuya consulta no encuentra nada muere de inmediato;
+        # esta marca (sin origen, nadie la entrega) garantiza al menos un documento
+        ahora = datetime.now()
+        await self.db[COLECCION_EVENTOS].insert_one({"origen": None, "ts": ahora})
+        self._tarea = asyncio.create_task(self._seguir(ahora))
+
+    async def publicar(self, evento: dict):
+        ws_backplane_eventos.inc(direccion="publicado")
+        if self._entregar:
+            self._entregar(evento)
+        try:
+            await self.db[COLECCION_EVENTOS].insert_one(
+                {**evento, "origen": self.worker_id, "ts": datetime.now()}
+            )
+        except Exception as e:
+            # La escritura que origino el broadcast ya se hizo; solo se pierde
+            # la notificacion para los otros workers
+            print(f"[ERROR] Backplane Mongo al publicar: {e}")
+
+    def _marcar_visto(self, doc_id) -> bool:
+        """True si el evento es nuevo para este worker."""
+        if doc_id in self._vistos_set:
+            return False
+        if len(self._vistos) == self._vistos.maxlen:
+            self._vistos_set.discard(self._vistos[0])
+        self._vistos.append(doc_id)
+        self._vistos_set.add(doc_id)
+        return True
+
+    async def _seguir(self, desde: datetime):
+        coleccion = self.db[COLECCION_EVENTOS]
+        ultimo_ts = desde
+        while True:
+            try:
+                cursor = coleccion.find(
+                    {"ts": {"$gt": ultimo_ts - self.MARGEN_REANUDAR}},
+                    cursor_type=CursorType.TAILABLE_AWAIT,
+                )
+                while cursor.alive:
+                    try:
+                        doc = await cursor.next()
+                    except StopAsyncIteration:
+                        # Sin eventos nuevos durante la espera del servidor
+                        continue
+                    ultimo_ts = max(ultimo_ts, doc["ts"])
+                    if not self._marcar_visto(doc["_id"]):
+                        continue
+                    if doc.get("origen") in (None, self.worker_id):
+                        continue
+                    ws_backplane_eventos.inc(direccion="recibido")
+                    self._entregar(doc)
+                # El cursor murio (p. ej. la coleccion dio la vuelta); reabrir
+                await asyncio.sleep(0.5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Backplane Mongo: {e}")
+                await asyncio.sleep(1)
+
+    async def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+
+def crear_backplane(nombre: str = WS_BACKPLANE):
+    if nombre == "mongo":
+        from core.database import db
+        return BackplaneMongo(db)
+    if nombre != "memoria":
+        print(f"[ERROR] WS_BACKPLANE desconocido '{nombre}', usando memoria")
+    return BackplaneMemoria()
@@ -0,0 +1,82 @@
+"""
+Busqueda de clientes por prefijo, sin distinguir mayusculas ni acentos.
+
+Cada cliente guarda en `busqueda` las palabras normalizadas de nombre,
+razon_social, rfc, telefono y correo. El indice multikey sobre ese campo
+permite que un regex anclado (^prefijo, sin opciones) se resuelva como un
+rango del indice en lugar de recorrer la coleccion.
+
+`nombre_normalizado` (indexado junto con _id) da el orden de los resultados:
+se ordena en Mongo antes del limite, asi los primeros N son los primeros N
+por nombre y no los primeros N que encontro el indice.
+"""
+import re
+import unicodedata
+from typing import Optional
+
+from pymongo import UpdateOne
+
+CAMPOS_BUSQUEDA = ("nombre", "razon_social", "rfc", "telefono", "correo")
+CAMPO_ORDEN = "nombre_normalizado"
+MAX_TERMINOS = 5
+_SEPARADORES = re.compile(r"[^0-9a-z]+")
+
+
+def normalizar(texto) -> str:
+    """'Ñoño Pérez' -> 'nono perez'."""
+    sin_acentos = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return sin_acentos.lower().strip()
+
+
+def _palabras(texto) -> list[str]:
+    return [p for p in _SEPARADORES.split(normalizar(texto)) if p]
+
+
+def tokens_busqueda(cliente: dict) -> list[str]:
+    """Palabras a indexar de un cliente (sin repetir)."""
+    tokens: list[str] = []
+    for campo in CAMPOS_BUSQUEDA:
+        valor = cliente.get(campo)
+        if valor is None or valor == "":
+            continue
+        palabras = _palabras(valor)
+        # El valor completo sin separadores tambien cuenta: "perez@x.com" -> "perezxcom"
+        completo = "".join(palabras)
+        for token in (*palabras, completo):
+            if token and token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def campos_busqueda(cliente: dict) -> dict:
+    """Campos derivados que se guardan con el cliente: tokens y nombre para ordenar."""
+    return {"busqueda": tokens_busqueda(cliente), CAMPO_ORDEN: normalizar(cliente.get("nombre") or "")}
+
+
+def filtro_busqueda(q: str) -> Optional[dict]:
+    """
+    Cada palabra de `q` debe ser prefijo de alguna palabra del cliente.
+    Regresa None si `q` no tiene nada buscable.
+    """
+    terminos = _palabras(q)[:MAX_TERMINOS]
+    if not terminos:
+        return None
+    # Regex anclados y sin opciones: Mongo los convierte en rangos del indice
+    condiciones = [{"busqueda": re.compile("^" + re.escape(t))} for t in terminos]
+    return condiciones[0] if len(condiciones) == 1 else {"$and": condiciones}
+
+
+async def completar_busqueda_clientes(db, lote: int = 1000) -> int:
+    """Llena `busqueda` y `nombre_normalizado` en los clientes que no los tienen. Regresa cuantos actualizo."""
+    proyeccion = {campo: 1 for campo in CAMPOS_BUSQUEDA}
+    operaciones = []
+    total = 0
+    filtro = {"$or": [{"busqueda": {"$exists": False}}, {CAMPO_ORDEN: {"$exists": False}}]}
+    async for cliente in db.clientes.find(filtro, proyeccion):
+        operaciones.append(UpdateOne({"_id": cliente["_id"]}, {"$set": campos_busqueda(cliente)}))
+        if len(operaciones) >= lote:
+            total += (await db.clientes.bulk_write(operaciones, ordered=False)).modified_count
+            operaciones = []
+    if operaciones:
+        total += (await db.clientes.bulk_write(operaciones, ordered=False)).modified_count
+    return total
@@ -0,0 +1,130 @@
+"""
+Cache de resultados de /reportes con invalidacion por eventos.
+
+Cada resultado se guarda por (reporte, rango de dias, sucursal, parametros).
+Cuando pagar_venta, marcar_deuda_pagada o cancelar_venta cambian los
+acumulados, routers/ventas.py publica por el backplane los
+[sucursal_id, dia] afectados y cada worker tira solo las entradas cuyo rango
+contiene alguno de esos dias en esa sucursal (o en todas las sucursales).
+
+Los rangos que terminan antes de hoy solo cambian cuando se cancela o se paga
+una venta vieja, y ese evento los invalida, asi que se guardan sin expiracion
+(salen por LRU). Los que incluyen hoy, o "todo", usan REPORTES_CACHE_TTL como
+red de seguridad. Los nombres de productos, clientes y sucursales se toman de
+los broadcasts de catalogo.
+
+`python -m core.acumulados` reescribe los acumulados por fuera de los
+workers: despues de correrlo hay que reiniciarlos para vaciar la cache.
+"""
+import copy
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from core.acumulados import dia_de
+from core.cache import TTLCache
+from core.catalogo_productos import ENTIDAD as ENTIDAD_PRODUCTOS
+from core.metricas import reportes_cache
+from core.websocket_manager import temas_de_mensaje
+
+REPORTES_CACHE_MAX = int(os.getenv("REPORTES_CACHE_MAX", "500"))
+REPORTES_CACHE_TTL = float(os.getenv("REPORTES_CACHE_TTL", "300"))
+
+EVENTO_INVALIDAR = "invalidar-reportes"
+
+# Reportes que muestran nombres de otra entidad: se tiran cuando esta cambia.
+# Las claves son la entidad de temas_de_mensaje() ("put-product:<id>" -> "product")
+REPORTES_POR_ENTIDAD = {
+    ENTIDAD_PRODUCTOS: ("productos-top",),
+    "cliente": ("clientes-top",),
+    "sucursal": ("por-sucursal",),
+}
+
+Rango = Optional[tuple[datetime, datetime]]
+
+
+class CacheReportes:
+    def __init__(self, max_entries: int = REPORTES_CACHE_MAX, ttl_seconds: float = REPORTES_CACHE_TTL):
+        self._cache = TTLCache(max_entries, ttl_seconds)
+        # Sube con cada invalidacion: un resultado calculado mientras tanto no se guarda
+        self._generacion = 0
+        self.invalidaciones = 0
+        self.entradas_invalidadas = 0
+        self._por_reporte: dict[str, dict[str, int]] = {}
+
+    def _contar(self, reporte: str, resultado: str) -> None:
+        contadores = self._por_reporte.setdefault(reporte, {"hits": 0, "misses": 0})
+        contadores[resultado] += 1
+        reportes_cache.inc(reporte=reporte, resultado=resultado)
+
+    async def obtener(self, reporte: str, rango: Rango, sucursal_id: Optional[str],
+                      calcular: Callable[[], Awaitable[Any]], **parametros) -> Any:
+        """
+        Resultado de `calcular()` para esta combinacion, desde la cache si
+        sigue vigente. `rango` son los dias (inclusive) que lee el reporte;
+        None es sin filtro de fecha.
+        """
+        clave = (reporte, rango, sucursal_id or None, tuple(sorted(parametros.items())))
+        valor = self._cache.get(clave)
+        if valor is not None:
+            self._contar(reporte, "hits")
+            return copy.deepcopy(valor)
+        self._contar(reporte, "misses")
+
+        generacion = self._generacion
+        valor = await calcular()
+        if generacion == self._generacion:
+            historico = rango is not None and rango[1] < dia_de(datetime.now())
+            self._cache.set(clave, copy.deepcopy(valor), None if historico else -1)
+        return valor
+
+    def _tirar(self, debe_salir: Callable[[tuple], bool]) -> int:
+        self._generacion += 1
+        claves = [clave for clave, _ in self._cache.items() if debe_salir(clave)]
+        for clave in claves:
+            self._cache.pop(clave)
+        self.entradas_invalidadas += len(claves)
+        return len(claves)
+
+    def invalidar(self, afectados: list) -> int:
+        """Tira las entradas que incluyen algun [sucursal_id, "AAAA-MM-DD"] de `afectados`."""
+        dias = [(sucursal_id, datetime.strptime(dia, "%Y-%m-%d")) for sucursal_id, dia in afectados]
+        if not dias:
+            return 0
+        self.invalidaciones += 1
+
+        def debe_salir(clave: tuple) -> bool:
+            _, rango, sucursal_clave, _ = clave
+            return any(
+                (sucursal_clave is None or sucursal_clave == sucursal_id)
+                and (rango is None or rango[0] <= dia <= rango[1])
+                for sucursal_id, dia in dias
+            )
+
+        return self._tirar(debe_salir)
+
+    def registrar_evento(self, datos: dict) -> None:
+        """Observador interno del ConnectionManager para EVENTO_INVALIDAR."""
+        self.invalidar(datos.get("afectados") or [])
+
+    def registrar_mensaje(self, message: str) -> None:
+        """Observador del ConnectionManager: 'put-product:<id>' tira productos-top, etc."""
+        entidad, _ = temas_de_mensaje(message)
+        reportes = REPORTES_POR_ENTIDAD.get(entidad)
+        if reportes:
+            self._tirar(lambda clave: clave[0] in reportes)
+
+    def stats(self) -> dict:
+        por_reporte = {}
+        for reporte, contadores in sorted(self._por_reporte.items()):
+            total = contadores["hits"] + contadores["misses"]
+            por_reporte[reporte] = {**contadores, "hit_ratio": round(contadores["hits"] / total, 4) if total else 0.0}
+        return {
+            **self._cache.stats(),
+            "invalidaciones": self.invalidaciones,
+            "entradas_invalidadas": self.entradas_invalidadas,
+            "por_reporte": por_reporte,
+        }
+
+
+cache_reportes = CacheReportes()
@@ -0,0 +1,125 @@
+"""
+Bitacora de cambios de los catalogos para sincronizacion incremental.
+
+Cada alta, modificacion o baja en clientes, productos, usuarios, impresoras y
+sucursales llama a registrar_cambio(), que asigna una version global
+creciente (contador atomico en `counters`, como los folios) y guarda un solo documento por
+(coleccion, doc_id) en `cambios` con la ultima version y si fue eliminado.
+
+Las terminales guardan la version de su ultima sincronizacion y piden
+GET /<catalogo>/sync?since=<version> (la primera vez sin `since`): reciben solo los documentos que
+cambiaron y los ids eliminados, en lugar del catalogo completo.
+
+La version se toma del contador antes de anotar la entrada, asi que puede
+haber una version N+1 ya anotada mientras N sigue en camino. Por eso una
+sincronizacion incremental no regresa mas alla de la ultima entrada anotada
+hace mas de CAMBIOS_VENTANA segundos (lo que tarda de sobra un
+registrar_cambio): las entradas mas nuevas se mandan igual y se vuelven a
+mandar en la siguiente, pero ninguna version en camino queda atras.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from core.database import db
+from generador_folio import _get_next_seq_atomic
+
+COLECCION_CAMBIOS = "cambios"
+CLAVE_VERSION = "cambios:version"
+CAMBIOS_VENTANA = float(os.getenv("CAMBIOS_VENTANA", "10"))
+
+
+async def version_actual() -> int:
+    doc = await db.counters.find_one({"_id": CLAVE_VERSION})
+    return int(doc["seq"]) if doc else 0
+
+
+async def version_coleccion(coleccion: str) -> int:
+    """Version del ultimo cambio anotado de `coleccion` (0 si no hay ninguno)."""
+    doc = await db[COLECCION_CAMBIOS].find_one({"coleccion": coleccion}, {"version": 1}, sort=[("version", -1)])
+    return int(doc["version"]) if doc else 0
+
+
+async def registrar_cambio(coleccion: str, doc_id, eliminado: bool = False) -> Optional[int]:
+    """
+    Anota que un documento cambio. Un error aqui no debe tumbar la escritura
+    que ya se hizo: se registra en consola y la terminal se corrige en la
+    siguiente sincronizacion completa.
+    """
+    try:
+        version = await _get_next_seq_atomic(db, CLAVE_VERSION)
+        await db[COLECCION_CAMBIOS].update_one(
+            {"coleccion": coleccion, "doc_id": str(doc_id)},
+            {"$set": {"version": version, "eliminado": eliminado, "fecha": datetime.now()}},
+            upsert=True,
+        )
+        return version
+    except Exception as e:
+        print(f"[ERROR] No se pudo registrar el cambio {coleccion}:{doc_id}: {e}")
+        return None
+
+
+async def _version_consolidada() -> int:
+    """Version mas alta anotada hace mas de CAMBIOS_VENTANA: todo lo anterior ya esta escrito."""
+    limite = datetime.now() - timedelta(seconds=CAMBIOS_VENTANA)
+    doc = await db[COLECCION_CAMBIOS].find_one(
+        {"fecha": {"$lt": limite}}, {"version": 1}, sort=[("version", -1)]
+    )
+    return int(doc["version"]) if doc else 0
+
+
+def _object_ids(ids) -> list:
+    resultado = []
+    for doc_id in ids:
+        try:
+            resultado.append(ObjectId(doc_id))
+        except (InvalidId, TypeError):
+            pass
+    return resultado
+
+
+async def sincronizar(coleccion: str, since: Optional[int], schema: Callable[[list], list], filtro: Optional[dict] = None) -> dict:
+    """
+    Cambios de `coleccion` posteriores a `since`.
+
+    `filtro` es el mismo que aplica el endpoint /all (p. ej. activo=True): un
+    documento que ya no lo cumple se reporta como eliminado. Sin `since` se
+    regresa el catalogo completo, que sirve como carga inicial e incluye los
+    documentos anteriores a la bitacora.
+    """
+    filtro = filtro or {}
+    if since is None:
+        # La version se lee antes que los documentos: lo que cambie en medio
+        # se vuelve a mandar en la siguiente sincronizacion
+        version = await version_actual()
+        documentos = await db[coleccion].find(filtro).to_list()
+        return {"version": version, "completo": True, "cambios": schema(documentos), "eliminados": []}
+
+    entradas = await db[COLECCION_CAMBIOS].find(
+        {"coleccion": coleccion, "version": {"$gt": since}},
+        {"doc_id": 1, "version": 1, "eliminado": 1},
+    ).sort("version", 1).to_list()
+    # Solo se avanza hasta la ultima version vista y consolidada (nunca al
+    # contador) para no saltarse una escritura que tomo version pero aun no
+    # se anota; nunca se regresa antes de `since`
+    version = entradas[-1]["version"] if entradas else since
+    version = max(since, min(version, await _version_consolidada()))
+
+    eliminados = {e["doc_id"] for e in entradas if e.get("eliminado")}
+    pendientes = [e["doc_id"] for e in entradas if not e.get("eliminado")]
+    documentos = []
+    if pendientes:
+        documentos = await db[coleccion].find({**filtro, "_id": {"$in": _object_ids(pendientes)}}).to_list()
+    encontrados = {str(d["_id"]) for d in documentos}
+    # Cambiados que ya no pasan el filtro (desactivados) o que ya no existen
+    eliminados.update(doc_id for doc_id in pendientes if doc_id not in encontrados)
+
+    return {
+        "version": version,
+        "completo": False,
+        "cambios": schema(documentos),
+        "eliminados": sorted(eliminados),
+    }
@@ -0,0 +1,129 @@
+"""
+Catalogo de productos en memoria del proceso.
+
+Se carga completo al arrancar, indexado por id, y guarda la lista ya
+serializada (el mismo JSON que producia /productos/all con response_model)
+hasta el siguiente cambio. Las escrituras de routers/productos.py lo
+actualizan directamente (write-through); los broadcasts "*-product:<id>"
+que llegan por el backplane, incluidos los de otros workers, releen ese
+documento de Mongo para que todos los workers converjan.
+
+El ETag de la lista es un hash del JSON ya serializado: cambia junto con
+los datos (nunca se manda un ETag nuevo con datos viejos) y es el mismo en
+todos los workers que tienen el mismo catalogo.
+"""
+import asyncio
+import hashlib
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from core.database import db
+from core.versiones import coincide_etag
+from core.websocket_manager import temas_de_mensaje
+from models.producto import Producto
+from schemas.producto import producto_schema
+
+ENTIDAD = "product"  # nombre de la entidad en los broadcasts de productos
+_lista_productos = TypeAdapter(list[Producto])
+
+
+class CatalogoProductos:
+    def __init__(self, coleccion=None):
+        # Otra coleccion solo para benchmarks; por defecto pbstation.productos
+        self.coleccion = coleccion if coleccion is not None else db.productos
+        self._por_id: dict[str, dict] = {}
+        self._json: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self.revision = 0
+        self.cargado = False
+        self._lock_carga = asyncio.Lock()
+        self._tareas: set[asyncio.Task] = set()
+
+    async def cargar(self) -> int:
+        """Lee todos los productos de Mongo y reemplaza el catalogo."""
+        documentos = await self.coleccion.find().to_list()
+        self._por_id = {str(d["_id"]): producto_schema(d) for d in documentos}
+        self._cambio()
+        self.cargado = True
+        return len(self._por_id)
+
+    async def asegurar_cargado(self):
+        if self.cargado:
+            return
+        async with self._lock_carga:
+            if not self.cargado:
+                await self.cargar()
+
+    def _cambio(self):
+        self._json = None
+        self._etag = None
+        self.revision += 1
+
+    def poner(self, producto: dict):
+        """Alta o modificacion; `producto` en la forma de producto_schema."""
+        if self._por_id.get(producto["id"]) != producto:
+            self._por_id[producto["id"]] = producto
+            self._cambio()
+
+    def quitar(self, producto_id: str):
+        if self._por_id.pop(str(producto_id), None) is not None:
+            self._cambio()
+
+    def obtener(self, producto_id: str) -> Optional[dict]:
+        return self._por_id.get(str(producto_id))
+
+    def lista(self) -> list[dict]:
+        return list(self._por_id.values())
+
+    def json(self) -> bytes:
+        """Lista serializada; se arma una vez por revision."""
+        if self._json is None:
+            self._json = _lista_productos.dump_json(_lista_productos.validate_python(self.lista()))
+        return self._json
+
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = f'"{ENTIDAD}-{hashlib.blake2b(self.json(), digest_size=8).hexdigest()}"'
+        return self._etag
+
+    def respuesta(self, request: Request) -> Response:
+        """GET condicional de la lista completa (304 si el ETag coincide)."""
+        etag = self.etag()
+        encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+        if coincide_etag(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=encabezados)
+        return Response(content=self.json(), media_type="application/json", headers=encabezados)
+
+    async def refrescar(self, producto_id: str):
+        """Relee un producto de Mongo (o lo quita si ya no existe)."""
+        try:
+            documento = await self.coleccion.find_one({"_id": ObjectId(producto_id)})
+        except InvalidId:
+            return
+        except Exception as e:
+            # Sin Mongo no se puede confirmar el cambio: se recarga completo la proxima vez
+            print(f"[ERROR] No se pudo refrescar el producto {producto_id}: {e}")
+            self.cargado = False
+            return
+        if documento is None:
+            self.quitar(producto_id)
+        else:
+            self.poner(producto_schema(documento))
+
+    def registrar_mensaje(self, message: str):
+        """Observador del ConnectionManager para los broadcasts de productos."""
+        if not self.cargado:
+            return
+        entidad, documento = temas_de_mensaje(message)
+        if entidad != ENTIDAD or documento is None:
+            return
+        tarea = asyncio.create_task(self.refrescar(documento.split(":", 1)[1]))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+
+catalogo_productos = CatalogoProductos()
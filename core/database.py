@@ -1,6 +1,55 @@
+import asyncio
 import os
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
+from pymongo.errors import AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError
+from core.instrumentacion import monitor_comandos
 
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-db_client = MongoClient(MONGODB_URL)
-db = db_client.pbstation
\ No newline at end of file
+# Pool y tiempos de espera del cliente
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", 0))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 5000))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 10000))
+# Tiempo maximo por operacion (0 = sin limite)
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", 0))
+# Politica de reintentos: el driver reintenta una vez lecturas/escrituras
+# retryables; con_reintentos() agrega reintentos con espera para operaciones idempotentes
+MONGODB_RETRY_READS = os.getenv("MONGODB_RETRY_READS", "true") == "true"
+MONGODB_RETRY_WRITES = os.getenv("MONGODB_RETRY_WRITES", "true") == "true"
+MONGODB_REINTENTOS = int(os.getenv("MONGODB_REINTENTOS", 2))
+MONGODB_REINTENTO_ESPERA_MS = int(os.getenv("MONGODB_REINTENTO_ESPERA_MS", 200))
+
+db_client = AsyncMongoClient(
+    MONGODB_URL,
+    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+    minPoolSize=MONGODB_MIN_POOL_SIZE,
+    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    timeoutMS=MONGODB_TIMEOUT_MS or None,
+    retryReads=MONGODB_RETRY_READS,
+    retryWrites=MONGODB_RETRY_WRITES,
+    event_listeners=[monitor_comandos],
+)
+db = db_client.pbstation
+
+ERRORES_TRANSITORIOS = (AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError)
+
+
+async def con_reintentos(operacion, *args, **kwargs):
+    """
+    Ejecuta una operacion asincrona idempotente reintentando errores de red
+    transitorios con espera exponencial. No usar con escrituras no idempotentes.
+    """
+    intento = 0
+    while True:
+        try:
+            return await operacion(*args, **kwargs)
+        except ERRORES_TRANSITORIOS:
+            if intento >= MONGODB_REINTENTOS:
+                raise
+            await asyncio.sleep(MONGODB_REINTENTO_ESPERA_MS * (2 ** intento) / 1000)
+            intento += 1
+
+
+async def cerrar_conexion():
+    await db_client.close()
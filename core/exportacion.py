@@ -0,0 +1,219 @@
+"""
+Exportacion de ventas en CSV o XLSX sin cargar el rango en memoria.
+
+recorrer_ventas() lee `ventas` por lotes con el mismo cursor por llave que
+core.paginacion (fecha_venta, _id ascendente): cada lote continua despues
+del ultimo documento del anterior, asi que un año cuesta lo mismo por lote
+que un dia y no queda un cursor de Mongo abierto mientras el cliente
+descarga. Cada lote se convierte en filas (una por venta o una por linea de
+`detalles`) y se manda en cuanto esta listo.
+
+El XLSX se escribe a mano (sin openpyxl): es un zip con una sola hoja cuyas
+celdas van como inlineStr, para no tener que juntar todas las cadenas en
+sharedStrings. zipfile escribe con descriptores de datos cuando el destino
+no permite seek, asi que el zip tambien sale por partes.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, Iterable, Iterator, Optional
+from xml.sax.saxutils import escape
+
+from bson import Decimal128, ObjectId
+from pymongo import ASCENDING
+
+from core.database import db
+from core.paginacion import filtro_despues
+
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", "1000"))
+
+COLUMNAS_VENTA = (
+    "id", "folio", "fecha_venta", "sucursal_id", "cliente_id", "usuario_id", "subtotal", "descuento",
+    "iva", "total", "tipo_tarjeta", "recibido_mxn", "recibido_us", "recibido_tarj", "recibido_trans",
+    "recibido_total", "abonado_total", "cambio", "liquidado", "was_deuda", "cancelado",
+    "motivo_cancelacion", "factura_id", "comentarios_venta",
+)
+# Datos de la venta que se repiten en cada linea de detalle
+COLUMNAS_VENTA_DETALLE = ("venta_id", "folio", "fecha_venta", "sucursal_id", "cliente_id", "liquidado", "cancelado")
+COLUMNAS_DETALLE = (
+    "producto_id", "cantidad", "ancho", "alto", "descuento", "descuento_aplicado", "iva", "subtotal",
+    "total", "cotizacion_precio", "comentarios",
+)
+
+NIVELES = {
+    "venta": COLUMNAS_VENTA,
+    "detalle": COLUMNAS_VENTA_DETALLE + COLUMNAS_DETALLE,
+}
+
+
+async def recorrer_ventas(filtros: dict, lote: int = EXPORTACION_LOTE) -> AsyncIterator[list[dict]]:
+    """Lotes de ventas de `filtros` en orden (fecha_venta, _id)."""
+    proyeccion = {campo: 1 for campo in COLUMNAS_VENTA if campo != "id"}
+    proyeccion["detalles"] = 1
+    orden = [("fecha_venta", ASCENDING), ("_id", ASCENDING)]
+
+    ultimo: Optional[dict] = None
+    while True:
+        consulta = filtros
+        if ultimo is not None:
+            despues = filtro_despues("fecha_venta", [ultimo.get("fecha_venta"), ultimo["_id"]], ASCENDING)
+            consulta = {"$and": [filtros, despues]}
+        documentos = await db.ventas.find(consulta, proyeccion).sort(orden).limit(lote).to_list()
+        if not documentos:
+            return
+        yield documentos
+        if len(documentos) < lote:
+            return
+        ultimo = documentos[-1]
+
+
+def _valor(valor):
+    """Valor de Mongo a algo que entienden csv y la hoja (sin perder precision en Decimal128)."""
+    if isinstance(valor, Decimal128):
+        return valor.to_decimal()
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    return valor
+
+
+def filas_de_ventas(ventas: Iterable[dict], nivel: str) -> Iterator[list]:
+    """Una fila por venta (nivel="venta") o una por linea de detalles (nivel="detalle")."""
+    for venta in ventas:
+        if nivel == "venta":
+            yield [_valor(venta["_id"] if campo == "id" else venta.get(campo)) for campo in COLUMNAS_VENTA]
+            continue
+        comunes = [_valor(venta["_id"] if campo == "venta_id" else venta.get(campo)) for campo in COLUMNAS_VENTA_DETALLE]
+        for detalle in venta.get("detalles") or []:
+            yield comunes + [_valor(detalle.get(campo)) for campo in COLUMNAS_DETALLE]
+
+
+# ─────────────────────────────── CSV ───────────────────────────────────
+def _texto_csv(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return str(valor)
+
+
+async def exportar_csv(filtros: dict, nivel: str) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel abra el UTF-8 con acentos bien
+    buffer.write("\ufeff")
+    escritor.writerow(NIVELES[nivel])
+    async for ventas in recorrer_ventas(filtros):
+        for fila in filas_de_ventas(ventas, nivel):
+            escritor.writerow([_texto_csv(v) for v in fila])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ─────────────────────────────── XLSX ──────────────────────────────────
+_XLSX_FIJOS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Ventas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+# Caracteres de control que XML no admite ni escapados
+_NO_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _Sumidero:
+    """Destino del zip sin seek: guarda lo escrito hasta que el generador lo manda."""
+
+    def __init__(self):
+        self._partes: list[bytes] = []
+
+    def write(self, datos: bytes) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _celda(valor) -> str:
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f"<c><v>{valor}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_NO_XML.sub("", str(valor)))}</t></is></c>'
+
+
+def _fila_xlsx(valores: Iterable) -> bytes:
+    return ("<row>" + "".join(_celda(v) for v in valores) + "</row>").encode("utf-8")
+
+
+async def exportar_xlsx(filtros: dict, nivel: str) -> AsyncIterator[bytes]:
+    sumidero = _Sumidero()
+    with zipfile.ZipFile(sumidero, "w", zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            libro.writestr(nombre, contenido)
+        with libro.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja.write(_fila_xlsx(NIVELES[nivel]))
+            async for ventas in recorrer_ventas(filtros):
+                for fila in filas_de_ventas(ventas, nivel):
+                    hoja.write(_fila_xlsx(fila))
+                yield sumidero.vaciar()
+            hoja.write(b"</sheetData></worksheet>")
+    yield sumidero.vaciar()
+
+
+FORMATOS = {
+    "csv": (exportar_csv, "text/csv; charset=utf-8"),
+    "xlsx": (exportar_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
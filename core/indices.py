@@ -0,0 +1,270 @@
+"""
+Registro de indices de la base de datos.
+
+Cada coleccion declara los indices que necesitan las consultas de los routers.
+aplicar_indices() los crea al arrancar (create_indexes es idempotente) y
+verificar_consultas() corre explain() sobre las consultas conocidas para
+comprobar que ninguna termina en COLLSCAN.
+
+Uso desde linea de comandos:
+    python -m core.indices              # crea/verifica los indices
+    python -m core.indices --verificar  # crea los indices y revisa los planes
+"""
+import argparse
+import asyncio
+import re
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+def _idx(*campos, **opciones) -> IndexModel:
+    """Atajo: _idx(("campo", ASCENDING), ...) o _idx("campo")."""
+    keys = [(c, ASCENDING) if isinstance(c, str) else c for c in campos]
+    return IndexModel(keys, **opciones)
+
+
+INDICES: dict[str, list[IndexModel]] = {
+    "sesiones": [
+        _idx("session_id", unique=True),
+        _idx("user_id"),
+        _idx("expires_at"),
+    ],
+    "ventas": [
+        # buscar_venta_por_folio / search_venta
+        _idx("folio"),
+        # reportes._base_match (liquidado + rango de fecha, opcional sucursal)
+        _idx("liquidado", ("fecha_venta", DESCENDING)),
+        _idx("sucursal_id", "liquidado", ("fecha_venta", DESCENDING)),
+        # reportes: canceladas del periodo
+        _idx("cancelado", ("fecha_venta", DESCENDING)),
+        # /ventas/por-dia y /ventas/sin-facturar
+        _idx("factura_id", "liquidado", ("fecha_venta", DESCENDING)),
+        # /ventas/exportar: rango de fechas recorrido por (fecha_venta, _id)
+        _idx("fecha_venta", "_id"),
+        _idx("sucursal_id", "fecha_venta", "_id"),
+    ],
+    "pedidos": [
+        # /pedidos/all: pendientes ordenados por fecha
+        _idx("estado", "fecha"),
+        # /pedidos/historial: $or entregado/cancelado ordenado por fecha_entregado
+        # (con _id al final para el cursor de core.paginacion)
+        _idx("estado", ("fecha_entregado", DESCENDING), ("_id", DESCENDING)),
+        _idx("cancelado", ("fecha_entregado", DESCENDING), ("_id", DESCENDING)),
+        _idx("venta_folio"),
+    ],
+    "cotizaciones": [
+        # scheduler.verificar_cotizaciones_vencidas; /cotizaciones/lista?vigente= (recorrido inverso)
+        _idx("vigente", "fecha_cotizacion", "_id"),
+        # /cotizaciones/all y /cotizaciones/lista (orden fecha, _id para el cursor)
+        _idx(("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)),
+        _idx("sucursal_id", ("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)),
+        _idx("cliente_id", ("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)),
+    ],
+    "contadores": [
+        _idx("impresora_id"),
+    ],
+    "cortes": [
+        # localizar el corte de una venta (multikey)
+        _idx("ventas_ids"),
+    ],
+    "cajas": [
+        # /cajas/all (estado cerrada, opcional sucursal, orden por apertura y _id)
+        _idx("estado", ("fecha_apertura", DESCENDING), ("_id", DESCENDING)),
+        _idx("estado", "sucursal_id", ("fecha_apertura", DESCENDING), ("_id", DESCENDING)),
+        _idx("folio", "estado"),
+        # localizar la caja de un corte (multikey)
+        _idx("cortes_ids"),
+    ],
+    "facturas": [
+        _idx("sucursal_id", ("_id", DESCENDING)),
+    ],
+    # core.acumulados: una fila por clave; los reportes sin sucursal filtran por dia
+    "ventas_por_hora": [
+        _idx("sucursal_id", "dia", "hora", unique=True),
+        _idx("dia"),
+    ],
+    "ventas_por_producto": [
+        _idx("sucursal_id", "dia", "producto_id", unique=True),
+        _idx("dia"),
+    ],
+    "ventas_por_cliente": [
+        _idx("sucursal_id", "dia", "cliente_id", unique=True),
+        _idx("dia"),
+    ],
+    "usuarios": [
+        _idx("correo"),
+        _idx("telefono"),
+    ],
+    "clientes": [
+        _idx("rfc"),
+        _idx("razon_social"),
+        # /clientes/buscar: prefijos normalizados (core.busqueda)
+        _idx("busqueda"),
+        # /clientes/buscar ordena por nombre antes del limite
+        _idx("nombre_normalizado", "_id"),
+    ],
+    "adeudos": [
+        # core.adeudos: un adeudo por (cliente, venta); listas por cliente en orden
+        _idx("cliente_id", "venta_id", unique=True),
+        _idx("cliente_id", "fecha"),
+    ],
+    "productos": [
+        _idx("codigo"),
+    ],
+    "impresoras": [
+        _idx("serie"),
+        _idx("sucursal_id"),
+    ],
+    "cambios": [
+        # core.cambios: una entrada por documento; /<catalogo>/sync y ETag de listas por version
+        _idx("coleccion", "doc_id", unique=True),
+        _idx("coleccion", "version"),
+        # core.cambios._version_consolidada: la mas alta fuera de la ventana
+        _idx("version"),
+    ],
+}
+
+
+# Consultas representativas de los routers: (coleccion, filtro, orden).
+# Las agregaciones de reportes empiezan con $match, asi que basta con
+# revisar el plan del filtro equivalente.
+_HOY = datetime(2025, 1, 1)
+_AYER = datetime(2024, 12, 31)
+_OID = ObjectId("000000000000000000000000")
+
+CONSULTAS: list[tuple[str, dict, list | None]] = [
+    ("sesiones", {"session_id": "x"}, None),
+    ("sesiones", {"user_id": "x", "revoked": False}, None),
+    ("ventas", {"folio": "A25001"}, None),
+    ("ventas", {"liquidado": True, "cancelado": {"$ne": True},
+                "fecha_venta": {"$gte": _AYER, "$lte": _HOY}}, None),
+    ("ventas", {"liquidado": True, "cancelado": {"$ne": True},
+                "fecha_venta": {"$gte": _AYER, "$lte": _HOY}, "sucursal_id": "x"}, None),
+    ("ventas", {"cancelado": True, "fecha_venta": {"$gte": _AYER, "$lte": _HOY}}, None),
+    ("ventas", {"liquidado": False, "cancelado": {"$ne": True}}, None),
+    ("ventas", {"fecha_venta": {"$gte": _AYER, "$lt": _HOY}, "liquidado": True,
+                "factura_id": None, "cancelado": {"$ne": True}}, [("fecha_venta", DESCENDING)]),
+    # /ventas/exportar, siguiente lote (core.exportacion)
+    ("ventas", {"$and": [{"fecha_venta": {"$gte": _AYER, "$lt": _HOY}, "sucursal_id": "x"},
+                         {"$or": [{"fecha_venta": {"$gt": _AYER}}, {"fecha_venta": _AYER, "_id": {"$gt": _OID}}]}]},
+     [("fecha_venta", ASCENDING), ("_id", ASCENDING)]),
+    ("pedidos", {"estado": {"$ne": "entregado"}}, [("fecha", ASCENDING)]),
+    ("pedidos", {"$or": [{"estado": "entregado"}, {"cancelado": True}]},
+     [("fecha_entregado", DESCENDING), ("_id", DESCENDING)]),
+    # siguiente pagina por cursor (core.paginacion)
+    ("pedidos", {"$and": [{"$or": [{"estado": "entregado"}, {"cancelado": True}]},
+                          {"$or": [{"fecha_entregado": {"$lt": _HOY}},
+                                   {"fecha_entregado": _HOY, "_id": {"$lt": _OID}},
+                                   {"fecha_entregado": None}]}]},
+     [("fecha_entregado", DESCENDING), ("_id", DESCENDING)]),
+    ("pedidos", {"venta_folio": "A25001"}, None),
+    ("cotizaciones", {"vigente": True}, None),
+    ("cotizaciones", {}, [("fecha_cotizacion", DESCENDING)]),
+    ("cotizaciones", {"vigente": True, "fecha_cotizacion": {"$gte": _AYER, "$lte": _HOY}},
+     [("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)]),
+    ("cotizaciones", {"sucursal_id": "x"}, [("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)]),
+    ("cotizaciones", {"$and": [{"cliente_id": "x"},
+                               {"$or": [{"fecha_cotizacion": {"$lt": _HOY}},
+                                        {"fecha_cotizacion": _HOY, "_id": {"$lt": _OID}},
+                                        {"fecha_cotizacion": None}]}]},
+     [("fecha_cotizacion", DESCENDING), ("_id", DESCENDING)]),
+    ("contadores", {"impresora_id": "x"}, None),
+    ("cortes", {"ventas_ids": "x"}, None),
+    ("cajas", {"estado": "cerrada"}, [("fecha_apertura", DESCENDING), ("_id", DESCENDING)]),
+    ("cajas", {"estado": "cerrada", "sucursal_id": "x"}, [("fecha_apertura", DESCENDING), ("_id", DESCENDING)]),
+    ("cajas", {"$and": [{"estado": "cerrada"},
+                        {"$or": [{"fecha_apertura": {"$lt": _HOY}},
+                                 {"fecha_apertura": _HOY, "_id": {"$lt": _OID}},
+                                 {"fecha_apertura": None}]}]},
+     [("fecha_apertura", DESCENDING), ("_id", DESCENDING)]),
+    ("cajas", {"folio": "x", "estado": "cerrada"}, None),
+    ("cajas", {"cortes_ids": _OID}, None),
+    ("facturas", {"sucursal_id": "x"}, [("_id", DESCENDING)]),
+    ("facturas", {"$and": [{"sucursal_id": "x"}, {"_id": {"$lt": _OID}}]}, [("_id", DESCENDING)]),
+    ("ventas_por_hora", {"dia": {"$gte": _AYER, "$lte": _HOY}}, None),
+    ("ventas_por_hora", {"dia": {"$gte": _AYER, "$lte": _HOY}, "sucursal_id": "x"}, None),
+    ("ventas_por_producto", {"dia": {"$gte": _AYER, "$lte": _HOY}}, None),
+    ("ventas_por_cliente", {"dia": {"$gte": _AYER, "$lte": _HOY}, "sucursal_id": "x"}, None),
+    ("usuarios", {"correo": "x"}, None),
+    ("usuarios", {"telefono": 0}, None),
+    ("clientes", {"rfc": "x"}, None),
+    ("clientes", {"$and": [{"busqueda": re.compile("^jua")}, {"busqueda": re.compile("^pe")}]}, None),
+    ("clientes", {"busqueda": re.compile("^jua")}, [("nombre_normalizado", ASCENDING), ("_id", ASCENDING)]),
+    ("adeudos", {"cliente_id": "x", "venta_id": "y"}, None),
+    ("adeudos", {"cliente_id": "x"}, [("fecha", ASCENDING)]),
+    ("productos", {"codigo": "x"}, None),
+    ("impresoras", {"sucursal_id": "x"}, None),
+    ("cambios", {"coleccion": "clientes", "version": {"$gt": 0}}, [("version", ASCENDING)]),
+    ("cambios", {"fecha": {"$lt": _HOY}}, [("version", DESCENDING)]),
+    ("cambios", {"coleccion": "clientes"}, [("version", DESCENDING)]),
+]
+
+
+async def aplicar_indices(db) -> bool:
+    """Crea los indices del registro. Es seguro llamarla en cada arranque."""
+    ok = True
+    for coleccion, indices in INDICES.items():
+        try:
+            await db[coleccion].create_indexes(indices)
+        except Exception as e:
+            print(f"[ERROR] Error al crear indices de {coleccion}: {e}")
+            ok = False
+    if ok:
+        print("[OK] Indices verificados.")
+    return ok
+
+
+def _etapas(plan: dict):
+    """Recorre el arbol de un plan de explain y produce cada etapa."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for clave in ("inputStage", "queryPlan"):
+        if clave in plan:
+            yield from _etapas(plan[clave])
+    for hijo in plan.get("inputStages", []):
+        yield from _etapas(hijo)
+
+
+async def verificar_consultas(db) -> list[str]:
+    """Regresa la lista de consultas cuyo plan ganador incluye un COLLSCAN."""
+    fallas = []
+    for coleccion, filtro, orden in CONSULTAS:
+        cursor = db[coleccion].find(filtro)
+        if orden:
+            cursor = cursor.sort(orden)
+        explicacion = await cursor.explain()
+        plan = explicacion.get("queryPlanner", {}).get("winningPlan", {})
+        etapas = list(_etapas(plan))
+        estado = "COLLSCAN" if "COLLSCAN" in etapas else "OK"
+        print(f"[{estado}] {coleccion} {filtro} orden={orden} -> {' > '.join(etapas)}")
+        if estado == "COLLSCAN":
+            fallas.append(f"{coleccion} {filtro}")
+    return fallas
+
+
+async def _main(verificar: bool) -> int:
+    from core.database import db, cerrar_conexion
+    try:
+        if not await aplicar_indices(db):
+            return 1
+        if verificar:
+            fallas = await verificar_consultas(db)
+            if fallas:
+                print(f"[ERROR] {len(fallas)} consulta(s) sin indice")
+                return 1
+        return 0
+    finally:
+        await cerrar_conexion()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indices de pbstation")
+    parser.add_argument("--verificar", action="store_true",
+                        help="corre explain() sobre las consultas conocidas y falla si hay COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.verificar)))
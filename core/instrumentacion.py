@@ -0,0 +1,167 @@
+"""
+Instrumentacion de comandos de MongoDB por peticion HTTP.
+
+MonitorComandos se registra como event listener del cliente de pymongo y
+suma cada comando (duracion y documentos devueltos/afectados) a la medicion
+de la peticion en curso, que vive en una ContextVar. El middleware
+InstrumentacionDB abre esa medicion, la atribuye a la ruta de FastAPI que
+atendio la peticion y, si se pide, agrega el header Server-Timing.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+
+class MedicionPeticion:
+    __slots__ = ("comandos", "duracion_ms", "documentos", "por_comando")
+
+    def __init__(self):
+        self.comandos = 0
+        self.duracion_ms = 0.0
+        self.documentos = 0
+        self.por_comando: dict[str, int] = {}
+
+
+_medicion_actual: ContextVar[Optional[MedicionPeticion]] = ContextVar("medicion_db", default=None)
+
+
+def _documentos_en_respuesta(reply) -> int:
+    """Cuenta los documentos devueltos o afectados segun la forma de la respuesta."""
+    if not isinstance(reply, dict):
+        return 0
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        lote = cursor.get("firstBatch", cursor.get("nextBatch", []))
+        return len(lote)
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] is not None else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+class MonitorComandos(monitoring.CommandListener):
+    """Acumula los comandos de MongoDB en la medicion de la peticion actual."""
+
+    def started(self, event):
+        pass
+
+    def _registrar(self, event, documentos: int):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return
+        medicion.comandos += 1
+        medicion.duracion_ms += event.duration_micros / 1000
+        medicion.documentos += documentos
+        medicion.por_comando[event.command_name] = medicion.por_comando.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        self._registrar(event, _documentos_en_respuesta(event.reply))
+
+    def failed(self, event):
+        self._registrar(event, 0)
+
+
+monitor_comandos = MonitorComandos()
+
+
+class _EstadisticasRutas:
+    """Totales acumulados por ruta (metodo + plantilla de path)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas: dict[str, dict] = {}
+
+    def registrar(self, ruta: str, medicion: MedicionPeticion, duracion_total_ms: float):
+        with self._lock:
+            r = self._rutas.get(ruta)
+            if r is None:
+                r = self._rutas[ruta] = {
+                    "peticiones": 0,
+                    "comandos": 0,
+                    "max_comandos": 0,
+                    "db_ms": 0.0,
+                    "total_ms": 0.0,
+                    "documentos": 0,
+                    "por_comando": {},
+                }
+            r["peticiones"] += 1
+            r["comandos"] += medicion.comandos
+            r["max_comandos"] = max(r["max_comandos"], medicion.comandos)
+            r["db_ms"] += medicion.duracion_ms
+            r["total_ms"] += duracion_total_ms
+            r["documentos"] += medicion.documentos
+            for nombre, cantidad in medicion.por_comando.items():
+                r["por_comando"][nombre] = r["por_comando"].get(nombre, 0) + cantidad
+
+    def resumen(self) -> list[dict]:
+        """Rutas ordenadas por comandos promedio por peticion (las mas ruidosas primero)."""
+        with self._lock:
+            filas = []
+            for ruta, r in self._rutas.items():
+                n = r["peticiones"]
+                filas.append({
+                    "ruta": ruta,
+                    "peticiones": n,
+                    "comandos": r["comandos"],
+                    "comandos_por_peticion": round(r["comandos"] / n, 2),
+                    "max_comandos": r["max_comandos"],
+                    "db_ms_promedio": round(r["db_ms"] / n, 3),
+                    "total_ms_promedio": round(r["total_ms"] / n, 3),
+                    "documentos": r["documentos"],
+                    "por_comando": dict(r["por_comando"]),
+                })
+        filas.sort(key=lambda f: f["comandos_por_peticion"], reverse=True)
+        return filas
+
+    def reiniciar(self):
+        with self._lock:
+            self._rutas.clear()
+
+
+estadisticas_rutas = _EstadisticasRutas()
+
+
+def _nombre_ruta(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "(sin ruta)"
+    return f"{scope.get('method', '')} {path}"
+
+
+class InstrumentacionDB:
+    """
+    Middleware ASGI que mide los comandos de MongoDB de cada peticion HTTP.
+    Con server_timing=True agrega `Server-Timing: db;dur=..` a la respuesta.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = MedicionPeticion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+
+        async def send_con_timing(message):
+            if message["type"] == "http.response.start" and self.server_timing:
+                valor = (
+                    f'db;dur={medicion.duracion_ms:.2f};desc="{medicion.comandos} comandos, '
+                    f'{medicion.documentos} docs"'
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", valor.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_timing)
+        finally:
+            _medicion_actual.reset(token)
+            estadisticas_rutas.registrar(
+                _nombre_ruta(scope), medicion, (time.perf_counter() - inicio) * 1000
+            )
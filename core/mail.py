@@ -33,7 +33,7 @@ async def enviar_correo_base(email_data: EmailSchema):
         attachments=attachments if attachments else None
     )
 
-    config = cargar_config()
+    config = await cargar_config()
     conf = ConnectionConfig(
         MAIL_USERNAME = config.get("mail_username", ""),
         MAIL_PASSWORD = config.get("mail_password", ""),
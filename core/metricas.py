@@ -0,0 +1,237 @@
+"""
+Metricas en formato de texto de Prometheus, sin dependencias externas.
+
+Contadores, gauges e histogramas con etiquetas se registran en `registro`
+y se exportan desde GET /metrics. Los valores que ya viven en otro lado
+(p. ej. conexiones WebSocket) se leen al momento del scrape con
+registro.agregar_recolector().
+"""
+import functools
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: Optional[tuple] = None) -> str:
+    pares = list(zip(nombres, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores: dict[tuple, object] = {}
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        return tuple(str(etiquetas.get(e, "")) for e in self.etiquetas)
+
+    def encabezado(self) -> list[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, cantidad: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def exportar(self) -> list[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        if not valores and not self.etiquetas:
+            valores = [((), 0)]
+        return self.encabezado() + [
+            f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(v)}" for clave, v in valores
+        ]
+
+
+class Gauge(Contador):
+    tipo = "gauge"
+
+    def dec(self, cantidad: float = 1, **etiquetas) -> None:
+        self.inc(-cantidad, **etiquetas)
+
+    def set(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def reemplazar(self, valores: dict) -> None:
+        """Sustituye todas las series; las llaves son tuplas de valores de etiquetas."""
+        with self._lock:
+            self._valores = {tuple(str(v) for v in clave): valor for clave, valor in valores.items()}
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observar(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                serie = self._valores[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self) -> list[str]:
+        with self._lock:
+            valores = [(clave, (list(c), s, n)) for clave, (c, s, n) in self._valores.items()]
+        lineas = self.encabezado()
+        for clave, (conteos, suma, total) in valores:
+            for limite, conteo in zip(self.buckets, conteos):
+                etiquetas = _etiquetas(self.etiquetas, clave, ("le", _numero(limite)))
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {conteo}")
+            etiquetas = _etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: list[_Metrica] = []
+        self._recolectores: list[Callable[[], None]] = []
+
+    def contador(self, *args, **kwargs) -> Contador:
+        return self._agregar(Contador(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self._agregar(Gauge(*args, **kwargs))
+
+    def histograma(self, *args, **kwargs) -> Histograma:
+        return self._agregar(Histograma(*args, **kwargs))
+
+    def _agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def agregar_recolector(self, funcion: Callable[[], None]) -> None:
+        """Registra una funcion que actualiza gauges justo antes de exportar."""
+        self._recolectores.append(funcion)
+
+    def exportar(self) -> str:
+        for recolector in self._recolectores:
+            try:
+                recolector()
+            except Exception as e:
+                print(f"Advertencia: recolector de metricas fallo: {e}")
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+http_peticiones = registro.contador(
+    "pbstation_http_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "estado"))
+http_latencia = registro.histograma(
+    "pbstation_http_latencia_segundos", "Latencia de peticiones HTTP", ("metodo", "ruta"))
+http_en_curso = registro.gauge(
+    "pbstation_http_peticiones_en_curso", "Peticiones HTTP en curso")
+ws_conexiones = registro.gauge(
+    "pbstation_ws_conexiones", "Conexiones WebSocket activas por sucursal", ("sucursal",))
+ws_broadcast = registro.histograma(
+    "pbstation_ws_broadcast_segundos", "Tiempo de encolar un broadcast WebSocket en todas las conexiones", ("tipo",))
+ws_desalojos = registro.contador(
+    "pbstation_ws_desalojos_total", "Conexiones WebSocket desalojadas por envio lento o fallido")
+ws_inactivas_cerradas = registro.contador(
+    "pbstation_ws_inactivas_cerradas_total", "Conexiones WebSocket cerradas por inactividad (heartbeat)")
+ws_backplane_eventos = registro.contador(
+    "pbstation_ws_backplane_eventos_total", "Eventos de broadcast publicados/recibidos en el backplane", ("direccion",))
+ws_mensajes_fusionados = registro.contador(
+    "pbstation_ws_mensajes_fusionados_total", "Mensajes WebSocket fusionados con uno pendiente identico")
+ws_mensajes_descartados = registro.contador(
+    "pbstation_ws_mensajes_descartados_total", "Mensajes WebSocket descartados por cola llena")
+ws_reanudaciones = registro.contador(
+    "pbstation_ws_reanudaciones_total", "Reconexiones WebSocket con ultimo_seq (reenvio o resync)", ("resultado",))
+uploads_bytes = registro.contador(
+    "pbstation_uploads_bytes_total", "Bytes guardados en archivos de pedidos")
+reportes_cache = registro.contador(
+    "pbstation_reportes_cache_total", "Consultas de /reportes resueltas desde la cache o calculadas", ("reporte", "resultado"))
+scheduler_jobs = registro.histograma(
+    "pbstation_scheduler_job_segundos", "Duracion de los jobs del scheduler", ("job", "resultado"),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0))
+
+
+def medir_job(nombre: str):
+    """Decorador para jobs asincronos del scheduler: registra su duracion y resultado."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = "error"
+            try:
+                valor = await funcion(*args, **kwargs)
+                resultado = "ok"
+                return valor
+            finally:
+                scheduler_jobs.observar(time.perf_counter() - inicio, job=nombre, resultado=resultado)
+        return envoltura
+    return decorador
+
+
+class MetricasHTTP:
+    """Middleware ASGI: conteo, latencia por ruta y peticiones en curso."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"codigo": 500}
+
+        async def send_con_estado(message):
+            if message["type"] == "http.response.start":
+                estado["codigo"] = message["status"]
+            await send(message)
+
+        http_en_curso.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            duracion = time.perf_counter() - inicio
+            http_en_curso.dec()
+            # La plantilla de la ruta mantiene acotada la cardinalidad de etiquetas
+            route = scope.get("route")
+            ruta = getattr(route, "path", None) or "(sin ruta)"
+            metodo = scope.get("method", "")
+            http_peticiones.inc(metodo=metodo, ruta=ruta, estado=estado["codigo"])
+            http_latencia.observar(duracion, metodo=metodo, ruta=ruta)
@@ -0,0 +1,139 @@
+"""
+Paginacion por cursor (keyset) para historiales y listados.
+
+En lugar de skip/limit, cada pagina continua despues de la ultima fila de la
+anterior: el cursor guarda (campo de orden, valor, _id) y la siguiente
+consulta filtra `campo < valor OR (campo == valor AND _id < _id)` sobre un
+indice que termina en _id. Mongo empieza directo en ese punto del indice, asi
+que la pagina 100 cuesta lo mismo que la primera.
+
+El total ya no se cuenta en cada peticion: es opcional y se guarda unos
+segundos por filtro (sin filtro se usa la estimacion de la coleccion).
+`page` sigue aceptandose sin cursor para las terminales que aun no mandan
+`cursor`, con el costo de skip de antes.
+
+`page_size` se limita a PAGINACION_MAX_PAGE_SIZE (500 por defecto; antes no
+tenia tope): si se pide mas, la respuesta trae el tamaño aplicado en
+`pagination.page_size` y el resto se pide con `next_cursor`.
+"""
+import base64
+import binascii
+import os
+from typing import Callable, Optional
+
+from bson import json_util
+from fastapi import HTTPException
+from pymongo import DESCENDING
+
+from core.cache import TTLCache
+
+PAGINA_MAXIMA = int(os.getenv("PAGINACION_MAX_PAGE_SIZE", "500"))
+TOTAL_TTL = float(os.getenv("PAGINACION_TOTAL_TTL", "30"))
+
+_totales = TTLCache(512, TOTAL_TTL)
+
+
+def codificar_cursor(campo: str, documento: dict) -> str:
+    """Token opaco con la posicion de `documento` en el orden por `campo`."""
+    valores = [campo, documento["_id"]] if campo == "_id" else [campo, documento.get(campo), documento["_id"]]
+    return base64.urlsafe_b64encode(json_util.dumps(valores).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, campo: str) -> list:
+    """Regresa [valor, _id] (o [_id] si se ordena por _id); 400 si no es un cursor de este listado."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json_util.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    esperados = 2 if campo == "_id" else 3
+    if not isinstance(valores, list) or len(valores) != esperados or valores[0] != campo:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores[1:]
+
+
+def filtro_despues(campo: str, posicion: list, direccion: int = DESCENDING) -> dict:
+    """Condicion para los documentos que van despues de `posicion` en el orden (campo, _id)."""
+    op = "$lt" if direccion == DESCENDING else "$gt"
+    if campo == "_id":
+        return {"_id": {op: posicion[0]}}
+    valor, ultimo_id = posicion
+    # Mongo ordena los nulos (y faltantes) antes que cualquier valor: van al
+    # final en orden descendente y al principio en ascendente
+    if valor is None:
+        condiciones = [{campo: None, "_id": {op: ultimo_id}}]
+        if direccion != DESCENDING:
+            condiciones.append({campo: {"$ne": None}})
+    else:
+        condiciones = [{campo: {op: valor}}, {campo: valor, "_id": {op: ultimo_id}}]
+        if direccion == DESCENDING:
+            condiciones.append({campo: None})
+    return condiciones[0] if len(condiciones) == 1 else {"$or": condiciones}
+
+
+async def contar(coleccion, filtros: dict) -> int:
+    """Total del filtro, guardado TOTAL_TTL segundos; puede ir unos segundos atrasado."""
+    clave = (coleccion.name, json_util.dumps(filtros, sort_keys=True))
+    total = _totales.get(clave)
+    if total is None:
+        if filtros:
+            total = await coleccion.count_documents(filtros)
+        else:
+            total = await coleccion.estimated_document_count()
+        _totales.set(clave, total)
+    return total
+
+
+async def paginar(
+    coleccion,
+    filtros: dict,
+    campo: str,
+    schema: Callable[[list], list],
+    *,
+    page_size: int = 60,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    con_total: bool = True,
+    direccion: int = DESCENDING,
+    proyeccion: Optional[dict] = None,
+) -> dict:
+    """
+    Una pagina de `coleccion` ordenada por (campo, _id) en `direccion`.
+
+    Regresa {"data", "pagination"} con la misma forma que antes mas
+    `next_cursor`; `total`/`total_pages` son None si con_total=False.
+    `proyeccion` debe incluir `campo` para poder armar el cursor.
+    `page_size` se recorta a PAGINA_MAXIMA (ver el docstring del modulo).
+    """
+    page_size = max(1, min(page_size, PAGINA_MAXIMA))
+    page = max(1, page)
+    orden = [("_id", direccion)] if campo == "_id" else [(campo, direccion), ("_id", direccion)]
+
+    consulta = filtros
+    if cursor:
+        posicion = decodificar_cursor(cursor, campo)
+        condicion = filtro_despues(campo, posicion, direccion)
+        consulta = {"$and": [filtros, condicion]} if filtros else condicion
+
+    buscar = coleccion.find(consulta, proyeccion).sort(orden)
+    if not cursor and page > 1:
+        # Compatibilidad con clientes que solo mandan page
+        buscar = buscar.skip((page - 1) * page_size)
+    # Una fila extra para saber si hay siguiente pagina sin contar
+    documentos = await buscar.limit(page_size + 1).to_list()
+    has_next = len(documentos) > page_size
+    documentos = documentos[:page_size]
+
+    total = await contar(coleccion, filtros) if con_total else None
+    return {
+        "data": schema(documentos),
+        "pagination": {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "has_next": has_next,
+            "has_prev": page > 1 or bool(cursor),
+            "next_cursor": codificar_cursor(campo, documentos[-1]) if has_next else None,
+        },
+    }
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import re
 import uuid
@@ -5,6 +6,8 @@ from typing import Iterable
 
 from fastapi import HTTPException, UploadFile
 
+from core.metricas import uploads_bytes
+
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -112,12 +115,14 @@ async def guardar_uploads(pedido_id: str, archivos: list[UploadFile]) -> list[di
         eliminar_rutas(rutas_guardadas)
         raise
 
+    # Solo lo que quedo guardado (un rechazo o un error no cuenta)
+    uploads_bytes.inc(total_size)
     return archivos_guardados
 
 
-def limpiar_archivos_huerfanos(db) -> dict:
+async def limpiar_archivos_huerfanos(db) -> dict:
     rutas_referenciadas = set()
-    for pedido in db.pedidos.find({}, {"archivos.ruta": 1}):
+    async for pedido in db.pedidos.find({}, {"archivos.ruta": 1}):
         for archivo in pedido.get("archivos", []):
             ruta = archivo.get("ruta")
             if not ruta:
@@ -127,6 +132,11 @@ def limpiar_archivos_huerfanos(db) -> dict:
             except HTTPException:
                 continue
 
+    # El recorrido del disco es bloqueante, se hace fuera del event loop
+    return await asyncio.to_thread(_eliminar_no_referenciados, rutas_referenciadas)
+
+
+def _eliminar_no_referenciados(rutas_referenciadas: set) -> dict:
     archivos_eliminados = 0
     carpetas_eliminadas = 0
     base = _upload_base_abs()
@@ -0,0 +1,30 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# Configuración para hashing de contraseñas
+try:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+except AttributeError:
+    # Suprimir el error relacionado con bcrypt
+    pwd_context = None
+
+# bcrypt (costo 12) tarda ~250 ms por operación; se ejecuta en un pool acotado
+# para no bloquear el event loop. El tope limita el uso de CPU en cambios de turno.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+
+
+async def verificar_password(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.verify, plain_password, hashed_password)
+
+
+async def hashear_password(plain_password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.hash, plain_password)
@@ -0,0 +1,72 @@
+"""
+Versiones de los catalogos para GET condicionales (ETag).
+
+Cada escritura de catalogo llama a core.cambios.registrar_cambio(), que
+anota en `cambios` la version global (un contador en Mongo, el mismo para
+todos los workers) del ultimo cambio de cada documento. El ETag de una lista
+es la version mas alta anotada de su coleccion: una sola lectura por el
+indice (coleccion, version) que da lo mismo en cualquier worker, asi que un
+If-None-Match vigente se contesta con 304 sin leer la coleccion ni
+serializar.
+"""
+import functools
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from core.cambios import version_coleccion
+
+# Entidad de las rutas -> coleccion que anota registrar_cambio
+COLECCIONES = {
+    "cliente": "clientes",
+    "sucursal": "sucursales",
+    "usuario": "usuarios",
+    "impresora": "impresoras",
+    "configuracion": "configuracion",
+}
+
+
+async def etag_de(entidad: str, variante: str = "") -> str:
+    version = await version_coleccion(COLECCIONES.get(entidad, entidad))
+    return f'"{entidad}-{version}{"-" + variante if variante else ""}"'
+
+
+def coincide_etag(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (v.strip() for v in if_none_match.split(","))
+
+
+@functools.lru_cache(maxsize=None)
+def _adaptador(modelo) -> TypeAdapter:
+    return TypeAdapter(modelo)
+
+
+async def respuesta_condicional(request: Request, entidad: str, obtener: Callable[[], Awaitable],
+                                modelo: Optional[Any] = None, variante: str = "") -> Response:
+    """
+    Regresa 304 si el cliente ya tiene la version actual de `entidad`; si no,
+    ejecuta `obtener()` y manda el resultado con su ETag. `modelo` es el
+    response_model de la ruta: como aqui se regresa un Response, la
+    validacion/serializacion se hace con el para conservar el mismo JSON.
+    `variante` distingue representaciones de la misma entidad (p. ej. con
+    parametros de consulta) para que no compartan ETag.
+    """
+    # El ETag se toma antes de leer: si hay una escritura en medio, el cliente
+    # recibe datos nuevos con un ETag viejo y solo vuelve a descargar
+    etag = await etag_de(entidad, variante)
+    encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+    if coincide_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=encabezados)
+    datos = await obtener()
+    if modelo is not None:
+        adaptador = _adaptador(modelo)
+        contenido = adaptador.dump_json(adaptador.validate_python(datos))
+    else:
+        contenido = json.dumps(jsonable_encoder(datos), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return Response(content=contenido, media_type="application/json", headers=encabezados)
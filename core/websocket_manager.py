@@ -1,21 +1,198 @@
-from typing import List, Dict, Optional
+from collections import OrderedDict, deque
+from decimal import Decimal
+from typing import Callable, Iterable, List, Dict, Optional, Set
+from bson import Decimal128, ObjectId
 from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+import asyncio
+import json
+import os
+import time
 import uuid
+from core.backplane import BackplaneMemoria
+from core.metricas import (
+    ws_broadcast, ws_desalojos, ws_inactivas_cerradas, ws_mensajes_descartados,
+    ws_mensajes_fusionados, ws_reanudaciones,
+)
+
+# Segundos máximos para entregar un mensaje a una conexión antes de desalojarla
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 2))
+# Mensajes pendientes por conexión antes de empezar a descartar los más viejos
+WS_QUEUE_MAX = int(os.getenv("WS_QUEUE_MAX", 256))
+# Broadcasts recientes que se guardan para reenviar a clientes que se reconectan
+WS_REPLAY_MAX = int(os.getenv("WS_REPLAY_MAX", 1000))
+# Heartbeat: cada WS_PING_INTERVAL segundos se envía ping a las conexiones del
+# protocolo 2 que no han mandado nada en ese lapso; las que ya mandaron algún
+# `ping`/`pong` de texto y pasan WS_IDLE_TIMEOUT sin actividad (half-open,
+# tablet dormida) se cierran. 0 desactiva. El protocolo 1 no entiende un ping
+# de texto: esas conexiones dependen del ping del propio WebSocket que manda
+# uvicorn (--ws-ping-interval / --ws-ping-timeout, 20 s por defecto).
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 25))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 90))
+
+# Protocolo 1: texto plano `accion:id`. Protocolo 2 (opt-in con ?protocolo=2):
+# JSON {"v": 2, "evento": accion, "id": id, "datos" | "cambios": ...}
+PROTOCOLO_V2 = 2
+# Decimal como texto, igual que las respuestas HTTP con response_model
+_ENCODERS_BSON = {ObjectId: str, Decimal128: lambda d: str(d.to_decimal()), Decimal: str}
+MENSAJE_PING_V2 = json.dumps({"v": PROTOCOLO_V2, "evento": "ping"})
+
+
+# Verbos que se quitan de la acción para obtener el tema de entidad:
+# `put-cliente:<id>` -> temas "cliente" y "cliente:<id>"
+VERBOS_TEMA = ("post", "put", "update", "delete", "reload")
+MAX_TEMAS_POR_CONEXION = 100
+
+
+def temas_de_mensaje(message: str) -> tuple[str, Optional[str]]:
+    """Tema de entidad y tema de documento (si el mensaje trae id)."""
+    accion, _, entidad_id = message.partition(":")
+    verbo, separador, resto = accion.partition("-")
+    entidad = resto if separador and verbo in VERBOS_TEMA else accion
+    return entidad, (f"{entidad}:{entidad_id}" if entidad_id else None)
+
+
+def a_json(datos):
+    """Serializa modelos/documentos igual que las respuestas HTTP."""
+    return jsonable_encoder(datos, custom_encoder=_ENCODERS_BSON)
+
+
+def calcular_cambios(anterior, nuevo) -> dict:
+    """Delta compacto: solo los campos de `nuevo` que difieren de `anterior`."""
+    anterior, nuevo = a_json(anterior), a_json(nuevo)
+    return {k: v for k, v in nuevo.items() if k != "id" and anterior.get(k) != v}
+
+
+def sobre_v2(message: str, datos=None, cambios: Optional[dict] = None) -> str:
+    """Construye (una sola vez por escritura) el mensaje del protocolo 2."""
+    evento, _, entidad_id = message.partition(":")
+    sobre = {"v": PROTOCOLO_V2, "evento": evento, "id": entidad_id or None}
+    if cambios is not None:
+        sobre["cambios"] = a_json(cambios)
+    elif datos is not None:
+        sobre["datos"] = a_json(datos)
+    return json.dumps(sobre, separators=(",", ":"))
+
+
+class ColaSalida:
+    """
+    Cola acotada de mensajes salientes de una conexión, drenada por su propia
+    tarea escritora. Un mensaje con la misma clave que uno pendiente (p. ej. el
+    mismo `update-venta:<id>`) lo reemplaza y pasa al final (los `cambios` del
+    protocolo 2 se encolan sin clave: cada uno trae solo los campos de su
+    escritura y reemplazar uno perderia los anteriores); si la cola se
+    llena se descarta el más viejo y el cliente recibe `overflow:<n>` antes
+    del siguiente mensaje para que recargue.
+    """
+
+    def __init__(self, websocket: WebSocket, al_fallar: Callable[[WebSocket], None],
+                 maximo: int = WS_QUEUE_MAX, protocolo: int = 1):
+        self.websocket = websocket
+        self.maximo = maximo
+        self.protocolo = protocolo
+        self.descartados = 0
+        # clave (mensaje legado) -> mensaje a enviar
+        self._pendientes: "OrderedDict[str, str]" = OrderedDict()
+        self._hay_mensajes = asyncio.Event()
+        self._al_fallar = al_fallar
+        self.tarea = asyncio.create_task(self._escritor())
+
+    def encolar(self, message: str, clave: Optional[str] = None):
+        clave = clave or message
+        if clave in self._pendientes:
+            self._pendientes[clave] = message
+            self._pendientes.move_to_end(clave)
+            ws_mensajes_fusionados.inc()
+        else:
+            self._pendientes[clave] = message
+            if len(self._pendientes) > self.maximo:
+                self._pendientes.popitem(last=False)
+                self.descartados += 1
+                ws_mensajes_descartados.inc()
+        self._hay_mensajes.set()
+
+    def __len__(self) -> int:
+        return len(self._pendientes)
+
+    def _mensaje_overflow(self, descartados: int) -> str:
+        if self.protocolo == PROTOCOLO_V2:
+            return json.dumps({"v": PROTOCOLO_V2, "evento": "overflow", "descartados": descartados})
+        return f"overflow:{descartados}"
+
+    async def _escritor(self):
+        try:
+            while True:
+                await self._hay_mensajes.wait()
+                self._hay_mensajes.clear()
+                while self._pendientes:
+                    if self.descartados:
+                        message = self._mensaje_overflow(self.descartados)
+                        self.descartados = 0
+                    else:
+                        _, message = self._pendientes.popitem(last=False)
+                    await asyncio.wait_for(self.websocket.send_text(message), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Conexión lenta o cerrada
+            self._al_fallar(self.websocket)
+
 
 class ConnectionManager:
     def __init__(self):
-        # Mantener las conexiones generales
-        self.active_connections: List[WebSocket] = []
+        # Mantener las conexiones generales (sets/dicts: alta y baja O(1))
+        self.active_connections: Set[WebSocket] = set()
         # Estructuras para manejar sucursales
-        self.sucursal_connections: Dict[str, List[WebSocket]] = {}
+        self.sucursal_connections: Dict[str, Set[WebSocket]] = {}
         self.connection_to_sucursal: Dict[WebSocket, str] = {}
         # NUEVO: Mapeo de WebSocket a ID único de conexión
         self.websocket_to_id: Dict[WebSocket, str] = {}
         self.id_to_websocket: Dict[str, WebSocket] = {}
+        # Cola de salida (con su tarea escritora) de cada conexión
+        self.colas: Dict[WebSocket, ColaSalida] = {}
+        # Último mensaje recibido de cada conexión (time.monotonic)
+        self.ultima_actividad: Dict[WebSocket, float] = {}
+        # Conexiones que mandan ping/pong de texto: solo esas se cierran por inactividad
+        self.con_heartbeat: Set[WebSocket] = set()
+        self._tarea_heartbeat: Optional[asyncio.Task] = None
+        # Funciones llamadas con cada mensaje entregado (p. ej. catálogo de productos)
+        self.observadores: List[Callable[[str], None]] = []
+        # Eventos internos entre workers (no van a ningún socket): tipo -> funciones
+        self.observadores_internos: Dict[str, List[Callable[[dict], None]]] = {}
+        # Suscripciones: índice tema -> conexiones. Las conexiones sin temas
+        # reciben todos los broadcasts generales (comportamiento original)
+        self.suscriptores: Dict[str, Set[WebSocket]] = {}
+        self.temas_por_conexion: Dict[WebSocket, Set[str]] = {}
+        self.sin_filtro: Set[WebSocket] = set()
+        # Referencias a cierres en segundo plano para que no los recoja el GC
+        self._tareas_cierre: set = set()
+        # Secuencia de los broadcasts entregados por este worker. La época cambia
+        # en cada arranque: un cliente con otra época debe recargar todo
+        self.epoca = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.historial: deque = deque(maxlen=WS_REPLAY_MAX)
+        # Los broadcasts pasan por el backplane para llegar a todos los workers
+        self.backplane = BackplaneMemoria()
+        self._backplane_iniciado = False
+
+    async def iniciar_backplane(self, backplane=None):
+        """Conecta el manager a un backplane (memoria por defecto) y empieza a recibir."""
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.iniciar(self.entregar)
+        self._backplane_iniciado = True
+
+    async def detener_backplane(self):
+        await self.backplane.detener()
+        self._backplane_iniciado = False
 
-    async def connect(self, websocket: WebSocket, sucursal_id: str = None) -> str:
+    async def connect(self, websocket: WebSocket, sucursal_id: str = None, protocolo: int = 1,
+                      temas: Optional[Iterable[str]] = None) -> str:
         """
-        Conecta un WebSocket y retorna un ID único de conexión
+        Conecta un WebSocket y retorna un ID único de conexión.
+        protocolo=2 recibe notificaciones JSON con el documento o sus cambios.
+        temas limita los broadcasts generales a entidades (`cliente`),
+        documentos (`cliente:<id>`) o sucursales ajenas (`sucursal:<id>`).
         """
         await websocket.accept()
         
@@ -23,51 +200,178 @@ class ConnectionManager:
         connection_id = str(uuid.uuid4())
         
         # Guardar mapeos
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
+        self.ultima_actividad[websocket] = time.monotonic()
         self.websocket_to_id[websocket] = connection_id
         self.id_to_websocket[connection_id] = websocket
+        self.colas[websocket] = ColaSalida(websocket, self._desalojar, protocolo=protocolo)
+        self._suscribir(websocket, temas)
         
         # Si especifica sucursal, agregarlo al grupo
         if sucursal_id:
-            if sucursal_id not in self.sucursal_connections:
-                self.sucursal_connections[sucursal_id] = []
-            self.sucursal_connections[sucursal_id].append(websocket)
+            self.sucursal_connections.setdefault(sucursal_id, set()).add(websocket)
             self.connection_to_sucursal[websocket] = sucursal_id
             print(f"Cliente {connection_id} conectado a sucursal {sucursal_id}. Total: {len(self.active_connections)}")
         else:
             print(f"Cliente {connection_id} conectado (sin sucursal). Total: {len(self.active_connections)}")
-        
+
+        self._asegurar_heartbeat()
         return connection_id
 
     def disconnect(self, websocket: WebSocket):
         """
         Desconecta un WebSocket y limpia todos sus mapeos
         """
+        if websocket not in self.active_connections:
+            return  # ya desconectado (p. ej. desalojado antes del WebSocketDisconnect)
         # Obtener y remover ID de conexión
         connection_id = self.websocket_to_id.get(websocket)
         if connection_id:
             if connection_id in self.id_to_websocket:
                 del self.id_to_websocket[connection_id]
             del self.websocket_to_id[websocket]
+
+        self._desuscribir(websocket)
+
+        # Detener la tarea escritora (salvo que sea ella quien desconecta)
+        cola = self.colas.pop(websocket, None)
+        if cola and cola.tarea is not asyncio.current_task():
+            cola.tarea.cancel()
         
         # Remover de conexiones generales
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
+        self.ultima_actividad.pop(websocket, None)
+        self.con_heartbeat.discard(websocket)
         
         # Remover de grupo de sucursal si existe
-        if websocket in self.connection_to_sucursal:
-            sucursal_id = self.connection_to_sucursal[websocket]
-            if sucursal_id in self.sucursal_connections:
-                if websocket in self.sucursal_connections[sucursal_id]:
-                    self.sucursal_connections[sucursal_id].remove(websocket)
+        sucursal_id = self.connection_to_sucursal.pop(websocket, None)
+        if sucursal_id is not None:
+            grupo = self.sucursal_connections.get(sucursal_id)
+            if grupo is not None:
+                grupo.discard(websocket)
                 # Limpiar grupo vacío
-                if not self.sucursal_connections[sucursal_id]:
+                if not grupo:
                     del self.sucursal_connections[sucursal_id]
-            del self.connection_to_sucursal[websocket]
             print(f"Cliente {connection_id} desconectado de sucursal {sucursal_id}. Total: {len(self.active_connections)}")
         else:
             print(f"Cliente {connection_id} desconectado. Total: {len(self.active_connections)}")
 
+    def registrar_actividad(self, websocket: WebSocket, data: Optional[str] = None):
+        """Marca la conexión como viva (cualquier mensaje entrante, incluido `ping`/`pong`)."""
+        if websocket in self.ultima_actividad:
+            self.ultima_actividad[websocket] = time.monotonic()
+            if data in ("ping", "pong"):
+                self.con_heartbeat.add(websocket)
+
+    def _asegurar_heartbeat(self):
+        if WS_PING_INTERVAL > 0 and (self._tarea_heartbeat is None or self._tarea_heartbeat.done()):
+            self._tarea_heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            try:
+                self.revisar_conexiones()
+            except Exception as e:
+                print(f"[ERROR] Heartbeat WebSocket: {e}")
+
+    def revisar_conexiones(self, ahora: Optional[float] = None) -> int:
+        """
+        Envía ping a las conexiones del protocolo 2 calladas y cierra las
+        inactivas que usan heartbeat de texto. Regresa cuántas cerró.
+        """
+        ahora = ahora if ahora is not None else time.monotonic()
+        cerradas = 0
+        for websocket, ultima in list(self.ultima_actividad.items()):
+            inactiva = ahora - ultima
+            if WS_IDLE_TIMEOUT > 0 and inactiva >= WS_IDLE_TIMEOUT and websocket in self.con_heartbeat:
+                self._desalojar(websocket, contar=False)
+                ws_inactivas_cerradas.inc()
+                cerradas += 1
+            elif inactiva >= WS_PING_INTERVAL:
+                cola = self.colas.get(websocket)
+                if cola is not None and cola.protocolo == PROTOCOLO_V2:
+                    cola.encolar(MENSAJE_PING_V2)
+        return cerradas
+
+    async def detener(self):
+        """Detiene heartbeat y backplane (apagado del servidor)."""
+        if self._tarea_heartbeat:
+            self._tarea_heartbeat.cancel()
+            self._tarea_heartbeat = None
+        await self.detener_backplane()
+
+    def mensaje_connection_id(self, connection_id: str, protocolo: int) -> str:
+        if protocolo == PROTOCOLO_V2:
+            return json.dumps({
+                "v": PROTOCOLO_V2, "evento": "connection_id", "id": connection_id,
+                "epoca": self.epoca, "seq": self.seq,
+            })
+        return f"connection_id:{connection_id}"
+
+    def reanudar(self, websocket: WebSocket, ultimo_seq: Optional[int], epoca: Optional[str]) -> int:
+        """
+        Reenvía a una conexión v2 los broadcasts posteriores a `ultimo_seq` que
+        le habrían llegado. Si la época no coincide o el hueco ya salió del
+        historial, envía `resync` para que el cliente recargue todo.
+        Debe llamarse justo después de connect(), sin awaits que suspendan,
+        para no perder ni duplicar mensajes. Regresa cuántos reenvió (-1 = resync).
+        """
+        cola = self.colas.get(websocket)
+        if cola is None or cola.protocolo != PROTOCOLO_V2 or ultimo_seq is None:
+            return 0
+        primero = self.historial[0][0] if self.historial else self.seq + 1
+        if epoca != self.epoca or ultimo_seq > self.seq or ultimo_seq < primero - 1:
+            cola.encolar(json.dumps({
+                "v": PROTOCOLO_V2, "evento": "resync", "epoca": self.epoca, "seq": self.seq,
+            }))
+            ws_reanudaciones.inc(resultado="resync")
+            return -1
+        reenviados = 0
+        for seq, evento, mensaje_v2 in self.historial:
+            if seq > ultimo_seq and self._acepta(websocket, evento):
+                cola.encolar(mensaje_v2, clave=self._clave_v2(evento))
+                reenviados += 1
+        ws_reanudaciones.inc(resultado="reenvio")
+        return reenviados
+
+    def _acepta(self, websocket: WebSocket, evento: dict) -> bool:
+        """Misma regla de ruteo que entregar(), evaluada para una conexión."""
+        temas = self.temas_por_conexion.get(websocket, ())
+        sucursal_id = evento.get("sucursal_id")
+        if sucursal_id:
+            return self.connection_to_sucursal.get(websocket) == sucursal_id or f"sucursal:{sucursal_id}" in temas
+        if websocket in self.sin_filtro:
+            return True
+        entidad, documento = temas_de_mensaje(evento["mensaje"])
+        return entidad in temas or documento in temas
+
+    def _suscribir(self, websocket: WebSocket, temas: Optional[Iterable[str]]):
+        temas = {t.strip() for t in (temas or []) if t and t.strip()}
+        if not temas:
+            self.sin_filtro.add(websocket)
+            return
+        temas = set(sorted(temas)[:MAX_TEMAS_POR_CONEXION])
+        self.temas_por_conexion[websocket] = temas
+        for tema in temas:
+            self.suscriptores.setdefault(tema, set()).add(websocket)
+
+    def _desuscribir(self, websocket: WebSocket):
+        self.sin_filtro.discard(websocket)
+        for tema in self.temas_por_conexion.pop(websocket, ()):
+            conexiones = self.suscriptores.get(tema)
+            if conexiones is not None:
+                conexiones.discard(websocket)
+                if not conexiones:
+                    del self.suscriptores[tema]
+
+    def _interesados(self, *temas: Optional[str]) -> Set[WebSocket]:
+        interesados: Set[WebSocket] = set()
+        for tema in temas:
+            if tema and tema in self.suscriptores:
+                interesados |= self.suscriptores[tema]
+        return interesados
+
     def get_websocket_by_connection_id(self, connection_id: str) -> Optional[WebSocket]:
         """
         Obtiene el WebSocket asociado a un connection_id
@@ -81,62 +385,139 @@ class ConnectionManager:
         return self.websocket_to_id.get(websocket)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        cola = self.colas.get(websocket)
+        if cola is not None:
+            cola.encolar(message)
+        else:
+            await websocket.send_text(message)
+
+    def _desalojar(self, websocket: WebSocket, contar: bool = True):
+        """Saca una conexión lenta o muerta y la cierra sin bloquear al resto."""
+        self.disconnect(websocket)
+        if contar:
+            ws_desalojos.inc()
+
+        async def cerrar():
+            try:
+                await asyncio.wait_for(websocket.close(code=1011), WS_SEND_TIMEOUT)
+            except Exception:
+                pass
+        tarea = asyncio.create_task(cerrar())
+        self._tareas_cierre.add(tarea)
+        tarea.add_done_callback(self._tareas_cierre.discard)
 
-    async def broadcast(self, message: str, exclude_connection_id: str = None):
+    @staticmethod
+    def _clave_v2(evento: dict) -> Optional[str]:
         """
-        Envía mensaje a todas las conexiones excepto la especificada por connection_id
+        Clave de fusión del mensaje v2: la del mensaje legado, salvo si lleva
+        `cambios` (None: el mensaje sellado con su seq es su propia clave).
         """
-        # Obtener el WebSocket a excluir si se proporcionó un ID
-        exclude_ws = None
-        if exclude_connection_id:
-            exclude_ws = self.id_to_websocket.get(exclude_connection_id)
-        
-        disconnected = []
-        for connection in self.active_connections:
-            if connection == exclude_ws:
+        return None if evento.get("delta") else evento["mensaje"]
+
+    def _difundir(self, conexiones: Iterable[WebSocket], message: str, exclude_ws: Optional[WebSocket],
+                  mensaje_v2: Optional[str] = None, clave_v2: Optional[str] = None):
+        """Encola el mensaje en cada conexión; nunca espera a la red."""
+        mensaje_v2 = mensaje_v2 or sobre_v2(message)
+        for connection in conexiones:
+            if connection is exclude_ws:
                 continue  # Saltar la conexión excluida
+            cola = self.colas.get(connection)
+            if cola is None:
+                continue
+            if cola.protocolo == PROTOCOLO_V2:
+                cola.encolar(mensaje_v2, clave=clave_v2)
+            else:
+                cola.encolar(message)
+
+    async def _publicar(self, evento: dict):
+        if not self._backplane_iniciado:
+            await self.iniciar_backplane()
+        await self.backplane.publicar(evento)
+
+    async def publicar_interno(self, tipo: str, datos: dict):
+        """
+        Publica un evento solo para los workers (p. ej. invalidar caches): pasa
+        por el mismo backplane que los broadcasts pero no se manda a los sockets.
+        """
+        await self._publicar({"interno": tipo, "datos": datos})
+
+    def _entregar_interno(self, evento: dict):
+        for observador in self.observadores_internos.get(evento["interno"], ()):
             try:
-                await connection.send_text(message)
-            except:
-                # Conexión cerrada, marcar para remover
-                disconnected.append(connection)
-        
-        # Limpiar conexiones cerradas
-        for connection in disconnected:
-            self.disconnect(connection)
+                observador(evento.get("datos") or {})
+            except Exception as e:
+                print(f"[ERROR] Observador de evento interno {evento['interno']}: {e}")
 
-    async def broadcast_to_sucursal(self, message: str, sucursal_id: str, exclude_connection_id: str = None):
+    def entregar(self, evento: dict):
         """
-        Envía mensaje solo a conexiones de una sucursal específica, excepto la especificada por connection_id
+        Entrega un evento del backplane a las conexiones de este worker.
+        El connection_id excluido solo existe en el worker que lo tiene.
         """
-        if sucursal_id in self.sucursal_connections:
-            # Obtener el WebSocket a excluir si se proporcionó un ID
-            exclude_ws = None
-            if exclude_connection_id:
-                exclude_ws = self.id_to_websocket.get(exclude_connection_id)
-            
-            disconnected = []
-            for connection in self.sucursal_connections[sucursal_id]:
-                if connection == exclude_ws:
-                    continue  # Saltar la conexión excluida
-                try:
-                    await connection.send_text(message)
-                except:
-                    # Conexión cerrada, marcar para remover
-                    disconnected.append(connection)
-            
-            # Limpiar conexiones cerradas
-            for connection in disconnected:
-                self.disconnect(connection)
-            
-            print(f"Mensaje enviado a sucursal {sucursal_id}: {message}")
+        if evento.get("interno"):
+            self._entregar_interno(evento)
+            return
+        # Sellar con la secuencia local y guardar para reanudaciones
+        self.seq += 1
+        mensaje_v2 = evento.get("mensaje_v2") or sobre_v2(evento["mensaje"])
+        mensaje_v2 = f'{{"seq":{self.seq},{mensaje_v2[1:]}'
+        self.historial.append((self.seq, evento, mensaje_v2))
+        for observador in self.observadores:
+            try:
+                observador(evento["mensaje"])
+            except Exception as e:
+                print(f"[ERROR] Observador de broadcast: {e}")
+
+        exclude_ws = None
+        if evento.get("exclude_connection_id"):
+            exclude_ws = self.id_to_websocket.get(evento["exclude_connection_id"])
+        sucursal_id = evento.get("sucursal_id")
+        if sucursal_id:
+            # Conectados a la sucursal + suscritos a ella desde otra
+            conexiones = set(self.sucursal_connections.get(sucursal_id, ()))
+            conexiones |= self._interesados(f"sucursal:{sucursal_id}")
         else:
-            print(f"No hay conexiones para la sucursal {sucursal_id}")
+            entidad, documento = temas_de_mensaje(evento["mensaje"])
+            conexiones = self.sin_filtro | self._interesados(entidad, documento)
+        self._difundir(conexiones, evento["mensaje"], exclude_ws, mensaje_v2, self._clave_v2(evento))
+
+    async def broadcast(self, message: str, exclude_connection_id: str = None,
+                        datos=None, cambios: Optional[dict] = None, anterior=None):
+        """
+        Envía mensaje a todas las conexiones excepto la especificada por connection_id.
+        Los clientes del protocolo 2 reciben además `datos` (el documento) o
+        `cambios` (explícitos, o calculados contra `anterior`).
+        """
+        inicio = time.perf_counter()
+        if anterior is not None and datos is not None and cambios is None:
+            cambios = calcular_cambios(anterior, datos)
+        await self._publicar({
+            "mensaje": message,
+            "mensaje_v2": sobre_v2(message, datos, cambios),
+            "delta": cambios is not None,
+            "sucursal_id": None,
+            "exclude_connection_id": exclude_connection_id,
+        })
+        ws_broadcast.observar(time.perf_counter() - inicio, tipo="general")
+
+    async def broadcast_to_sucursal(self, message: str, sucursal_id: str, exclude_connection_id: str = None,
+                                    datos=None, cambios: Optional[dict] = None):
+        """
+        Envía mensaje solo a conexiones de una sucursal específica, excepto la especificada por connection_id
+        """
+        inicio = time.perf_counter()
+        await self._publicar({
+            "mensaje": message,
+            "mensaje_v2": sobre_v2(message, datos, cambios),
+            "delta": cambios is not None,
+            "sucursal_id": sucursal_id,
+            "exclude_connection_id": exclude_connection_id,
+        })
+        ws_broadcast.observar(time.perf_counter() - inicio, tipo="sucursal")
+        print(f"Mensaje enviado a sucursal {sucursal_id}: {message}")
 
     def get_sucursal_connections_count(self, sucursal_id: str) -> int:
         """Obtiene el número de conexiones activas para una sucursal"""
-        return len(self.sucursal_connections.get(sucursal_id, []))
+        return len(self.sucursal_connections.get(sucursal_id, ()))
 
     def get_all_sucursales(self) -> List[str]:
         """Obtiene lista de todas las sucursales con conexiones activas"""
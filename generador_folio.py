@@ -7,8 +7,8 @@ from pymongo import ReturnDocument
 # Helpers de formato y abreviación
 # ------------------------------------------------------------------
 
-def obtener_siguiente_prefijo(db) -> str:
-    seq = _get_next_seq_atomic(db, "sucursales:prefijo")
+async def obtener_siguiente_prefijo(db) -> str:
+    seq = await _get_next_seq_atomic(db, "sucursales:prefijo")
     index = seq - 1
     return index_to_base26_letters(index)
 
@@ -17,13 +17,13 @@ def _normalize_prefijo(prefijo: str) -> str:
         return "0"
     return str(prefijo).strip().upper().rstrip('-')
 
-def obtener_prefijo_por_id(db, sucursal_id) -> str:
+async def obtener_prefijo_por_id(db, sucursal_id) -> str:
     try:
         oid = ObjectId(str(sucursal_id))
     except Exception:
-        doc = db.sucursales.find_one({"_id": sucursal_id}, {"prefijo_folio": 1})
+        doc = await db.sucursales.find_one({"_id": sucursal_id}, {"prefijo_folio": 1})
     else:
-        doc = db.sucursales.find_one({"_id": oid}, {"prefijo_folio": 1})
+        doc = await db.sucursales.find_one({"_id": oid}, {"prefijo_folio": 1})
     if not doc:
         return "0"
     return _normalize_prefijo(doc.get("prefijo_folio"))
@@ -75,8 +75,8 @@ def index_to_base26_letters(index: int) -> str:
 # Contador atómico en MongoDB
 # ------------------------------------------------------------------
 
-def _get_next_seq_atomic(db, key: str) -> int:
-    result = db.counters.find_one_and_update(
+async def _get_next_seq_atomic(db, key: str) -> int:
+    result = await db.counters.find_one_and_update(
         {"_id": key},
         {"$inc": {"seq": 1}},
         upsert=True,
@@ -84,7 +84,7 @@ def _get_next_seq_atomic(db, key: str) -> int:
     )
     return int(result["seq"])
 
-def obtener_siguiente_consecutivo(db, coleccion: str, prefijo: str, hoy: datetime) -> int:
+async def obtener_siguiente_consecutivo(db, coleccion: str, prefijo: str, hoy: datetime) -> int:
     coleccion = coleccion.lower()
     suc = str(prefijo or "S").strip()
     if coleccion == "ventas":
@@ -100,44 +100,44 @@ def obtener_siguiente_consecutivo(db, coleccion: str, prefijo: str, hoy: datetim
         key = f"pedidos:{suc}:{anio_YY(hoy)}"
     else:
         key = f"{coleccion}:{prefijo}:{fecha_YYMMDD(hoy)}"
-    return _get_next_seq_atomic(db, key)
+    return await _get_next_seq_atomic(db, key)
 
 # ------------------------------------------------------------------
 # Formateadores concretos por tipo de folio
 # ------------------------------------------------------------------
 
-def generar_folio_venta(db, sucursal_id) -> str:
-    prefijo = obtener_prefijo_por_id(db, sucursal_id)   # 'A', 'AA', o 'S' fallback
+async def generar_folio_venta(db, sucursal_id) -> str:
+    prefijo = await obtener_prefijo_por_id(db, sucursal_id)   # 'A', 'AA', o 'S' fallback
     hoy = datetime.now()
-    seq = obtener_siguiente_consecutivo(db, "ventas", prefijo, hoy)  # tu función atómica existente
+    seq = await obtener_siguiente_consecutivo(db, "ventas", prefijo, hoy)  # tu función atómica existente
     consecutivo = encode_base36(seq, 2)
     return f"{anio_YY(hoy)}{anio_YYY(hoy)}{prefijo}{consecutivo}"
 
-def generar_folio_cotizacion(db) -> str:
+async def generar_folio_cotizacion(db) -> str:
     hoy = datetime.now()
-    seq = obtener_siguiente_consecutivo(db, "cotizaciones", "CT", hoy)
+    seq = await obtener_siguiente_consecutivo(db, "cotizaciones", "CT", hoy)
     consecutivo = encode_base36(seq, 2)
     return f"{anio_YY(hoy)}{anio_YYY(hoy)}{consecutivo}"
 
-def generar_folio_caja(db, sucursal_id: str) -> str:
-    prefijo = obtener_prefijo_por_id(db, sucursal_id)
+async def generar_folio_caja(db, sucursal_id: str) -> str:
+    prefijo = await obtener_prefijo_por_id(db, sucursal_id)
     hoy = datetime.now()
-    seq = obtener_siguiente_consecutivo(db, "cajas", prefijo, hoy)
+    seq = await obtener_siguiente_consecutivo(db, "cajas", prefijo, hoy)
     consecutivo = encode_base36(seq, 2)
     return f"CJ{anio_YY(hoy)}{prefijo}{consecutivo}"
 
-def generar_folio_corte(db, sucursal_id: str) -> str:
-    prefijo = obtener_prefijo_por_id(db, sucursal_id)
+async def generar_folio_corte(db, sucursal_id: str) -> str:
+    prefijo = await obtener_prefijo_por_id(db, sucursal_id)
     suc_char = prefijo
     hoy = datetime.now()
-    seq = obtener_siguiente_consecutivo(db, "cortes", suc_char, hoy)
+    seq = await obtener_siguiente_consecutivo(db, "cortes", suc_char, hoy)
     consecutivo = encode_base36(seq, 1)
     return f"{anio_YY(hoy)}{anio_YYY(hoy)}{suc_char}{consecutivo}"
 
-def generar_folio_pedido(db, sucursal_id: str) -> str:
-    prefijo = obtener_prefijo_por_id(db, sucursal_id)
+async def generar_folio_pedido(db, sucursal_id: str) -> str:
+    prefijo = await obtener_prefijo_por_id(db, sucursal_id)
     hoy = datetime.now()
-    seq = obtener_siguiente_consecutivo(db, "pedidos", prefijo, hoy)
+    seq = await obtener_siguiente_consecutivo(db, "pedidos", prefijo, hoy)
     consecutivo = encode_base36(seq, 3)
     return f"{anio_YY(hoy)}{prefijo}{consecutivo}"
 
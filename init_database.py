@@ -1,33 +1,74 @@
 """
 Inicialización de la base de datos con usuario admin y cliente por defecto
 """
+from bson import Decimal128
+from core.acumulados import asegurar_acumulados
+from core.adeudos import migrar_adeudos_embebidos
 from core.database import db
+from core.busqueda import campos_busqueda, completar_busqueda_clientes
+from core.indices import aplicar_indices
 
-def crear_indices_auth():
+async def crear_indices():
+    """Aplica el registro de indices de core.indices (idempotente)."""
+    return await aplicar_indices(db)
+
+async def completar_busqueda():
+    """
+    Llena `busqueda` y `nombre_normalizado` de los clientes creados antes de
+    /clientes/buscar o de su orden por nombre.
+    Solo toca los que no lo tienen, así que después de la primera vez no hace nada.
+    """
+    try:
+        actualizados = await completar_busqueda_clientes(db)
+        if actualizados:
+            print(f"[OK] Busqueda de clientes completada en {actualizados} cliente(s).")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Error al completar busqueda de clientes: {e}")
+        return False
+
+async def migrar_adeudos():
+    """
+    Pasa los adeudos embebidos en clientes (esquema anterior) a la colección
+    adeudos. Requiere los índices; después de la primera vez no encuentra nada.
+    """
+    try:
+        migrados = await migrar_adeudos_embebidos()
+        if migrados:
+            print(f"[OK] {migrados} adeudo(s) migrados a la colección adeudos.")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Error al migrar adeudos: {e}")
+        return False
+
+async def preparar_acumulados():
+    """
+    Construye los acumulados de ventas de /reportes la primera vez (ventas
+    anteriores a core.acumulados). Si ya existen no hace nada.
+    """
     try:
-        db.sesiones.create_index("session_id", unique=True)
-        db.sesiones.create_index("user_id")
-        db.sesiones.create_index("expires_at")
-        print("[OK] Indices de sesiones verificados.")
+        procesadas = await asegurar_acumulados()
+        if procesadas is not None:
+            print(f"[OK] Acumulados de ventas construidos con {procesadas} venta(s).")
         return True
     except Exception as e:
-        print(f"[ERROR] Error al crear indices de sesiones: {e}")
+        print(f"[ERROR] Error al construir acumulados de ventas: {e}")
         return False
 
-def crear_configuracion_defecto():
+async def crear_configuracion_defecto():
     """
     Crea la configuración por defecto si no existe en la base de datos.
     Solo se ejecuta si la colección de configuracion está vacía.
     """
     try:
-        config = db.configuracion.find_one()
+        config = await db.configuracion.find_one()
         if config is None:
             config_defecto = {
                 "precio_dolar": 18.4,
                 "iva": 8,
                 "last_version": "0.8.8"
             }
-            db.configuracion.insert_one(config_defecto)
+            await db.configuracion.insert_one(config_defecto)
             print("[OK] Configuracion por defecto creada con exito.")
             return True
         else:
@@ -37,14 +78,14 @@ def crear_configuracion_defecto():
         print(f"[ERROR] Error al crear configuracion por defecto: {e}")
         return False
 
-def crear_usuario_admin_defecto():
+async def crear_usuario_admin_defecto():
     """
     Crea un usuario admin por defecto si no hay usuarios en la base de datos.
     Solo se ejecuta si la colección de usuarios está vacía.
     """
     try:
         # Verificar si hay usuarios en la base de datos
-        usuarios_count = db.usuarios.count_documents({})
+        usuarios_count = await db.usuarios.count_documents({})
         
         if usuarios_count == 0:
             # Usuario admin por defecto
@@ -59,7 +100,7 @@ def crear_usuario_admin_defecto():
             }
             
             # Insertar el usuario admin
-            resultado = db.usuarios.insert_one(usuario_admin)
+            resultado = await db.usuarios.insert_one(usuario_admin)
             print(f"[OK] Usuario admin creado con exito. ID: {resultado.inserted_id}")
             return True
         else:
@@ -71,14 +112,14 @@ def crear_usuario_admin_defecto():
         return False
 
 
-def crear_cliente_defecto():
+async def crear_cliente_defecto():
     """
     Crea un cliente 'Público General' por defecto si no hay clientes en la base de datos.
     Solo se ejecuta si la colección de clientes está vacía.
     """
     try:
         # Verificar si hay clientes en la base de datos
-        clientes_count = db.clientes.count_documents({})
+        clientes_count = await db.clientes.count_documents({})
         
         if clientes_count == 0:
             # Cliente público general por defecto
@@ -95,13 +136,15 @@ def crear_cliente_defecto():
                 "no_int": None,
                 "colonia": None,
                 "localidad": None,
-                "adeudos": [],
+                "adeudo_total": Decimal128("0"),
+                "num_adeudos": 0,
                 "protegido": True,
                 "activo": True
             }
+            cliente_publico.update(campos_busqueda(cliente_publico))
             
             # Insertar el cliente
-            resultado = db.clientes.insert_one(cliente_publico)
+            resultado = await db.clientes.insert_one(cliente_publico)
             print(f"[OK] Cliente 'Publico General' creado con exito. ID: {resultado.inserted_id}")
             return True
         else:
@@ -2,11 +2,17 @@ from fastapi import FastAPI
 from dotenv import load_dotenv
 import os
 import routers.facturas as facturas
-from routers import configuracion, productos, usuarios, login, websocket, clientes, ventas, sucursales, cotizaciones, ventas_enviadas, cajas, impresoras, contadores, pedidos, correo, reportes
+from routers import configuracion, productos, usuarios, login, websocket, clientes, ventas, sucursales, cotizaciones, ventas_enviadas, cajas, impresoras, contadores, pedidos, correo, reportes, diagnostico, metricas
 from scheduler import iniciar_scheduler, verificar_cotizaciones_vencidas
-from init_database import crear_configuracion_defecto, crear_usuario_admin_defecto, crear_cliente_defecto, crear_indices_auth
+from init_database import crear_configuracion_defecto, crear_usuario_admin_defecto, crear_cliente_defecto, crear_indices, completar_busqueda, migrar_adeudos, preparar_acumulados
 from schemas.usuario import usuario_public_schema
 from validar_token import revocar_sesion, validar_token
+from core.database import cerrar_conexion
+from core.instrumentacion import InstrumentacionDB
+from core.metricas import MetricasHTTP
+from core.backplane import crear_backplane
+from core.catalogo_productos import catalogo_productos
+from routers.websocket import manager
 from fastapi import Depends
 
 load_dotenv()
@@ -21,11 +27,9 @@ else:
         openapi_url=None
     )
 
-# Inicializar base de datos con datos por defecto
-crear_configuracion_defecto()
-crear_usuario_admin_defecto()
-crear_cliente_defecto()
-crear_indices_auth()
+# Comandos de MongoDB por ruta; Server-Timing solo en modo debug
+app.add_middleware(InstrumentacionDB, server_timing=debug == "true")
+app.add_middleware(MetricasHTTP)
 
 #Routers
 app.include_router(login.router)
@@ -45,12 +49,29 @@ app.include_router(pedidos.router)
 app.include_router(facturas.router)
 app.include_router(correo.router)
 app.include_router(reportes.router)
+app.include_router(diagnostico.router)
+app.include_router(metricas.router)
 
 @app.on_event("startup")
 async def startup_event():
+    # Inicializar base de datos con datos por defecto
+    await crear_configuracion_defecto()
+    await crear_usuario_admin_defecto()
+    await crear_cliente_defecto()
+    await crear_indices()
+    await completar_busqueda()
+    await migrar_adeudos()
+    await preparar_acumulados()
+    print(f"[OK] Catalogo de productos cargado: {await catalogo_productos.cargar()} productos.")
+    await manager.iniciar_backplane(crear_backplane())
     iniciar_scheduler()
     await verificar_cotizaciones_vencidas()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await manager.detener()
+    await cerrar_conexion()
+
 @app.get("/helloworld")
 async def helloworld():
     return {"Hello Word": "how are you"}
@@ -61,7 +82,7 @@ async def me(usuario: dict = Depends(validar_token)):
 
 @app.post("/logout")
 async def logout(usuario: dict = Depends(validar_token)):
-    revocar_sesion(usuario["session_id"])
+    await revocar_sesion(usuario["session_id"])
     return {"message": "Sesion cerrada"}
 
 #URL local: http://127.0.0.1:8000
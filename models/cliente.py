@@ -1,3 +1,4 @@
+from decimal import Decimal
 from pydantic import BaseModel
 
 from models.adeudo import Adeudo
@@ -16,7 +17,20 @@ class Cliente(BaseModel): #Entidad #modelo
     no_int: int | None = None
     colonia: str | None = None
     localidad: str | None = None
-    adeudos: list[Adeudo] | None = None
+    adeudos: list[Adeudo] | None = None #None: no incluidos (viven en la coleccion adeudos)
+    adeudo_total: Decimal = Decimal(0) #resumen mantenido por core.adeudos
+    num_adeudos: int = 0
     protegido: bool = False
     frecuente: bool = False
-    activo: bool = True
\ No newline at end of file
+    activo: bool = True
+
+class ClienteResumen(BaseModel): #resultado de /clientes/buscar (sin adeudos ni domicilio)
+    id: str
+    nombre: str
+    correo: str | None = None
+    telefono: int | None = None
+    razon_social: str | None = None
+    rfc: str | None = None
+    adeudo_total: Decimal = Decimal(0)
+    frecuente: bool = False
+    activo: bool = True
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+class SincronizacionCatalogo(BaseModel): #respuesta de /<catalogo>/sync
+    version: int #pasar como `since` en la siguiente sincronizacion
+    completo: bool = False #True: `cambios` es el catalogo completo (sin `since`)
+    cambios: list[dict] = []
+    eliminados: list[str] = []
@@ -1,7 +1,9 @@
+from typing import Optional
 from bson import ObjectId
 from bson.errors import InvalidId
 from fastapi import APIRouter, HTTPException, Response, status, Depends, Body
 from core.database import db_client
+from core.paginacion import paginar
 from generador_folio import generar_folio_caja, generar_folio_corte
 from models.caja import Caja
 from models.corte import Corte
@@ -23,6 +25,8 @@ async def obtener_cajas(
     fecha_inicio: str = None,
     fecha_fin: str = None,
     folio: str = None,
+    cursor: Optional[str] = None,
+    con_total: bool = True,
     token: str = Depends(validar_token)
 ):
     filtros = {"estado": "cerrada"}  
@@ -49,29 +53,15 @@ async def obtener_cajas(
         if fecha_filtro:
             filtros["fecha_apertura"] = fecha_filtro
 
-    total = db_client.pbstation.cajas.count_documents(filtros)
-    skip = (page - 1) * page_size
-    cajas = db_client.pbstation.cajas.find(filtros)\
-        .sort("fecha_apertura", -1)\
-        .skip(skip)\
-        .limit(page_size)
-    total_pages = (total + page_size - 1) // page_size
-    return {
-        "data": cajas_schema(cajas),
-        "pagination": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
-    }
+    return await paginar(
+        db_client.pbstation.cajas, filtros, "fecha_apertura", cajas_schema,
+        page_size=page_size, cursor=cursor, page=page, con_total=con_total,
+    )
 
 @router.get("/{id}")
 async def obtener_caja(id: str, token: str = Depends(validar_token)):
     try:
-        caja = search_caja("_id", ObjectId(id))
+        caja = await search_caja("_id", ObjectId(id))
         if caja is None:
             raise HTTPException(status_code=404, detail="Caja no encontrada")
         return caja
@@ -81,7 +71,7 @@ async def obtener_caja(id: str, token: str = Depends(validar_token)):
 @router.get("/buscar/{folio}")
 async def obtener_caja_por_folio(folio: str, token: str = Depends(validar_token)):
     try:
-        caja = db_client.pbstation.cajas.find_one({"folio": folio, "estado": "cerrada"})
+        caja = await db_client.pbstation.cajas.find_one({"folio": folio, "estado": "cerrada"})
         if not caja:
             raise HTTPException(status_code=404, detail="Caja no encontrada o no está cerrada")
         return Caja(**caja_schema(caja))
@@ -96,14 +86,14 @@ async def crear_caja(caja: Caja, token: str = Depends(validar_token)):
     caja_dict = caja.model_dump()
 
     #generacion de folio
-    caja_dict["folio"] = generar_folio_caja(db_client.pbstation, caja.sucursal_id)
+    caja_dict["folio"] = await generar_folio_caja(db_client.pbstation, caja.sucursal_id)
 
     del caja_dict["id"] #quitar el id para que no se guarde como null
     caja_dict["venta_total"] = Decimal128(str(caja_dict["venta_total"])) if caja_dict["venta_total"] is not None else None
     caja_dict["cortes_ids"] = []
 
-    id = db_client.pbstation.cajas.insert_one(caja_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nueva_caja = caja_schema(db_client.pbstation.cajas.find_one({"_id":id}))
+    id = (await db_client.pbstation.cajas.insert_one(caja_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nueva_caja = caja_schema(await db_client.pbstation.cajas.find_one({"_id":id}))
     
     return Caja(**nueva_caja)
 
@@ -125,7 +115,7 @@ async def actualizar_caja(caja: Caja, token: str = Depends(validar_token)):
         except InvalidId:
             raise HTTPException(status_code=400, detail="Uno o más cortes_ids tienen formato inválido")
     try:
-        result = db_client.pbstation.cajas.find_one_and_replace(
+        result = await db_client.pbstation.cajas.find_one_and_replace(
             {"_id": ObjectId(caja.id)}, 
             caja_dict
         )
@@ -135,9 +125,9 @@ async def actualizar_caja(caja: Caja, token: str = Depends(validar_token)):
         raise HTTPException(status_code=400, detail="ID inválido")
     return Response(status_code=204)#search_caja("_id", ObjectId(caja.id))
 
-def search_caja(field: str, key):
+async def search_caja(field: str, key):
     try:
-        caja = db_client.pbstation.cajas.find_one({field: key})
+        caja = await db_client.pbstation.cajas.find_one({field: key})
         if not caja:  
             return None
         return Caja(**caja_schema(caja))
@@ -150,7 +140,7 @@ def search_caja(field: str, key):
 @router.get("/{caja_id}/cortes/all", response_model=list[Corte])
 async def obtener_all_cortes(caja_id: str, token: str = Depends(validar_token)):
     try:
-        caja = db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
+        caja = await db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
         if not caja:
             raise HTTPException(status_code=404, detail="Caja no encontrada")
         
@@ -165,7 +155,7 @@ async def obtener_all_cortes(caja_id: str, token: str = Depends(validar_token)):
             {"_id": {"$in": cortes_ids_obj}}
         ).sort("fecha_apertura", -1)
         
-        cortes_list = list(cortes_cursor)
+        cortes_list = await cortes_cursor.to_list()
         return cortes_schema(cortes_list)
         
     except HTTPException:
@@ -179,13 +169,13 @@ async def obtener_all_cortes(caja_id: str, token: str = Depends(validar_token)):
 @router.get("/{caja_id}/cortes/ultimo", response_model=Corte)
 async def obtener_ultimo_corte(caja_id: str, token: str = Depends(validar_token)):
     try:
-        caja = db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
+        caja = await db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
         if not caja:
             raise HTTPException(status_code=404, detail="Caja no encontrada")
         cortes_ids = caja.get("cortes_ids", [])
         if not cortes_ids:
             raise HTTPException(status_code=404, detail="La caja no tiene cortes registrados")
-        ultimo_corte = db_client.pbstation.cortes.find_one(
+        ultimo_corte = await db_client.pbstation.cortes.find_one(
             {"_id": {"$in": cortes_ids}},
             sort=[("fecha_apertura", -1)]
         )
@@ -200,12 +190,12 @@ async def obtener_ultimo_corte(caja_id: str, token: str = Depends(validar_token)
 
 @router.post("/{caja_id}/cortes", response_model=Corte, status_code=status.HTTP_201_CREATED) #post
 async def crear_corte(caja_id: str, corte: Corte, token: str = Depends(validar_token)):
-    caja = db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
+    caja = await db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
     if not caja:
         raise HTTPException(status_code=404, detail="Caja no encontrada")
     
     corte_dict = corte.model_dump()
-    corte_dict["folio"] = generar_folio_corte(db_client.pbstation, corte.sucursal_id)
+    corte_dict["folio"] = await generar_folio_corte(db_client.pbstation, corte.sucursal_id)
     
     del corte_dict["id"] #quitar el id para que no se guarde como null
     corte_dict["fondo_inicial"] = Decimal128(str(corte_dict["fondo_inicial"]))
@@ -228,11 +218,11 @@ async def crear_corte(caja_id: str, corte: Corte, token: str = Depends(validar_t
     #     movimiento["_id"] = ObjectId()  # Asignar un nuevo ObjectId para cada movimiento
     #     movimiento.pop("id", None)  # Eliminar el campo id si existe, ya que MongoDB genera su propio _id
 #
-    id = db_client.pbstation.cortes.insert_one(corte_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nuevo_corte = corte_schema(db_client.pbstation.cortes.find_one({"_id":id}))
+    id = (await db_client.pbstation.cortes.insert_one(corte_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nuevo_corte = corte_schema(await db_client.pbstation.cortes.find_one({"_id":id}))
 
     # Actualizar la caja agregando el id del nuevo corte a cortes_ids
-    db_client.pbstation.cajas.update_one(
+    await db_client.pbstation.cajas.update_one(
         {"_id": ObjectId(caja_id)},
         {"$push": {"cortes_ids": id}}
     )
@@ -271,7 +261,7 @@ async def actualizar_corte(corte: Corte, token: str = Depends(validar_token)):
             corte_dict[campo] = None
     
     try:
-        result = db_client.pbstation.cortes.find_one_and_replace(
+        result = await db_client.pbstation.cortes.find_one_and_replace(
             {"_id": ObjectId(corte.id)},
             corte_dict
         )
@@ -288,7 +278,7 @@ async def actualizar_corte(corte: Corte, token: str = Depends(validar_token)):
 @router.get("/{corte_id}/movimientos")
 async def obtener_movimientos(corte_id: str, token: str = Depends(validar_token)):
     # Obtener el corte directamente como diccionario desde MongoDB
-    corte_dict = db_client.pbstation.cortes.find_one({"_id": ObjectId(corte_id)})
+    corte_dict = await db_client.pbstation.cortes.find_one({"_id": ObjectId(corte_id)})
     if not corte_dict:
         raise HTTPException(status_code=404, detail="Corte no encontrada")
     # Retornar los movimientos usando tu schema para convertir _id a string
@@ -306,7 +296,7 @@ async def agregar_movimiento(corte_id: str, movimiento: dict = Body(...), token:
         "fecha": movimiento["fecha"]
     }
     # Insertar en el corte
-    result = db_client.pbstation.cortes.update_one(
+    result = await db_client.pbstation.cortes.update_one(
         {"_id": ObjectId(corte_id)},
         {"$push": {"movimiento_caja": movimiento_dict}}
     )
@@ -321,13 +311,13 @@ async def obtener_tipo_cambio_por_venta(venta_id: str, token: str = Depends(vali
     try:
         # Buscar el corte que contiene la venta
         # Primero intentar buscando con la venta_id como string (cuando ventas_ids contiene strings)
-        corte = db_client.pbstation.cortes.find_one({"ventas_ids": venta_id})
+        corte = await db_client.pbstation.cortes.find_one({"ventas_ids": venta_id})
 
         # Si no se encuentra, intentar con ObjectId(venta_id) (cuando ventas_ids contiene ObjectId)
         if not corte:
             try:
                 venta_obj = ObjectId(venta_id)
-                corte = db_client.pbstation.cortes.find_one({"ventas_ids": venta_obj})
+                corte = await db_client.pbstation.cortes.find_one({"ventas_ids": venta_obj})
             except InvalidId:
                 corte = None
 
@@ -340,12 +330,12 @@ async def obtener_tipo_cambio_por_venta(venta_id: str, token: str = Depends(vali
         # Ahora buscar la caja que contiene el corte
         # Primero intentar con el ObjectId (cuando cortes_ids contiene ObjectId)
         corte_obj_id = corte["_id"]
-        caja = db_client.pbstation.cajas.find_one({"cortes_ids": corte_obj_id})
+        caja = await db_client.pbstation.cajas.find_one({"cortes_ids": corte_obj_id})
 
         # Si no se encuentra, intentar con el _id convertido a string (cuando cortes_ids contiene strings)
         if not caja:
             corte_id_str = str(corte_obj_id)
-            caja = db_client.pbstation.cajas.find_one({"cortes_ids": corte_id_str})
+            caja = await db_client.pbstation.cajas.find_one({"cortes_ids": corte_id_str})
 
         if not caja:
             raise HTTPException(
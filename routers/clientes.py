@@ -1,24 +1,62 @@
 from typing import Optional
 from bson import Decimal128, ObjectId
 from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, Header, status, Depends
+from fastapi import APIRouter, HTTPException, Header, Query, status, Depends, Request
 from core.database import db_client
+from core.adeudos import (
+    adeudos_de_cliente, adeudos_por_cliente, eliminar_adeudos_de_cliente, quitar_adeudo,
+    reemplazar_adeudos, agregar_adeudo as registrar_adeudo,
+)
 from models.adeudo import Adeudo
-from models.cliente import Cliente
-from schemas.cliente import clientes_schema, cliente_schema
+from schemas.adeudo import adeudos_schema
+from models.cliente import Cliente, ClienteResumen
+from schemas.cliente import CAMPOS_RESUMEN, clientes_schema, cliente_resumen_schema, cliente_schema
+from core.busqueda import CAMPO_ORDEN, campos_busqueda, filtro_busqueda
+from core.cambios import registrar_cambio, sincronizar
+from core.versiones import respuesta_condicional
+from models.sincronizacion import SincronizacionCatalogo
 from routers.websocket import manager 
 from validar_token import validar_token 
 
 router = APIRouter(prefix="/clientes", tags=["clientes"])
 
 @router.get("/all", response_model=list[Cliente])
-async def obtener_clientes(token: str = Depends(validar_token)):
-    return clientes_schema(db_client.pbstation.clientes.find())
+async def obtener_clientes(request: Request, incluir_adeudos: bool = True, token: str = Depends(validar_token)):
+    async def obtener():
+        clientes = clientes_schema(await db_client.pbstation.clientes.find().to_list())
+        # Por defecto igual que antes (con la lista); ?incluir_adeudos=false manda solo el resumen
+        if incluir_adeudos:
+            # Una sola consulta agrupada para todos los clientes
+            por_cliente = await adeudos_por_cliente()
+            for cliente in clientes:
+                cliente["adeudos"] = adeudos_schema(por_cliente.get(cliente["id"], []))
+        return clientes
+    # 304 sin tocar Mongo si el ETag sigue vigente
+    return await respuesta_condicional(
+        request, "cliente", obtener, list[Cliente], variante="adeudos" if incluir_adeudos else "")
+
+@router.get("/sync", response_model=SincronizacionCatalogo)
+async def sincronizar_clientes(since: Optional[int] = None, token: str = Depends(validar_token)):
+    return await sincronizar("clientes", since, clientes_schema)
+
+@router.get("/buscar", response_model=list[ClienteResumen])
+async def buscar_clientes(
+    q: str = Query(..., min_length=1, description="Palabras o prefijos de nombre, razón social, RFC, teléfono o correo"),
+    limite: int = Query(20, ge=1, le=100),
+    token: str = Depends(validar_token),
+):
+    filtro = filtro_busqueda(q)
+    if filtro is None:
+        return []
+    proyeccion = {campo: 1 for campo in CAMPOS_RESUMEN}
+    # Orden en Mongo antes del limite: los primeros `limite` por nombre, no los que salgan primero
+    cursor = db_client.pbstation.clientes.find(filtro, proyeccion).sort([(CAMPO_ORDEN, 1), ("_id", 1)])
+    return [cliente_resumen_schema(c) for c in await cursor.limit(limite).to_list()]
 
 @router.get("/{id}")
 async def obtener_cliente(id: str, token: str = Depends(validar_token)):
     try:
-        clientes = search_cliente("_id", ObjectId(id))
+        clientes = await search_cliente("_id", ObjectId(id), con_adeudos=True)
         if clientes is None:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         return clientes
@@ -28,61 +66,52 @@ async def obtener_cliente(id: str, token: str = Depends(validar_token)):
 @router.post("/", response_model=Cliente, status_code=status.HTTP_201_CREATED) #post
 async def crear_cliente(cliente: Cliente, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     if cliente.rfc is not None:
-        if type(search_cliente("rfc", cliente.rfc)) == Cliente:
+        if type(await search_cliente("rfc", cliente.rfc)) == Cliente:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail='El cliente ya existe en la base de datos. (RFC)') 
     if cliente.razon_social is not None:
-        if type(search_cliente("razon_social", cliente.razon_social)) == Cliente:
+        if type(await search_cliente("razon_social", cliente.razon_social)) == Cliente:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail='El cliente ya existe en la base de datos. (Razon Social)')
-    cliente_dict = dict(cliente) #//TODO: no se si es mejor asi o usar cliente_dict = cliente.model_dump(), investigar
-    del cliente_dict["id"] #quitar el id para que no se guarde como null
-    id = db_client.pbstation.clientes.insert_one(cliente_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nuevo_cliente = cliente_schema(db_client.pbstation.clientes.find_one({"_id":id})) #izquierda= que tiene que buscar. derecha= esto tiene que buscar
+    cliente_dict = _documento_cliente(cliente)
+    cliente_dict.update(adeudo_total=Decimal128("0"), num_adeudos=0)
+    id = (await db_client.pbstation.clientes.insert_one(cliente_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    for adeudo in cliente.adeudos or []:
+        await registrar_adeudo(id, adeudo.venta_id, adeudo.monto_pendiente)
+    nuevo_cliente = await search_cliente("_id", id, con_adeudos=True)
+    await registrar_cambio("clientes", id)
     await manager.broadcast(
         f"post-cliente:{str(id)}", 
-        exclude_connection_id=x_connection_id
+        exclude_connection_id=x_connection_id,
+        datos=nuevo_cliente
     )
-    return Cliente(**nuevo_cliente) #el ** sirve para pasar los valores del diccionario
+    return nuevo_cliente
 
 @router.post("/{cliente_id}/adeudos", response_model=Cliente, status_code=status.HTTP_201_CREATED)
 async def agregar_adeudo(cliente_id: str, adeudo: Adeudo, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     try:
         # Verificar que el cliente existe
-        cliente_existente = db_client.pbstation.clientes.find_one({"_id": ObjectId(cliente_id)})
-        if not cliente_existente:
+        if not await db_client.pbstation.clientes.find_one({"_id": ObjectId(cliente_id)}, {"_id": 1}):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail='Cliente no encontrado'
             )
-        
-        # Verificar si ya existe un adeudo con la misma venta_id
-        cliente_obj = Cliente(**cliente_schema(cliente_existente))
-        if cliente_obj.adeudos:
-            for adeudo_existente in cliente_obj.adeudos:
-                if adeudo_existente.venta_id == adeudo.venta_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail='Ya existe un adeudo para esta venta_id'
-                    )
-        
-        # Preparar el adeudo para MongoDB (convertir Decimal a Decimal128)
-        adeudo_dict = dict(adeudo)
-        adeudo_dict["monto_pendiente"] = Decimal128(adeudo_dict["monto_pendiente"])
-        
-        # Agregar el nuevo adeudo usando $push
-        db_client.pbstation.clientes.update_one(
-            {"_id": ObjectId(cliente_id)},
-            {"$push": {"adeudos": adeudo_dict}}
-        )
+        # El indice unico (cliente_id, venta_id) rechaza el duplicado
+        if not await registrar_adeudo(cliente_id, adeudo.venta_id, adeudo.monto_pendiente):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Ya existe un adeudo para esta venta_id'
+            )
         
         # Obtener el cliente actualizado
-        cliente_actualizado = search_cliente("_id", ObjectId(cliente_id))
+        cliente_actualizado = await search_cliente("_id", ObjectId(cliente_id), con_adeudos=True)
         
         # Notificar a través de WebSocket
+        await registrar_cambio("clientes", cliente_id)
         await manager.broadcast(
             f"put-cliente:{cliente_id}",
-            exclude_connection_id=x_connection_id
+            exclude_connection_id=x_connection_id,
+            datos=cliente_actualizado
         )
         
         return cliente_actualizado
@@ -99,42 +128,24 @@ async def agregar_adeudo(cliente_id: str, adeudo: Adeudo, token: str = Depends(v
 async def eliminar_adeudo(cliente_id: str, venta_id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     try:
         # Verificar que el cliente existe
-        cliente_existente = db_client.pbstation.clientes.find_one({"_id": ObjectId(cliente_id)})
-        if not cliente_existente:
+        if not await db_client.pbstation.clientes.find_one({"_id": ObjectId(cliente_id)}, {"_id": 1}):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail='Cliente no encontrado'
             )
-        # Verificar si existe el adeudo con la venta_id especificada
-        cliente_obj = Cliente(**cliente_schema(cliente_existente))
-        adeudo_encontrado = False
-        if cliente_obj.adeudos:
-            for adeudo_existente in cliente_obj.adeudos:
-                if adeudo_existente.venta_id == venta_id:
-                    adeudo_encontrado = True
-                    break
-        if not adeudo_encontrado:
+        if await quitar_adeudo(cliente_id, venta_id) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='Adeudo no encontrado para esta venta_id'
             )
-        # Eliminar el adeudo usando $pull
-        result = db_client.pbstation.clientes.update_one(
-            {"_id": ObjectId(cliente_id)},
-            {"$pull": {"adeudos": {"venta_id": venta_id}}}
-        )
-        # Verificar que se eliminó correctamente
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='No se pudo eliminar el adeudo'
-            )
         # Obtener el cliente actualizado
-        cliente_actualizado = search_cliente("_id", ObjectId(cliente_id))
+        cliente_actualizado = await search_cliente("_id", ObjectId(cliente_id), con_adeudos=True)
         # Notificar a través de WebSocket
+        await registrar_cambio("clientes", cliente_id)
         await manager.broadcast(
             f"put-cliente:{cliente_id}",
-            exclude_connection_id=x_connection_id
+            exclude_connection_id=x_connection_id,
+            datos=cliente_actualizado
         )
         return cliente_actualizado
         
@@ -147,56 +158,78 @@ async def eliminar_adeudo(cliente_id: str, venta_id: str, token: str = Depends(v
         )
 
 @router.put("/", response_model=Cliente, status_code=status.HTTP_200_OK)
-async def actualizar_cliente(cliente: Cliente, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
+async def actualizar_cliente(cliente: Cliente, reemplazar_lista: bool = Query(False, alias="reemplazar_adeudos"), token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     if not cliente.id:  # Validar si el id está presente
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="El campo 'id' es obligatorio para actualizar un cliente"
         )
-    cliente_dict = cliente.model_dump()
-    del cliente_dict["id"]  # eliminar id para no actualizar el id
-    if cliente_dict.get("adeudos"):
-        for adeudo in cliente_dict["adeudos"]:
-            if "monto_pendiente" in adeudo and adeudo["monto_pendiente"] is not None:
-                adeudo["monto_pendiente"] = Decimal128(str(adeudo["monto_pendiente"]))
+    cliente_dict = _documento_cliente(cliente)
     try:
-        result = db_client.pbstation.clientes.find_one_and_replace(
+        # $set en lugar de reemplazo: el resumen de adeudos se mantiene con $inc
+        result = await db_client.pbstation.clientes.find_one_and_update(
             {"_id": ObjectId(cliente.id)}, 
-            cliente_dict
+            {"$set": cliente_dict}
         )
         if not result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail='Cliente no encontrado'
             )
+        # Mismo modelo que `datos`: el delta v2 compara campo por campo
+        anterior = cliente_schema(result)
+        # La lista de adeudos del PUT se ignora (una terminal pudo leer el cliente
+        # sin ella); solo con ?reemplazar_adeudos=true la coleccion queda igual a ella
+        if reemplazar_lista and cliente.adeudos is not None:
+            anterior["adeudos"] = adeudos_schema(await adeudos_de_cliente(cliente.id))
+            await reemplazar_adeudos(cliente.id, [dict(a) for a in cliente.adeudos])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f'Error al actualizar cliente: {str(e)}'
         )
+    cliente_actualizado = await search_cliente("_id", ObjectId(cliente.id), con_adeudos=True)
+    if anterior["adeudos"] is None:
+        anterior["adeudos"] = cliente_actualizado.adeudos
+    await registrar_cambio("clientes", cliente.id)
     await manager.broadcast(
         f"put-cliente:{str(ObjectId(cliente.id))}",
-        exclude_connection_id=x_connection_id
+        exclude_connection_id=x_connection_id,
+        datos=cliente_actualizado,
+        anterior=Cliente(**anterior)  # version previa: los clientes v2 reciben solo los cambios
     )
-    return search_cliente("_id", ObjectId(cliente.id))
+    return cliente_actualizado
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT) #delete path
 async def delete_cliente(id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
-    found = db_client.pbstation.clientes.find_one_and_delete({"_id": ObjectId(id)})
+    found = await db_client.pbstation.clientes.find_one_and_delete({"_id": ObjectId(id)})
     if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro el cliente')
     else:
+        await eliminar_adeudos_de_cliente(id)
+        await registrar_cambio("clientes", id, eliminado=True)
         await manager.broadcast(
             f"delete-cliente:{str(id)}",
             exclude_connection_id=x_connection_id
         ) #Notificar a todos
         return {'message':'Eliminado con exito'} 
 
-def search_cliente(field: str, key):
+def _documento_cliente(cliente: Cliente) -> dict:
+    """Campos editables del cliente; adeudos y su resumen se manejan en core.adeudos."""
+    cliente_dict = cliente.model_dump(exclude={"id", "adeudos", "adeudo_total", "num_adeudos"})
+    cliente_dict.update(campos_busqueda(cliente_dict))
+    return cliente_dict
+
+async def search_cliente(field: str, key, con_adeudos: bool = False):
     try:
-        cliente = db_client.pbstation.clientes.find_one({field: key})
+        cliente = await db_client.pbstation.clientes.find_one({field: key})
         if not cliente:  # Verificar si no se encontró el cliente
             return None
-        return Cliente(**cliente_schema(cliente))  # el ** sirve para pasar los valores del diccionario
+        datos = cliente_schema(cliente)
+        if con_adeudos:
+            datos["adeudos"] = adeudos_schema(await adeudos_de_cliente(datos["id"]))
+        return Cliente(**datos)  # el ** sirve para pasar los valores del diccionario
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Error al buscar cliente: {str(e)}')
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Error al buscar cliente: {str(e)}')
@@ -1,9 +1,10 @@
 import os
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Header, status
+from fastapi import APIRouter, HTTPException, Header, Request, status
 from fastapi.params import Depends
 from pydantic import BaseModel, Field
 from config_manager import cargar_config, guardar_config
+from core.versiones import respuesta_condicional
 from routers.websocket import manager
 from validar_token import require_permission, validar_token
 
@@ -38,16 +39,19 @@ class CredencialesFacturamaUpdate(BaseModel):
     facturama_pass: str = Field(...)
 
 @router.get("/")
-def obtener_config():
-    config = cargar_config()
-    # Enmascarar contraseñas para el endpoint público
-    config["mail_password"] = "********" if config.get("mail_password") else ""
-    config["facturama_pass"] = "********" if config.get("facturama_pass") else ""
-    return config
+async def obtener_config(request: Request):
+    async def obtener():
+        config = await cargar_config()
+        # Enmascarar contraseñas para el endpoint público
+        config["mail_password"] = "********" if config.get("mail_password") else ""
+        config["facturama_pass"] = "********" if config.get("facturama_pass") else ""
+        return config
+    # guardar_config anota cada cambio en la bitácora de cambios (ETag compartido)
+    return await respuesta_condicional(request, "configuracion", obtener)
 
 @router.get("/admin")
-def obtener_config_admin(token: dict = Depends(require_permission("admin"))):
-    return cargar_config()
+async def obtener_config_admin(token: dict = Depends(require_permission("admin"))):
+    return await cargar_config()
 
 @router.put("/precio-dolar")
 async def actualizar_precio_dolar(
@@ -55,9 +59,9 @@ async def actualizar_precio_dolar(
     token: dict = Depends(require_permission("elevado")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["precio_dolar"] = data.precio_dolar
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -75,9 +79,9 @@ async def actualizar_iva(
     token: dict = Depends(require_permission("elevado")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["iva"] = data.iva
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -95,9 +99,9 @@ async def actualizar_version(
     token: dict = Depends(require_permission("admin")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["last_version"] = data.last_version
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -115,14 +119,14 @@ async def actualizar_datos_emisor(
     token: dict = Depends(require_permission("elevado")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["empresa"] = data.empresa
     config["ciudad"] = data.ciudad
     config["nombre_emisor"] = data.nombre_emisor
     config["direccion_emisor"] = data.direccion_emisor
     config["telefono_emisor"] = data.telefono_emisor
     config["rfc_emisor"] = data.rfc_emisor
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -139,7 +143,7 @@ async def actualizar_credenciales_correo(
     token: dict = Depends(require_permission("admin")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["mail_username"] = data.mail_username
     
     # Solo actualizar el password si no es la máscara
@@ -149,7 +153,7 @@ async def actualizar_credenciales_correo(
     config["mail_from"] = data.mail_from
     config["mail_port"] = data.mail_port
     config["mail_server"] = data.mail_server
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -164,14 +168,14 @@ async def actualizar_credenciales_facturama(
     token: dict = Depends(require_permission("admin")),
     x_connection_id: Optional[str] = Header(None)
 ):
-    config = cargar_config()
+    config = await cargar_config()
     config["facturama_user"] = data.facturama_user
     
     # Solo actualizar el password si no es la máscara
     if data.facturama_pass != "********":
         config["facturama_pass"] = data.facturama_pass
         
-    guardar_config(config)
+    await guardar_config(config)
 
     await manager.broadcast(
         "put-configuracion",
@@ -1,12 +1,14 @@
 from typing import Optional
 from bson import ObjectId
 from bson.errors import InvalidId
+from datetime import datetime
 from fastapi import APIRouter, HTTPException, status, Depends, Header
 from pymongo import DESCENDING
 from core.database import db_client
+from core.paginacion import paginar
 from generador_folio import generar_folio_cotizacion
 from models.cotizacion import Cotizacion
-from schemas.cotizacion import cotizaciones_schema, cotizacion_schema
+from schemas.cotizacion import CAMPOS_RESUMEN, cotizaciones_resumen_schema, cotizaciones_schema, cotizacion_schema
 from routers.websocket import manager
 from bson.decimal128 import Decimal128
 from validar_token import validar_token 
@@ -15,13 +17,59 @@ router = APIRouter(prefix="/cotizaciones", tags=["cotizaciones"])
 
 @router.get("/all", response_model=list[Cotizacion])
 async def obtener_cotizaciones(token: str = Depends(validar_token)):
-    cotizaciones = db_client.pbstation.cotizaciones.find().sort("fecha_cotizacion", DESCENDING)
+    cotizaciones = await db_client.pbstation.cotizaciones.find().sort("fecha_cotizacion", DESCENDING).to_list()
     return cotizaciones_schema(cotizaciones)
 
+@router.get("/lista")
+async def listar_cotizaciones(
+    vigente: Optional[bool] = None,
+    sucursal_id: Optional[str] = None,
+    cliente_id: Optional[str] = None,
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    incluir_detalles: bool = False,
+    page: int = 1,
+    page_size: int = 60,
+    cursor: Optional[str] = None,
+    con_total: bool = True,
+    token: str = Depends(validar_token)
+):
+    """
+    Cotizaciones filtradas y paginadas por cursor (mas recientes primero).
+    Sin incluir_detalles cada fila trae solo CAMPOS_RESUMEN: Mongo no manda
+    los detalles, que son la mayor parte del documento.
+    """
+    filtros = {}
+    if vigente is not None:
+        filtros["vigente"] = vigente
+    if sucursal_id:
+        filtros["sucursal_id"] = sucursal_id
+    if cliente_id:
+        filtros["cliente_id"] = cliente_id
+    fecha_filtro = {}
+    try:
+        if fecha_inicio:
+            fecha_filtro["$gte"] = datetime.strptime(f"{fecha_inicio} 00:00:00", "%Y-%m-%d %H:%M:%S")
+        if fecha_fin:
+            fecha_filtro["$lte"] = datetime.strptime(f"{fecha_fin} 23:59:59", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido, se espera YYYY-MM-DD")
+    if fecha_filtro:
+        filtros["fecha_cotizacion"] = fecha_filtro
+
+    if incluir_detalles:
+        schema, proyeccion = cotizaciones_schema, None
+    else:
+        schema, proyeccion = cotizaciones_resumen_schema, {campo: 1 for campo in CAMPOS_RESUMEN}
+    return await paginar(
+        db_client.pbstation.cotizaciones, filtros, "fecha_cotizacion", schema,
+        page_size=page_size, cursor=cursor, page=page, con_total=con_total, proyeccion=proyeccion,
+    )
+
 @router.get("/{id}")
 async def obtener_cotizacion(id: str, token: str = Depends(validar_token)):
     try:
-        cotizacion = search_cotizaciones("_id", ObjectId(id))
+        cotizacion = await search_cotizaciones("_id", ObjectId(id))
         if cotizacion is None:
             raise HTTPException(status_code=404, detail="Cotización no encontrada")
         return cotizacion
@@ -31,7 +79,7 @@ async def obtener_cotizacion(id: str, token: str = Depends(validar_token)):
 @router.post("/", response_model=Cotizacion, status_code=status.HTTP_201_CREATED) #post
 async def crear_cotizacion(cotizacion: Cotizacion, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     cotizacion_dict = cotizacion.model_dump()
-    cotizacion_dict["folio"] = generar_folio_cotizacion(db_client.pbstation)  #generacion de folio
+    cotizacion_dict["folio"] = await generar_folio_cotizacion(db_client.pbstation)  #generacion de folio
     cotizacion_dict["detalles"] = [d.model_dump() for d in cotizacion.detalles]
     del cotizacion_dict["id"] #quitar el id para que no se guarde como null
     cotizacion_dict["subtotal"] = Decimal128(cotizacion_dict["subtotal"])
@@ -46,8 +94,8 @@ async def crear_cotizacion(cotizacion: Cotizacion, token: str = Depends(validar_
         detalle["total"] = Decimal128(detalle["total"])
         detalle["cotizacion_precio"] = Decimal128(detalle["cotizacion_precio"]) if detalle["cotizacion_precio"] is not None else None
         detalle.pop("id", None)  # ✅ eliminar el duplicado
-    id = db_client.pbstation.cotizaciones.insert_one(cotizacion_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nueva_cotizacion = cotizacion_schema(db_client.pbstation.cotizaciones.find_one({"_id":id}))
+    id = (await db_client.pbstation.cotizaciones.insert_one(cotizacion_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nueva_cotizacion = cotizacion_schema(await db_client.pbstation.cotizaciones.find_one({"_id":id}))
     await manager.broadcast(
         f"post-cotizacion:{str(id)}",
         exclude_connection_id=x_connection_id
@@ -57,10 +105,10 @@ async def crear_cotizacion(cotizacion: Cotizacion, token: str = Depends(validar_
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_cotizacion(id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     try:
-        found = db_client.pbstation.cotizaciones.find_one({"_id": ObjectId(id)})
+        found = await db_client.pbstation.cotizaciones.find_one({"_id": ObjectId(id)})
         if not found:
             raise HTTPException(status_code=404, detail="Cotización no encontrada")
-        db_client.pbstation.cotizaciones.delete_one({"_id": ObjectId(id)})
+        await db_client.pbstation.cotizaciones.delete_one({"_id": ObjectId(id)})
         await manager.broadcast(
             f"delete-cotizacion:{str(id)}",
             exclude_connection_id=x_connection_id
@@ -72,16 +120,15 @@ async def eliminar_cotizacion(id: str, token: str = Depends(validar_token), x_co
 async def renovar_cotizacion(id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     try:
         oid = ObjectId(id)
-        found = db_client.pbstation.cotizaciones.find_one({"_id": oid})
+        found = await db_client.pbstation.cotizaciones.find_one({"_id": oid})
         if not found:
             raise HTTPException(status_code=404, detail="Cotización no encontrada")
         
-        from datetime import datetime
-        db_client.pbstation.cotizaciones.update_one(
+        await db_client.pbstation.cotizaciones.update_one(
             {"_id": oid},
             {"$set": {"vigente": True, "fecha_cotizacion": datetime.now()}}
         )
-        cotizacion_actualizada = cotizacion_schema(db_client.pbstation.cotizaciones.find_one({"_id": oid}))
+        cotizacion_actualizada = cotizacion_schema(await db_client.pbstation.cotizaciones.find_one({"_id": oid}))
         await manager.broadcast(
             f"put-cotizacion:{str(id)}",
             exclude_connection_id=x_connection_id
@@ -90,9 +137,9 @@ async def renovar_cotizacion(id: str, token: str = Depends(validar_token), x_con
     except InvalidId:
         raise HTTPException(status_code=400, detail="Formato de ID inválido")
 
-def search_cotizaciones(field: str, key):
+async def search_cotizaciones(field: str, key):
     try:
-        cotizacion = db_client.pbstation.cotizaciones.find_one({field: key})
+        cotizacion = await db_client.pbstation.cotizaciones.find_one({field: key})
         if not cotizacion:  # Verificar si no se encontró la cotizacion
             return None
         return Cotizacion(**cotizacion_schema(cotizacion))  # el ** sirve para pasar los valores del diccionario
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+from validar_token import estadisticas_cache_sesiones, require_permission
+from core.instrumentacion import estadisticas_rutas
+from core.cache_reportes import cache_reportes
+
+router = APIRouter(prefix="/diagnostico", tags=["diagnostico"])
+
+@router.get("/cache-sesiones")
+async def obtener_cache_sesiones(token: dict = Depends(require_permission("admin"))):
+    return estadisticas_cache_sesiones()
+
+@router.get("/cache-reportes")
+async def obtener_cache_reportes(token: dict = Depends(require_permission("admin"))):
+    """Aciertos de la cache de /reportes (total y por reporte) e invalidaciones."""
+    return cache_reportes.stats()
+
+@router.get("/db")
+async def obtener_estadisticas_db(reiniciar: bool = False, token: dict = Depends(require_permission("admin"))):
+    """Comandos de MongoDB acumulados por ruta desde el arranque (o el ultimo reinicio)."""
+    resumen = estadisticas_rutas.resumen()
+    if reiniciar:
+        estadisticas_rutas.reiniciar()
+    return resumen
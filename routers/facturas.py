@@ -12,7 +12,9 @@ from bson.errors import InvalidId
 from fastapi import APIRouter, HTTPException, Response, status, Depends, Header
 import requests
 from os import getenv
+from fastapi.concurrency import run_in_threadpool
 from core.database import db_client
+from core.paginacion import paginar
 from models.factura import Factura
 from schemas.factura import factura_schema, facturas_schema
 from validar_token import require_permission, validar_token
@@ -30,6 +32,8 @@ async def obtener_facturas(
     page_size: int = 60,
     rfc: Optional[str] = None,
     sucursal_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    con_total: bool = True,
     token: str = Depends(validar_token)
 ):
     filtros = {}
@@ -42,24 +46,10 @@ async def obtener_facturas(
     if sucursal_id:
         filtros["sucursal_id"] = sucursal_id
     
-    total = db_client.pbstation.facturas.count_documents(filtros)
-    skip = (page - 1) * page_size
-    facturas = db_client.pbstation.facturas.find(filtros)\
-        .sort("_id", -1)\
-        .skip(skip)\
-        .limit(page_size)
-    total_pages = (total + page_size - 1) // page_size
-    return {
-        "data": facturas_schema(facturas),
-        "pagination": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
-    }
+    return await paginar(
+        db_client.pbstation.facturas, filtros, "_id", facturas_schema,
+        page_size=page_size, cursor=cursor, page=page, con_total=con_total,
+    )
 
 @router.post("/", response_model=Factura, status_code=status.HTTP_201_CREATED) #post
 async def crear_factura(factura: Factura, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
@@ -72,9 +62,9 @@ async def crear_factura(factura: Factura, token: str = Depends(validar_token), x
     factura_dict["impuestos"] = Decimal128(factura_dict["impuestos"])
     factura_dict["total"] = Decimal128(factura_dict["total"])
 
-    id = db_client.pbstation.facturas.insert_one(factura_dict).inserted_id #mongodb crea automaticamente el id como "_id"
+    id = (await db_client.pbstation.facturas.insert_one(factura_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
     
-    nueva_factura = factura_schema(db_client.pbstation.facturas.find_one({"_id":id}))
+    nueva_factura = factura_schema(await db_client.pbstation.facturas.find_one({"_id":id}))
 
     await manager.broadcast(
         f"post-factura:{str(id)}",
@@ -86,7 +76,7 @@ async def crear_factura(factura: Factura, token: str = Depends(validar_token), x
 @router.get("/{id}")
 async def obtener_factura(id: str, token: str = Depends(validar_token)):
     try:
-        factura = db_client.pbstation.facturas.find_one({"_id": ObjectId(id)})
+        factura = await db_client.pbstation.facturas.find_one({"_id": ObjectId(id)})
         if not factura:
             raise HTTPException(status_code=404, detail="Factura no encontrada")
         return factura_schema(factura)
@@ -94,24 +84,24 @@ async def obtener_factura(id: str, token: str = Depends(validar_token)):
         raise HTTPException(status_code=400, detail="Formato de ID inválido")
 
 @router.get("/diagnostico/check")
-def check(token: dict = Depends(require_permission("admin"))):
-    config = cargar_config()
+async def check(token: dict = Depends(require_permission("admin"))):
+    config = await cargar_config()
     endpoint = f"{BASE_URL}/api/Catalogs/States"
-    r = requests.get(endpoint, auth=(config.get("facturama_user"), config.get("facturama_pass")))
+    r = await run_in_threadpool(requests.get, endpoint, auth=(config.get("facturama_user"), config.get("facturama_pass")))
     return r.json()
 
 @router.post("/crear")
-def crear_factura(cfdi: dict, token: dict = Depends(require_permission("elevado"))):
-    config = cargar_config()
+async def crear_factura(cfdi: dict, token: dict = Depends(require_permission("elevado"))):
+    config = await cargar_config()
     url = f"{BASE_URL}/3/cfdis"
-    r = requests.post(url, json=cfdi, auth=(config.get("facturama_user"), config.get("facturama_pass")))
+    r = await run_in_threadpool(requests.post, url, json=cfdi, auth=(config.get("facturama_user"), config.get("facturama_pass")))
     return r.json()
 
 @router.get("/pdf/{id}")
-def descargar_pdf(id: str, token: dict = Depends(validar_token)):
-    config = cargar_config()
+async def descargar_pdf(id: str, token: dict = Depends(validar_token)):
+    config = await cargar_config()
     url = f"{BASE_URL}/api/cfdi/pdf/{id}"
-    r = requests.get(url, auth=(config.get("facturama_user"), config.get("facturama_pass")))
+    r = await run_in_threadpool(requests.get, url, auth=(config.get("facturama_user"), config.get("facturama_pass")))
 
     if r.status_code != 200:
         raise HTTPException(status_code=r.status_code, detail=f"Error de Facturama: {r.text}")
@@ -127,10 +117,10 @@ def descargar_pdf(id: str, token: dict = Depends(validar_token)):
         raise HTTPException(status_code=500, detail=f"Error procesando PDF: {str(e)}")
 
 @router.get("/xml/{id}")
-def descargar_xml(id: str, token: dict = Depends(validar_token)):
-    config = cargar_config()
+async def descargar_xml(id: str, token: dict = Depends(validar_token)):
+    config = await cargar_config()
     url = f"{BASE_URL}/api/cfdi/xml/{id}"
-    r = requests.get(url, auth=(config.get("facturama_user"), config.get("facturama_pass")))
+    r = await run_in_threadpool(requests.get, url, auth=(config.get("facturama_user"), config.get("facturama_pass")))
 
     if r.status_code != 200:
         raise HTTPException(status_code=r.status_code, detail=f"Error de Facturama: {r.text}")
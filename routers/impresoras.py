@@ -1,28 +1,38 @@
 from typing import Optional
 from bson import ObjectId
 from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, Header, status, Depends
+from fastapi import APIRouter, HTTPException, Header, status, Depends, Request
 from core.database import db_client
 from models.impresora import Impresora
 from schemas.impresora import impresoras_schema, impresora_schema
+from core.cambios import registrar_cambio, sincronizar
+from core.versiones import respuesta_condicional
+from models.sincronizacion import SincronizacionCatalogo
 from routers.websocket import manager
 from validar_token import validar_token 
 
 router = APIRouter(prefix="/impresoras", tags=["impresoras"])
 
 @router.get("/all", response_model=list[Impresora])
-async def obtener_impresoras(token: str = Depends(validar_token)):
-    return impresoras_schema(db_client.pbstation.impresoras.find())
+async def obtener_impresoras(request: Request, token: str = Depends(validar_token)):
+    async def obtener():
+        return impresoras_schema(await db_client.pbstation.impresoras.find().to_list())
+    # 304 sin tocar Mongo si el ETag sigue vigente
+    return await respuesta_condicional(request, "impresora", obtener, list[Impresora])
 
 @router.get("/sucursal/{sucursal_id}", response_model=list[Impresora])
 async def obtener_impresoras_sucursal(sucursal_id: str, token: str = Depends(validar_token)):
-    impresoras = db_client.pbstation.impresoras.find({"sucursal_id": sucursal_id})
+    impresoras = await db_client.pbstation.impresoras.find({"sucursal_id": sucursal_id}).to_list()
     return impresoras_schema(impresoras)
 
+@router.get("/sync", response_model=SincronizacionCatalogo)
+async def sincronizar_impresoras(since: Optional[int] = None, token: str = Depends(validar_token)):
+    return await sincronizar("impresoras", since, impresoras_schema)
+
 @router.get("/{id}")
 async def obtener_impresora(id: str, token: str = Depends(validar_token)):
     try:
-        impresora = search_impresora("_id", ObjectId(id))
+        impresora = await search_impresora("_id", ObjectId(id))
         if impresora is None:
             raise HTTPException(status_code=404, detail="Impresora no encontrada")
         return impresora
@@ -31,17 +41,18 @@ async def obtener_impresora(id: str, token: str = Depends(validar_token)):
 
 @router.post("/", response_model=Impresora, status_code=status.HTTP_201_CREATED) #post
 async def crear_impresora(impresora: Impresora, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
-    if type(search_impresora("serie", impresora.serie)) == Impresora:
+    if type(await search_impresora("serie", impresora.serie)) == Impresora:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail='La serie de la impresora ya existe, no se puede volver a ingresar la misma impresora')
 
     impresora_dict = dict(impresora)
     del impresora_dict["id"] #quitar el id para que no se guarde como null
-    id = db_client.pbstation.impresoras.insert_one(impresora_dict).inserted_id #mongodb crea automaticamente el id como "_id"
+    id = (await db_client.pbstation.impresoras.insert_one(impresora_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
     
-    nueva_impresora = impresora_schema(db_client.pbstation.impresoras.find_one({"_id":id}))
+    nueva_impresora = impresora_schema(await db_client.pbstation.impresoras.find_one({"_id":id}))
 
     sucursal_id = impresora_dict.get("sucursal_id")
+    await registrar_cambio("impresoras", id)
     await manager.broadcast_to_sucursal(
         f"post-impresora:{str(id)}",
         sucursal_id,
@@ -59,7 +70,7 @@ async def actualizar_impresora(impresora: Impresora, token: str = Depends(valida
     impresora_dict = impresora.model_dump() 
     del impresora_dict["id"]
     try:
-        result = db_client.pbstation.impresoras.find_one_and_replace(
+        result = await db_client.pbstation.impresoras.find_one_and_replace(
             {"_id": ObjectId(impresora.id)}, 
             impresora_dict
         )
@@ -68,20 +79,22 @@ async def actualizar_impresora(impresora: Impresora, token: str = Depends(valida
     except InvalidId:
         raise HTTPException(status_code=400, detail="ID inválido")
     sucursal_id = impresora_dict.get("sucursal_id")
+    await registrar_cambio("impresoras", impresora.id)
     await manager.broadcast_to_sucursal(
         f"put-impresora:{str(ObjectId(impresora.id))}",
         sucursal_id,
         exclude_connection_id=x_connection_id
     ) #Notificar a sucursal
 
-    return search_impresora("_id", ObjectId(impresora.id))
+    return await search_impresora("_id", ObjectId(impresora.id))
 
 @router.delete("/{id}/{sucursal_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def detele_impresora(id: str, sucursal_id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
-    found = db_client.pbstation.impresoras.find_one_and_delete({"_id": ObjectId(id)})
+    found = await db_client.pbstation.impresoras.find_one_and_delete({"_id": ObjectId(id)})
     if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro la impresora')
     else:
+        await registrar_cambio("impresoras", id, eliminado=True)
         await manager.broadcast_to_sucursal(
             f"delete-impresora:{str(id)}",
             sucursal_id,
@@ -89,9 +102,9 @@ async def detele_impresora(id: str, sucursal_id: str, token: str = Depends(valid
         ) #Notificar a sucursal
         return {'message':'Eliminado con exito'} 
     
-def search_impresora(field: str, key):
+async def search_impresora(field: str, key):
     try:
-        impresora = db_client.pbstation.impresoras.find_one({field: key})
+        impresora = await db_client.pbstation.impresoras.find_one({field: key})
         if not impresora:
             return None
         return Impresora(**impresora_schema(impresora)) 
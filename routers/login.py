@@ -3,21 +3,11 @@ from fastapi.exceptions import HTTPException as FastAPI_HTTPException
 from models.usuario import Usuario
 from core.database import db_client
 from schemas.usuario import usuario_schema, usuario_public_schema
-from passlib.context import CryptContext
+from core.seguridad import verificar_password
 from validar_token import crear_sesion, revocar_sesion, validar_token
 
 router = APIRouter(prefix="/login", tags=["login"])
 
-# Configuración para hashing de contraseñas
-try:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-except AttributeError:
-    # Suprimir el error relacionado con bcrypt
-    pwd_context = None
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 @router.post('',)
 async def login(credentials: dict):
     identificador = credentials.get("correo", "").strip().lower()
@@ -36,7 +26,7 @@ async def login(credentials: dict):
         else:
             # Es un correo
             query = {"correo": identificador}
-        usuario = db_client.pbstation.usuarios.find_one(query)
+        usuario = await db_client.pbstation.usuarios.find_one(query)
         if not usuario:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,13 +40,13 @@ async def login(credentials: dict):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         loginUser = Usuario(**usuario_schema(usuario))
-        if not verify_password(psw, loginUser.psw):
+        if not await verificar_password(psw, loginUser.psw):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Credenciales incorrectas",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return crear_sesion(usuario)
+        return await crear_sesion(usuario)
     except FastAPI_HTTPException as http_exc:
         raise http_exc
     except Exception as e:
@@ -67,7 +57,7 @@ async def login(credentials: dict):
 
 @router.post("/logout")
 async def logout(usuario: dict = Depends(validar_token)):
-    revocar_sesion(usuario["session_id"])
+    await revocar_sesion(usuario["session_id"])
     return {"message": "Sesion cerrada"}
 
 @router.get("/me")
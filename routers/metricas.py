@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from core.metricas import registro
+from validar_token import require_permission
+
+router = APIRouter(tags=["metricas"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def obtener_metricas(token: dict = Depends(require_permission("admin"))):
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -8,6 +8,7 @@ from datetime import datetime
 import os
 import json
 from core.database import db_client
+from core.paginacion import paginar
 from core.pedidos_archivos import (
     UPLOAD_DIR,
     eliminar_rutas,
@@ -46,9 +47,9 @@ def _nombre_unico_zip(nombre: str, usados: set[str]) -> str:
 
 @router.get("/all", response_model=List[Pedido])
 async def obtener_pedidos(token: str = Depends(validar_token)):
-    pedidos = db_client.pbstation.pedidos.find(
+    pedidos = await db_client.pbstation.pedidos.find(
         {"estado": {"$ne": "entregado"}}
-    ).sort("fecha", 1)
+    ).sort("fecha", 1).to_list()
     return pedidos_schema(pedidos)
 
 @router.get("/historial")
@@ -56,33 +57,21 @@ async def obtener_pedidos_historial(
     page: int = 1,
     page_size: int = 60,
     sucursal_id: str = None,
+    cursor: Optional[str] = None,
+    con_total: bool = True,
     token: str = Depends(validar_token)
 ):
     filtros = {"$or": [{"estado": "entregado"}, {"cancelado": True}]}
     if sucursal_id:
         filtros["sucursal_id"] = sucursal_id
-    total = db_client.pbstation.pedidos.count_documents(filtros)
-    skip = (page - 1) * page_size
-    pedidos = db_client.pbstation.pedidos.find(filtros)\
-        .sort("fecha_entregado", -1)\
-        .skip(skip)\
-        .limit(page_size)
-    total_pages = (total + page_size - 1) // page_size
-    return {
-        "data": pedidos_schema(pedidos),
-        "pagination": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
-    }
+    return await paginar(
+        db_client.pbstation.pedidos, filtros, "fecha_entregado", pedidos_schema,
+        page_size=page_size, cursor=cursor, page=page, con_total=con_total,
+    )
 
 @router.get("/by-venta-folio/{venta_folio}", response_model=Pedido)
 async def obtener_pedido_por_venta_folio(venta_folio: str, token: str = Depends(validar_token)):
-    pedido = db_client.pbstation.pedidos.find_one({"venta_folio": venta_folio})
+    pedido = await db_client.pbstation.pedidos.find_one({"venta_folio": venta_folio})
     
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado para el folio de venta proporcionado")
@@ -109,7 +98,7 @@ async def crear_pedido(
             detail="Los pedidos deben tener archivos o estar en estado 'en espera'"
         )
     
-    folio = generar_folio_pedido(db_client.pbstation, pedido_data['sucursal_id'])
+    folio = await generar_folio_pedido(db_client.pbstation, pedido_data['sucursal_id'])
 
     pedido_temp = {
         "cliente_id": pedido_data['cliente_id'],
@@ -128,7 +117,7 @@ async def crear_pedido(
         "cancelado": False,        
     }
 
-    result = db_client.pbstation.pedidos.insert_one(pedido_temp)
+    result = await db_client.pbstation.pedidos.insert_one(pedido_temp)
     pedido_id = str(result.inserted_id)
 
     if archivos:
@@ -138,16 +127,16 @@ async def crear_pedido(
             pedido_dir = os.path.join(UPLOAD_DIR, pedido_id)
             if os.path.exists(pedido_dir):
                 shutil.rmtree(pedido_dir)
-            db_client.pbstation.pedidos.delete_one({"_id": ObjectId(pedido_id)})
+            await db_client.pbstation.pedidos.delete_one({"_id": ObjectId(pedido_id)})
             raise
-        db_client.pbstation.pedidos.update_one(
+        await db_client.pbstation.pedidos.update_one(
             {"_id": ObjectId(pedido_id)},
             {"$push": {"archivos": {"$each": archivos_guardados}}}
         )
 
-    nuevo_pedido = pedido_schema(db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)}))
-    await manager.broadcast(f"post-pedido:{pedido_id}", exclude_connection_id=x_connection_id)
-    return Pedido(**nuevo_pedido)
+    nuevo_pedido = Pedido(**pedido_schema(await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})))
+    await manager.broadcast(f"post-pedido:{pedido_id}", exclude_connection_id=x_connection_id, datos=nuevo_pedido)
+    return nuevo_pedido
 
 @router.patch("/{pedido_id}/archivos", response_model=Pedido)
 async def agregar_archivos_pedido(
@@ -156,7 +145,7 @@ async def agregar_archivos_pedido(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
@@ -166,7 +155,7 @@ async def agregar_archivos_pedido(
     if pedido.get("estado") in {"enEspera", "en espera"}:
         update_ops["$set"] = {"estado": "pendiente"}
     
-    resultado = db_client.pbstation.pedidos.update_one(
+    resultado = await db_client.pbstation.pedidos.update_one(
         {
             "_id": ObjectId(pedido_id),
             "estado": {"$nin": ["entregado", "cancelado"]},
@@ -178,12 +167,17 @@ async def agregar_archivos_pedido(
         eliminar_rutas([archivo["ruta"] for archivo in archivos_guardados])
         raise HTTPException(status_code=409, detail="El pedido ya no acepta archivos")
 
-    pedido_actualizado = pedido_schema(
-        db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
-    )
+    pedido_actualizado = Pedido(**pedido_schema(
+        await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    ))
     
-    await manager.broadcast(f"update-pedido:{pedido_id}", exclude_connection_id=x_connection_id)
-    return Pedido(**pedido_actualizado)
+    await manager.broadcast(
+        f"update-pedido:{pedido_id}",
+        exclude_connection_id=x_connection_id,
+        datos=pedido_actualizado,
+        anterior=Pedido(**pedido_schema(pedido))
+    )
+    return pedido_actualizado
 
 @router.get("/{pedido_id}/archivo/{archivo_nombre}")
 async def descargar_archivo_individual(
@@ -191,7 +185,7 @@ async def descargar_archivo_individual(
     archivo_nombre: str,
     token: str = Depends(validar_token)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
 
@@ -216,7 +210,7 @@ async def descargar_archivos_zip(
     pedido_id: str,
     token: str = Depends(validar_token)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
 
@@ -266,11 +260,11 @@ async def confirmar_pedido(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
-    resultado = db_client.pbstation.pedidos.update_one(
+    resultado = await db_client.pbstation.pedidos.update_one(
         {"_id": ObjectId(pedido_id)},
         {"$set": {"venta_id": venta_id, "venta_folio": venta_folio}}
     )
@@ -278,13 +272,18 @@ async def confirmar_pedido(
     if resultado.modified_count == 0:
         raise HTTPException(status_code=400, detail="No se pudo actualizar el pedido")
     
-    pedido_actualizado = pedido_schema(
-        db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
-    )
+    pedido_actualizado = Pedido(**pedido_schema(
+        await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    ))
     
-    await manager.broadcast(f"update-pedido:{pedido_id}", exclude_connection_id=x_connection_id)
+    await manager.broadcast(
+        f"update-pedido:{pedido_id}",
+        exclude_connection_id=x_connection_id,
+        datos=pedido_actualizado,
+        anterior=Pedido(**pedido_schema(pedido))
+    )
     
-    return Pedido(**pedido_actualizado)
+    return pedido_actualizado
 
 @router.patch("/{pedido_id}/estado", response_model=Pedido)
 async def actualizar_estado_pedido(
@@ -294,7 +293,7 @@ async def actualizar_estado_pedido(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
@@ -326,7 +325,7 @@ async def actualizar_estado_pedido(
             # No lanzamos error para no interrumpir el cambio de estado
     
     # Actualizar el pedido con todos los cambios
-    resultado = db_client.pbstation.pedidos.update_one(
+    resultado = await db_client.pbstation.pedidos.update_one(
         {"_id": ObjectId(pedido_id)},
         {"$set": update_data}
     )
@@ -334,13 +333,18 @@ async def actualizar_estado_pedido(
     if resultado.modified_count == 0:
         raise HTTPException(status_code=400, detail="No se pudo actualizar el pedido")
     
-    pedido_actualizado = pedido_schema(
-        db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
-    )
+    pedido_actualizado = Pedido(**pedido_schema(
+        await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    ))
     
-    await manager.broadcast(f"update-pedido:{pedido_id}", exclude_connection_id=x_connection_id)
+    await manager.broadcast(
+        f"update-pedido:{pedido_id}",
+        exclude_connection_id=x_connection_id,
+        datos=pedido_actualizado,
+        anterior=Pedido(**pedido_schema(pedido))
+    )
     
-    return Pedido(**pedido_actualizado)
+    return pedido_actualizado
 
 @router.patch("/{pedido_id}/cancelar", response_model=Pedido)
 async def cancelar_pedido(
@@ -348,12 +352,12 @@ async def cancelar_pedido(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)
 ):
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
     # Actualizar el campo cancelado y agregar fecha_entregado
-    resultado = db_client.pbstation.pedidos.update_one(
+    resultado = await db_client.pbstation.pedidos.update_one(
         {"_id": ObjectId(pedido_id)},
         {"$set": {
             "cancelado": True,
@@ -373,7 +377,7 @@ async def cancelar_pedido(
             print(f"Archivos del pedido {pedido_id} eliminados automáticamente")
             
             # Vaciar el array de archivos en la base de datos
-            db_client.pbstation.pedidos.update_one(
+            await db_client.pbstation.pedidos.update_one(
                 {"_id": ObjectId(pedido_id)},
                 {"$set": {"archivos": []}}
             )
@@ -381,13 +385,18 @@ async def cancelar_pedido(
         print(f"Advertencia: No se pudieron eliminar archivos del pedido {pedido_id}: {str(e)}")
         # No lanzamos error para no interrumpir la cancelación
     
-    pedido_actualizado = pedido_schema(
-        db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
-    )
+    pedido_actualizado = Pedido(**pedido_schema(
+        await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    ))
     
-    await manager.broadcast(f"update-pedido:{pedido_id}", exclude_connection_id=x_connection_id)
+    await manager.broadcast(
+        f"update-pedido:{pedido_id}",
+        exclude_connection_id=x_connection_id,
+        datos=pedido_actualizado,
+        anterior=Pedido(**pedido_schema(pedido))
+    )
     
-    return Pedido(**pedido_actualizado)
+    return pedido_actualizado
 
 @router.delete("/{pedido_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_pedido(
@@ -396,7 +405,7 @@ async def eliminar_pedido(
     x_connection_id: Optional[str] = Header(None)
 ):
     # Verificar que el pedido existe
-    pedido = db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
+    pedido = await db_client.pbstation.pedidos.find_one({"_id": ObjectId(pedido_id)})
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
@@ -411,7 +420,7 @@ async def eliminar_pedido(
         # Continuamos con la eliminación del pedido en la BD aunque falle la eliminación de archivos
     
     # Eliminar el pedido de la base de datos
-    resultado = db_client.pbstation.pedidos.delete_one({"_id": ObjectId(pedido_id)})
+    resultado = await db_client.pbstation.pedidos.delete_one({"_id": ObjectId(pedido_id)})
     
     if resultado.deleted_count == 0:
         raise HTTPException(status_code=400, detail="No se pudo eliminar el pedido")
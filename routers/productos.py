@@ -1,10 +1,12 @@
 from bson import ObjectId
-from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request
 from typing import Optional
 from core.database import db_client
 from models.producto import Producto
 from schemas.producto import productos_schema, producto_schema
+from core.cambios import registrar_cambio, sincronizar
+from core.catalogo_productos import catalogo_productos
+from models.sincronizacion import SincronizacionCatalogo
 from routers.websocket import manager 
 from bson.decimal128 import Decimal128
 from validar_token import validar_token 
@@ -12,18 +14,24 @@ from validar_token import validar_token
 router = APIRouter(prefix="/productos", tags=["productos"])
 
 @router.get("/all", response_model=list[Producto])
-async def obtener_productos(token: str = Depends(validar_token)):
-    return productos_schema(db_client.pbstation.productos.find())
+async def obtener_productos(request: Request, token: str = Depends(validar_token)):
+    # Lista ya serializada en memoria; 304 si el ETag sigue vigente
+    await catalogo_productos.asegurar_cargado()
+    return catalogo_productos.respuesta(request)
+
+@router.get("/sync", response_model=SincronizacionCatalogo)
+async def sincronizar_productos(since: Optional[int] = None, token: str = Depends(validar_token)):
+    return await sincronizar("productos", since, productos_schema)
 
 @router.get("/{id}")
 async def obtener_producto(id: str, token: str = Depends(validar_token)):
-    try:
-        impresora = search_producto("_id", ObjectId(id))
-        if impresora is None:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        return impresora
-    except InvalidId:
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Formato de ID inválido")
+    await catalogo_productos.asegurar_cargado()
+    producto = catalogo_productos.obtener(id)
+    if producto is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return Producto(**producto)
     
 @router.post("/", response_model=Producto, status_code=status.HTTP_201_CREATED)
 async def crear_producto(
@@ -31,7 +39,7 @@ async def crear_producto(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)
 ):
-    if type(search_producto("codigo", producto.codigo)) == Producto:
+    if type(await search_producto("codigo", producto.codigo)) == Producto:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail='El código del producto ya existe, no se puede repetir. Intenta otro.')
@@ -40,16 +48,20 @@ async def crear_producto(
     del producto_dict["id"]
     producto_dict["precio"] = Decimal128(producto_dict["precio"])
     
-    id = db_client.pbstation.productos.insert_one(producto_dict).inserted_id
+    id = (await db_client.pbstation.productos.insert_one(producto_dict)).inserted_id
 
-    nuevo_producto = producto_schema(db_client.pbstation.productos.find_one({"_id":id}))
+    nuevo_producto_dict = producto_schema(await db_client.pbstation.productos.find_one({"_id":id}))
+    nuevo_producto = Producto(**nuevo_producto_dict)
+    catalogo_productos.poner(nuevo_producto_dict)
     
+    await registrar_cambio("productos", id)
     await manager.broadcast(
         f"post-product:{str(id)}", 
-        exclude_connection_id=x_connection_id
+        exclude_connection_id=x_connection_id,
+        datos=nuevo_producto
     )
     
-    return Producto(**nuevo_producto)
+    return nuevo_producto
 
 @router.put("/", response_model=Producto, status_code=status.HTTP_200_OK)
 async def actualizar_producto(
@@ -66,7 +78,7 @@ async def actualizar_producto(
     del producto_dict["id"]
     producto_dict["precio"] = Decimal128(str(producto.precio))
     try:
-        result = db_client.pbstation.productos.find_one_and_replace(
+        result = await db_client.pbstation.productos.find_one_and_replace(
             {"_id":ObjectId(producto.id)},
             producto_dict
         )
@@ -78,12 +90,17 @@ async def actualizar_producto(
             detail='No se encontro el producto (put)'
         )
     
+    producto_actualizado = await search_producto("_id", ObjectId(producto.id))
+    await catalogo_productos.refrescar(producto.id)
+    await registrar_cambio("productos", producto.id)
     await manager.broadcast(
         f"put-product:{str(ObjectId(producto.id))}", 
-        exclude_connection_id=x_connection_id
+        exclude_connection_id=x_connection_id,
+        datos=producto_actualizado,
+        anterior=Producto(**producto_schema(result))  # version previa: los clientes v2 reciben solo los cambios
     )
     
-    return search_producto("_id", ObjectId(producto.id))
+    return producto_actualizado
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def detele_producto(
@@ -91,22 +108,24 @@ async def detele_producto(
     token: str = Depends(validar_token),
     x_connection_id: Optional[str] = Header(None)  # ID de conexión del cliente
 ):
-    found = db_client.pbstation.productos.find_one_and_delete({"_id": ObjectId(id)})
+    found = await db_client.pbstation.productos.find_one_and_delete({"_id": ObjectId(id)})
     if not found:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail='No se encontro el producto'
         )
     else:
+        catalogo_productos.quitar(id)
+        await registrar_cambio("productos", id, eliminado=True)
         await manager.broadcast(
             f"delete-product:{str(id)}", 
             exclude_connection_id=x_connection_id
         )
         return {'message':'Eliminado con exito'} 
     
-def search_producto(field: str, key):
+async def search_producto(field: str, key):
     try:
-        producto = db_client.pbstation.productos.find_one({field: key})
+        producto = await db_client.pbstation.productos.find_one({field: key})
         if not producto:
             return None
         return Producto(**producto_schema(producto))
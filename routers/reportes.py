@@ -1,6 +1,12 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
+from typing import Awaitable
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 from core.database import db_client
+from core.acumulados import VENTAS_POR_CLIENTE, VENTAS_POR_HORA, VENTAS_POR_PRODUCTO, dia_de
+from core.cache_reportes import cache_reportes
+from core.catalogo_productos import catalogo_productos
 from validar_token import validar_token, require_permission
 from bson import ObjectId
 from bson.decimal128 import Decimal128
@@ -8,64 +14,153 @@ from bson.decimal128 import Decimal128
 router = APIRouter(prefix="/reportes", tags=["reportes"])
 
 
-def _filtro_periodo(periodo: str, f_ini: str = None, f_fin: str = None) -> dict:
-    """Genera filtro de fecha según el periodo seleccionado."""
-    ahora = datetime.now()
+def _rango_dias(periodo: str, f_ini: str = None, f_fin: str = None) -> tuple[datetime, datetime] | None:
+    """
+    Primer y ultimo dia (a las 00:00) del periodo; None para "todo".
+    Los periodos van por dias completos, que es la resolucion de los acumulados:
+    "semana" son los ultimos 7 dias con hoy, "mes" los ultimos 30.
+    """
+    hoy = dia_de(datetime.now())
     if periodo == "semana":
-        fecha_inicio = ahora - timedelta(days=7)
-        return {"fecha_venta": {"$gte": fecha_inicio, "$lte": ahora}}
+        return hoy - timedelta(days=6), hoy
     elif periodo == "mes":
-        fecha_inicio = ahora - timedelta(days=30)
-        return {"fecha_venta": {"$gte": fecha_inicio, "$lte": ahora}}
+        return hoy - timedelta(days=29), hoy
     elif periodo == "custom" and f_ini and f_fin:
         try:
-            inicio = datetime.strptime(f_ini[:10], "%Y-%m-%d").replace(hour=0, minute=0, second=0)
-            fin = datetime.strptime(f_fin[:10], "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            return {"fecha_venta": {"$gte": inicio, "$lte": fin}}
+            return datetime.strptime(f_ini[:10], "%Y-%m-%d"), datetime.strptime(f_fin[:10], "%Y-%m-%d")
         except ValueError:
             pass
     # "todo" -> sin filtro de fecha
-    return {}
+    return None
 
 
-def _filtro_periodo_anterior(periodo: str, f_ini: str = None, f_fin: str = None) -> tuple[dict, str, str]:
-    """Genera filtro del periodo anterior para comparativa."""
-    ahora = datetime.now()
-    if periodo == "semana":
-        fecha_fin = ahora - timedelta(days=7)
-        fecha_inicio = ahora - timedelta(days=14)
-        return {"fecha_venta": {"$gte": fecha_inicio, "$lte": fecha_fin}}, fecha_inicio.strftime("%Y-%m-%d"), fecha_fin.strftime("%Y-%m-%d")
-    elif periodo == "mes":
-        fecha_fin = ahora - timedelta(days=30)
-        fecha_inicio = ahora - timedelta(days=60)
-        return {"fecha_venta": {"$gte": fecha_inicio, "$lte": fecha_fin}}, fecha_inicio.strftime("%Y-%m-%d"), fecha_fin.strftime("%Y-%m-%d")
-    elif periodo == "custom" and f_ini and f_fin:
-        try:
-            inicio = datetime.strptime(f_ini[:10], "%Y-%m-%d").replace(hour=0, minute=0, second=0)
-            fin = datetime.strptime(f_fin[:10], "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            delta = fin - inicio
-            dias = delta.days + 1
-            fecha_fin_ant = inicio - timedelta(days=1)
-            fecha_fin_ant = fecha_fin_ant.replace(hour=23, minute=59, second=59)
-            fecha_inicio_ant = fecha_fin_ant - timedelta(days=dias - 1)
-            fecha_inicio_ant = fecha_inicio_ant.replace(hour=0, minute=0, second=0)
-            return {"fecha_venta": {"$gte": fecha_inicio_ant, "$lte": fecha_fin_ant}}, fecha_inicio_ant.strftime("%Y-%m-%d"), fecha_fin_ant.strftime("%Y-%m-%d")
-        except ValueError:
-            pass
-    return {}, "", ""
+def _rango_anterior(periodo: str, f_ini: str = None, f_fin: str = None) -> tuple[datetime, datetime] | None:
+    """Los mismos dias inmediatamente antes del periodo, para la comparativa."""
+    rango = _rango_dias(periodo, f_ini, f_fin)
+    if rango is None:
+        return None
+    inicio, fin = rango
+    dias = (fin - inicio).days + 1
+    return inicio - timedelta(days=dias), inicio - timedelta(days=1)
+
+
+def _filtro_fecha_venta(rango: tuple[datetime, datetime] | None) -> dict:
+    """Filtro de fecha_venta para los dias del rango (consultas directas a ventas)."""
+    if rango is None:
+        return {}
+    inicio, fin = rango
+    return {"fecha_venta": {"$gte": inicio, "$lt": fin + timedelta(days=1)}}
+
+
+def _filtro_periodo(periodo: str, f_ini: str = None, f_fin: str = None) -> dict:
+    """Genera filtro de fecha_venta según el periodo seleccionado (consultas directas a ventas)."""
+    return _filtro_fecha_venta(_rango_dias(periodo, f_ini, f_fin))
+
+
+def _match_acumulados(rango: tuple[datetime, datetime] | None, sucursal_id: str | None = None) -> dict:
+    """Filtro sobre las colecciones de core.acumulados."""
+    match = {}
+    if rango is not None:
+        match["dia"] = {"$gte": rango[0], "$lte": rango[1]}
+    if sucursal_id:
+        match["sucursal_id"] = sucursal_id
+    return match
 
 
-def _base_match(periodo: str, sucursal_id: str | None, f_ini: str = None, f_fin: str = None) -> dict:
-    """Filtro base: ventas liquidadas, no canceladas, con filtros de periodo y sucursal."""
+_GRUPO_RESUMEN = {
+    "$group": {
+        "_id": None,
+        "total_vendido": {"$sum": "$total"},
+        "numero_ventas": {"$sum": "$ventas"},
+        "total_cancelado": {"$sum": "$total_cancelado"},
+        "ventas_canceladas": {"$sum": "$canceladas"},
+    }
+}
+
+
+def _pipeline_resumen(rango, rango_anterior, sucursal_id: str | None = None) -> list:
+    """
+    Totales del periodo y del anterior sobre ventas_por_hora en una sola
+    pasada: el $match cubre los dos rangos (son contiguos) y $facet separa.
+    """
+    if rango is None:
+        return [{"$match": _match_acumulados(None, sucursal_id)}, {"$facet": {"actual": [_GRUPO_RESUMEN]}}]
+    facetas = {"actual": [{"$match": _match_acumulados(rango)}, _GRUPO_RESUMEN]}
+    inicio = rango[0]
+    if rango_anterior is not None:
+        facetas["anterior"] = [{"$match": _match_acumulados(rango_anterior)}, _GRUPO_RESUMEN]
+        inicio = rango_anterior[0]
+    return [{"$match": _match_acumulados((inicio, rango[1]), sucursal_id)}, {"$facet": facetas}]
+
+
+def _pipeline_adeudos(sucursal_id: str | None = None) -> list:
+    """Adeudos activos (sin periodo): solo ventas pendientes, por el indice liquidado/fecha_venta."""
     match = {
-        "liquidado": True,
+        "liquidado": False,
         "cancelado": {"$ne": True},
     }
-    filtro_fecha = _filtro_periodo(periodo, f_ini, f_fin)
-    match.update(filtro_fecha)
     if sucursal_id:
         match["sucursal_id"] = sucursal_id
-    return match
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": None,
+                "adeudos_activos": {"$sum": "$total"},
+                "num_adeudos": {"$sum": 1},
+            }
+        },
+    ]
+
+
+def _pipeline_cancelaciones(match: dict) -> list:
+    """Totales y motivos de las cancelaciones en una sola pasada ($facet)."""
+    return [
+        {"$match": match},
+        {"$facet": {
+            "totales": [
+                {
+                    "$group": {
+                        "_id": None,
+                        "total_cancelado": {"$sum": "$total"},
+                        "num_cancelaciones": {"$sum": 1},
+                    }
+                },
+            ],
+            "motivos": [
+                {
+                    "$group": {
+                        "_id": {"$ifNull": ["$motivo_cancelacion", "Sin motivo"]},
+                        "cantidad": {"$sum": 1},
+                        "monto": {"$sum": "$total"},
+                    }
+                },
+                {"$sort": {"cantidad": -1}},
+                {"$limit": 10},
+            ],
+        }},
+    ]
+
+
+def _pipeline_tendencias(rango, sucursal_id: str | None = None) -> list:
+    """Una sola lectura por (dia, hora) de ventas_por_hora; las tres vistas de tendencias salen de ella."""
+    return [
+        {"$match": _match_acumulados(rango, sucursal_id)},
+        {
+            "$group": {
+                "_id": {"dia": "$dia", "hora": "$hora"},
+                "total": {"$sum": "$total_directo"},
+                "num_ventas": {"$sum": "$ventas_directas"},
+            }
+        },
+        {"$match": {"num_ventas": {"$gt": 0}}},
+    ]
+
+
+async def _agregar(pipeline: list, coleccion: str = "ventas") -> list:
+    """Ejecuta un pipeline (sobre ventas o un acumulado) y regresa los documentos resultantes."""
+    cursor = await db_client.pbstation[coleccion].aggregate(pipeline)
+    return await cursor.to_list()
 
 
 def _decimal128_to_float(value) -> float:
@@ -78,197 +173,110 @@ def _decimal128_to_float(value) -> float:
 
 
 # ─────────────────────────────── RESUMEN ───────────────────────────────
-@router.get("/resumen")
-async def obtener_resumen(
-    periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
-    fecha_inicio: str = None,
-    fecha_fin: str = None,
-    sucursal_id: str = None,
-    token: dict = Depends(require_permission("elevado")),
-):
-    try:
-        match = _base_match(periodo, sucursal_id, fecha_inicio, fecha_fin)
-
-        pipeline = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_vendido": {"$sum": "$total"},
-                    "numero_ventas": {"$sum": 1},
-                    "total_recibido_mxn": {"$sum": {"$ifNull": ["$recibido_mxn", 0]}},
-                    "total_recibido_us": {"$sum": {"$ifNull": ["$recibido_us", 0]}},
-                    "total_recibido_tarj": {"$sum": {"$ifNull": ["$recibido_tarj", 0]}},
-                    "total_recibido_trans": {"$sum": {"$ifNull": ["$recibido_trans", 0]}},
-                }
-            },
-        ]
-
-        resultado = list(db_client.pbstation.ventas.aggregate(pipeline))
-
-        if resultado:
-            r = resultado[0]
-            total_vendido = _decimal128_to_float(r["total_vendido"])
-            numero_ventas = r["numero_ventas"]
-            ticket_promedio = total_vendido / numero_ventas if numero_ventas > 0 else 0
-        else:
-            total_vendido = 0
-            numero_ventas = 0
-            ticket_promedio = 0
-
-        # Cancelaciones del periodo
-        match_canceladas = {
-            "cancelado": True,
-        }
-        filtro_fecha = _filtro_periodo(periodo, fecha_inicio, fecha_fin)
-        match_canceladas.update(filtro_fecha)
-        if sucursal_id:
-            match_canceladas["sucursal_id"] = sucursal_id
+async def _resumen(rango, rango_anterior, sucursal_id: str | None = None) -> dict:
+    async def calcular():
+        resultado = await _agregar(_pipeline_resumen(rango, rango_anterior, sucursal_id), VENTAS_POR_HORA)
+        facetas = resultado[0] if resultado else {}
 
-        pipeline_cancel = [
-            {"$match": match_canceladas},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_cancelado": {"$sum": "$total"},
-                    "ventas_canceladas": {"$sum": 1},
-                }
-            },
-        ]
-        resultado_cancel = list(db_client.pbstation.ventas.aggregate(pipeline_cancel))
-        total_cancelado = _decimal128_to_float(resultado_cancel[0]["total_cancelado"]) if resultado_cancel else 0
-        ventas_canceladas = resultado_cancel[0]["ventas_canceladas"] if resultado_cancel else 0
-
-        # Adeudos activos (sin filtro de periodo, son actuales)
-        match_adeudos = {
-            "liquidado": False,
-            "cancelado": {"$ne": True},
-        }
-        if sucursal_id:
-            match_adeudos["sucursal_id"] = sucursal_id
-
-        pipeline_adeudos = [
-            {"$match": match_adeudos},
-            {
-                "$group": {
-                    "_id": None,
-                    "adeudos_activos": {"$sum": "$total"},
-                    "num_adeudos": {"$sum": 1},
-                }
-            },
-        ]
-        resultado_adeudos = list(db_client.pbstation.ventas.aggregate(pipeline_adeudos))
-        adeudos_activos = _decimal128_to_float(resultado_adeudos[0]["adeudos_activos"]) if resultado_adeudos else 0
-        num_adeudos = resultado_adeudos[0]["num_adeudos"] if resultado_adeudos else 0
+        r = (facetas.get("actual") or [{}])[0]
+        total_vendido = _decimal128_to_float(r.get("total_vendido"))
+        numero_ventas = r.get("numero_ventas", 0)
+        ticket_promedio = total_vendido / numero_ventas if numero_ventas > 0 else 0
 
         # Periodo anterior para comparativa
         periodo_anterior = None
-        if periodo != "todo":
-            match_anterior = {
-                "liquidado": True,
-                "cancelado": {"$ne": True},
+        if rango_anterior is not None:
+            ra = (facetas.get("anterior") or [{}])[0]
+            tv_ant = _decimal128_to_float(ra.get("total_vendido"))
+            nv_ant = ra.get("numero_ventas", 0)
+            periodo_anterior = {
+                "total_vendido": round(tv_ant, 2),
+                "numero_ventas": nv_ant,
+                "ticket_promedio": round(tv_ant / nv_ant, 2) if nv_ant > 0 else 0,
+                "fecha_inicio": rango_anterior[0].strftime("%Y-%m-%d"),
+                "fecha_fin": rango_anterior[1].strftime("%Y-%m-%d"),
             }
-            filtro_anterior, f_ini_ant, f_fin_ant = _filtro_periodo_anterior(periodo, fecha_inicio, fecha_fin)
-            match_anterior.update(filtro_anterior)
-            if sucursal_id:
-                match_anterior["sucursal_id"] = sucursal_id
-
-            if filtro_anterior: # Si logramos calcular fechas
-                pipeline_anterior = [
-                    {"$match": match_anterior},
-                    {
-                        "$group": {
-                            "_id": None,
-                            "total_vendido": {"$sum": "$total"},
-                            "numero_ventas": {"$sum": 1},
-                        }
-                    },
-                ]
-                resultado_anterior = list(db_client.pbstation.ventas.aggregate(pipeline_anterior))
-                if resultado_anterior:
-                    ra = resultado_anterior[0]
-                    tv_ant = _decimal128_to_float(ra["total_vendido"])
-                    nv_ant = ra["numero_ventas"]
-                    periodo_anterior = {
-                        "total_vendido": round(tv_ant, 2),
-                        "numero_ventas": nv_ant,
-                        "ticket_promedio": round(tv_ant / nv_ant, 2) if nv_ant > 0 else 0,
-                        "fecha_inicio": f_ini_ant,
-                        "fecha_fin": f_fin_ant,
-                    }
-                else:
-                    periodo_anterior = {
-                        "total_vendido": 0,
-                        "numero_ventas": 0,
-                        "ticket_promedio": 0,
-                        "fecha_inicio": f_ini_ant,
-                        "fecha_fin": f_fin_ant,
-                    }
 
         return {
             "total_vendido": round(total_vendido, 2),
             "numero_ventas": numero_ventas,
             "ticket_promedio": round(ticket_promedio, 2),
-            "total_cancelado": round(total_cancelado, 2),
-            "ventas_canceladas": ventas_canceladas,
-            "adeudos_activos": round(adeudos_activos, 2),
-            "num_adeudos": num_adeudos,
+            "total_cancelado": round(_decimal128_to_float(r.get("total_cancelado")), 2),
+            "ventas_canceladas": r.get("ventas_canceladas", 0),
             "periodo_anterior": periodo_anterior,
         }
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener resumen: {str(e)}",
-        )
+    # El periodo (con su comparativa) se cachea; los adeudos no dependen
+    # del periodo ni pasan por los acumulados y se leen siempre
+    rango_cache = (rango_anterior[0], rango[1]) if rango_anterior is not None else rango
+    datos_periodo, resultado_adeudos = await asyncio.gather(
+        cache_reportes.obtener("resumen", rango_cache, sucursal_id, calcular),
+        _agregar(_pipeline_adeudos(sucursal_id)),
+    )
+
+    adeudos_activos = _decimal128_to_float(resultado_adeudos[0]["adeudos_activos"]) if resultado_adeudos else 0
+    num_adeudos = resultado_adeudos[0]["num_adeudos"] if resultado_adeudos else 0
+
+    periodo_anterior = datos_periodo.pop("periodo_anterior")
+    return {
+        **datos_periodo,
+        "adeudos_activos": round(adeudos_activos, 2),
+        "num_adeudos": num_adeudos,
+        "periodo_anterior": periodo_anterior,
+    }
 
 
-# ─────────────────────────── PRODUCTOS TOP ─────────────────────────────
-@router.get("/productos-top")
-async def obtener_productos_top(
+@router.get("/resumen")
+async def obtener_resumen(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
     sucursal_id: str = None,
-    limite: int = 10,
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = _base_match(periodo, sucursal_id, fecha_inicio, fecha_fin)
-        match["was_deuda"] = {"$ne": True}
+        return await _resumen(
+            _rango_dias(periodo, fecha_inicio, fecha_fin), _rango_anterior(periodo, fecha_inicio, fecha_fin), sucursal_id
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener resumen: {str(e)}",
+        )
+
 
+# ─────────────────────────── PRODUCTOS TOP ─────────────────────────────
+async def _productos_top(rango, sucursal_id: str | None = None, limite: int = 10) -> list:
+    async def calcular():
         pipeline = [
-            {"$match": match},
-            {"$unwind": "$detalles"},
+            {"$match": _match_acumulados(rango, sucursal_id)},
             {
                 "$group": {
-                    "_id": "$detalles.producto_id",
-                    "cantidad": {"$sum": "$detalles.cantidad"},
-                    "total": {"$sum": "$detalles.total"},
-                    "subtotal": {"$sum": "$detalles.subtotal"},
+                    "_id": "$producto_id",
+                    "lineas": {"$sum": "$lineas"},
+                    "cantidad": {"$sum": "$cantidad"},
+                    "total": {"$sum": "$total"},
+                    "subtotal": {"$sum": "$subtotal"},
                 }
             },
+            # Productos cuyas ventas se cancelaron despues quedan en cero
+            {"$match": {"lineas": {"$gt": 0}}},
             {"$sort": {"cantidad": -1}},
             {"$limit": limite},
         ]
 
-        resultado = list(db_client.pbstation.ventas.aggregate(pipeline))
+        resultado = await _agregar(pipeline, VENTAS_POR_PRODUCTO)
 
-        productos_ids = [r["_id"] for r in resultado if r["_id"]]
-        productos_map = {}
-        if productos_ids:
-            productos_cursor = db_client.pbstation.productos.find(
-                {"_id": {"$in": [ObjectId(pid) for pid in productos_ids]}},
-                {"descripcion": 1}
-            )
-            productos_map = {str(p["_id"]): p.get("descripcion", "Sin descripción") for p in productos_cursor}
+        # Descripciones desde el catalogo en memoria (sin consulta extra)
+        await catalogo_productos.asegurar_cargado()
 
         productos_top = []
         for r in resultado:
             producto_id = r["_id"]
+            producto = catalogo_productos.obtener(producto_id) if producto_id else None
             productos_top.append({
                 "producto_id": producto_id,
-                "descripcion": productos_map.get(producto_id, "Producto eliminado"),
+                "descripcion": producto.get("descripcion", "Sin descripción") if producto else "Producto eliminado",
                 "cantidad": r["cantidad"],
                 "total": round(_decimal128_to_float(r["total"]), 2),
                 "subtotal": round(_decimal128_to_float(r["subtotal"]), 2),
@@ -276,16 +284,11 @@ async def obtener_productos_top(
 
         return productos_top
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener productos top: {str(e)}",
-        )
+    return await cache_reportes.obtener("productos-top", rango, sucursal_id, calcular, limite=limite)
 
 
-# ─────────────────────────── CLIENTES TOP ──────────────────────────────
-@router.get("/clientes-top")
-async def obtener_clientes_top(
+@router.get("/productos-top")
+async def obtener_productos_top(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
@@ -294,24 +297,32 @@ async def obtener_clientes_top(
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = _base_match(periodo, sucursal_id, fecha_inicio, fecha_fin)
-        match["was_deuda"] = {"$ne": True}
+        return await _productos_top(_rango_dias(periodo, fecha_inicio, fecha_fin), sucursal_id, limite)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener productos top: {str(e)}",
+        )
 
+
+# ─────────────────────────── CLIENTES TOP ──────────────────────────────
+async def _clientes_top(rango, sucursal_id: str | None = None, limite: int = 10) -> list:
+    async def calcular():
         pipeline = [
-            {"$match": match},
+            {"$match": _match_acumulados(rango, sucursal_id)},
             {
                 "$group": {
                     "_id": "$cliente_id",
                     "total_compras": {"$sum": "$total"},
-                    "num_compras": {"$sum": 1},
-                    "ticket_promedio": {"$avg": "$total"},
+                    "num_compras": {"$sum": "$num"},
                 }
             },
+            {"$match": {"num_compras": {"$gt": 0}}},
             {"$sort": {"total_compras": -1}},
             {"$limit": limite},
         ]
 
-        resultado = list(db_client.pbstation.ventas.aggregate(pipeline))
+        resultado = await _agregar(pipeline, VENTAS_POR_CLIENTE)
 
         clientes_ids = [r["_id"] for r in resultado if r["_id"]]
         clientes_map = {}
@@ -320,7 +331,7 @@ async def obtener_clientes_top(
                 {"_id": {"$in": [ObjectId(cid) for cid in clientes_ids]}},
                 {"nombre": 1}
             )
-            clientes_map = {str(c["_id"]): c.get("nombre", "Sin nombre") for c in clientes_cursor}
+            clientes_map = {str(c["_id"]): c.get("nombre", "Sin nombre") async for c in clientes_cursor}
 
         clientes_top = []
         for r in resultado:
@@ -330,65 +341,54 @@ async def obtener_clientes_top(
                 "nombre": clientes_map.get(cliente_id, "Cliente eliminado"),
                 "total_compras": round(_decimal128_to_float(r["total_compras"]), 2),
                 "num_compras": r["num_compras"],
-                "ticket_promedio": round(_decimal128_to_float(r["ticket_promedio"]), 2),
+                "ticket_promedio": round(_decimal128_to_float(r["total_compras"]) / r["num_compras"], 2),
             })
 
         return clientes_top
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener clientes top: {str(e)}",
-        )
+    return await cache_reportes.obtener("clientes-top", rango, sucursal_id, calcular, limite=limite)
 
 
-# ─────────────────────────── MÉTODOS DE PAGO ───────────────────────────
-@router.get("/metodos-pago")
-async def obtener_metodos_pago(
+@router.get("/clientes-top")
+async def obtener_clientes_top(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
     sucursal_id: str = None,
+    limite: int = 10,
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = _base_match(periodo, sucursal_id, fecha_inicio, fecha_fin)
-        match["was_deuda"] = {"$ne": True}
+        return await _clientes_top(_rango_dias(periodo, fecha_inicio, fecha_fin), sucursal_id, limite)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener clientes top: {str(e)}",
+        )
 
+
+# ─────────────────────────── MÉTODOS DE PAGO ───────────────────────────
+async def _metodos_pago(rango, sucursal_id: str | None = None) -> dict:
+    async def calcular():
         pipeline = [
-            {"$match": match},
+            {"$match": _match_acumulados(rango, sucursal_id)},
             {
                 "$group": {
                     "_id": None,
-                    "efectivo_mxn": {"$sum": {"$ifNull": ["$recibido_mxn", 0]}},
-                    "efectivo_us": {"$sum": {"$ifNull": ["$recibido_us", 0]}},
-                    "tarjeta_debito": {
-                        "$sum": {
-                            "$cond": [
-                                {"$eq": ["$tipo_tarjeta", "debito"]},
-                                {"$ifNull": ["$recibido_tarj", 0]},
-                                0,
-                            ]
-                        }
-                    },
-                    "tarjeta_credito": {
-                        "$sum": {
-                            "$cond": [
-                                {"$eq": ["$tipo_tarjeta", "credito"]},
-                                {"$ifNull": ["$recibido_tarj", 0]},
-                                0,
-                            ]
-                        }
-                    },
-                    "transferencia": {"$sum": {"$ifNull": ["$recibido_trans", 0]}},
+                    "num_ventas": {"$sum": "$ventas_directas"},
+                    "efectivo_mxn": {"$sum": "$recibido_mxn"},
+                    "efectivo_us": {"$sum": "$recibido_us"},
+                    "tarjeta_debito": {"$sum": "$tarjeta_debito"},
+                    "tarjeta_credito": {"$sum": "$tarjeta_credito"},
+                    "transferencia": {"$sum": "$recibido_trans"},
                     "total_general": {"$sum": "$recibido_total"},
                 }
             },
         ]
 
-        resultado = list(db_client.pbstation.ventas.aggregate(pipeline))
+        resultado = await _agregar(pipeline, VENTAS_POR_HORA)
 
-        if resultado:
+        if resultado and resultado[0]["num_ventas"] > 0:
             r = resultado[0]
             total = _decimal128_to_float(r["total_general"])
             
@@ -407,44 +407,43 @@ async def obtener_metodos_pago(
         
         return {"metodos": [], "total_general": 0}
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener métodos de pago: {str(e)}",
-        )
+    return await cache_reportes.obtener("metodos-pago", rango, sucursal_id, calcular)
 
 
-# ─────────────────────────── POR SUCURSAL ──────────────────────────────
-@router.get("/por-sucursal")
-async def obtener_por_sucursal(
+@router.get("/metodos-pago")
+async def obtener_metodos_pago(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
+    sucursal_id: str = None,
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = {
-            "liquidado": True,
-            "cancelado": {"$ne": True},
-            "was_deuda": {"$ne": True},
-        }
-        filtro_fecha = _filtro_periodo(periodo, fecha_inicio, fecha_fin)
-        match.update(filtro_fecha)
+        return await _metodos_pago(_rango_dias(periodo, fecha_inicio, fecha_fin), sucursal_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener métodos de pago: {str(e)}",
+        )
+
 
+# ─────────────────────────── POR SUCURSAL ──────────────────────────────
+async def _por_sucursal(rango) -> list:
+    async def calcular():
         pipeline = [
-            {"$match": match},
+            {"$match": _match_acumulados(rango)},
             {
                 "$group": {
                     "_id": "$sucursal_id",
-                    "total": {"$sum": "$total"},
-                    "num_ventas": {"$sum": 1},
-                    "ticket_promedio": {"$avg": "$total"},
+                    "total": {"$sum": "$total_directo"},
+                    "num_ventas": {"$sum": "$ventas_directas"},
                 }
             },
+            {"$match": {"num_ventas": {"$gt": 0}}},
             {"$sort": {"total": -1}},
         ]
 
-        resultado = list(db_client.pbstation.ventas.aggregate(pipeline))
+        resultado = await _agregar(pipeline, VENTAS_POR_HORA)
 
         sucursales_ids = [r["_id"] for r in resultado if r["_id"]]
         sucursales_map = {}
@@ -453,7 +452,7 @@ async def obtener_por_sucursal(
                 {"_id": {"$in": [ObjectId(sid) for sid in sucursales_ids]}},
                 {"nombre": 1}
             )
-            sucursales_map = {str(s["_id"]): s.get("nombre", "Sin nombre") for s in sucursales_cursor}
+            sucursales_map = {str(s["_id"]): s.get("nombre", "Sin nombre") async for s in sucursales_cursor}
 
         sucursales = []
         for r in resultado:
@@ -463,60 +462,42 @@ async def obtener_por_sucursal(
                 "nombre": sucursales_map.get(sucursal_id, "Sucursal eliminada"),
                 "total": round(_decimal128_to_float(r["total"]), 2),
                 "num_ventas": r["num_ventas"],
-                "ticket_promedio": round(_decimal128_to_float(r["ticket_promedio"]), 2),
+                "ticket_promedio": round(_decimal128_to_float(r["total"]) / r["num_ventas"], 2),
             })
 
         return sucursales
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener reporte por sucursal: {str(e)}",
-        )
+    return await cache_reportes.obtener("por-sucursal", rango, None, calcular)
 
 
-# ─────────────────────────── CANCELACIONES ─────────────────────────────
-@router.get("/cancelaciones")
-async def obtener_cancelaciones(
+@router.get("/por-sucursal")
+async def obtener_por_sucursal(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
-    sucursal_id: str = None,
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = {"cancelado": True}
-        filtro_fecha = _filtro_periodo(periodo, fecha_inicio, fecha_fin)
-        match.update(filtro_fecha)
-        if sucursal_id:
-            match["sucursal_id"] = sucursal_id
-
-        pipeline_totales = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_cancelado": {"$sum": "$total"},
-                    "num_cancelaciones": {"$sum": 1},
-                }
-            },
-        ]
+        return await _por_sucursal(_rango_dias(periodo, fecha_inicio, fecha_fin))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener reporte por sucursal: {str(e)}",
+        )
 
-        pipeline_motivos = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": {"$ifNull": ["$motivo_cancelacion", "Sin motivo"]},
-                    "cantidad": {"$sum": 1},
-                    "monto": {"$sum": "$total"},
-                }
-            },
-            {"$sort": {"cantidad": -1}},
-            {"$limit": 10},
-        ]
 
-        resultado_totales = list(db_client.pbstation.ventas.aggregate(pipeline_totales))
-        resultado_motivos = list(db_client.pbstation.ventas.aggregate(pipeline_motivos))
+# ─────────────────────────── CANCELACIONES ─────────────────────────────
+async def _cancelaciones(rango, sucursal_id: str | None = None) -> dict:
+    match = {"cancelado": True}
+    match.update(_filtro_fecha_venta(rango))
+    if sucursal_id:
+        match["sucursal_id"] = sucursal_id
+
+    async def calcular():
+        resultado = await _agregar(_pipeline_cancelaciones(match))
+        facetas = resultado[0] if resultado else {}
+        resultado_totales = facetas.get("totales", [])
+        resultado_motivos = facetas.get("motivos", [])
 
         total_cancelado = _decimal128_to_float(resultado_totales[0]["total_cancelado"]) if resultado_totales else 0
         num_cancelaciones = resultado_totales[0]["num_cancelaciones"] if resultado_totales else 0
@@ -535,16 +516,12 @@ async def obtener_cancelaciones(
             "motivos": motivos,
         }
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener cancelaciones: {str(e)}",
-        )
+    # Las cancelaciones leen `ventas`, pero con los mismos dias que invalida cancelar_venta
+    return await cache_reportes.obtener("cancelaciones", rango, sucursal_id, calcular)
 
 
-# ─────────────────────────── TENDENCIAS ────────────────────────────────
-@router.get("/tendencias")
-async def obtener_tendencias(
+@router.get("/cancelaciones")
+async def obtener_cancelaciones(
     periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
     fecha_inicio: str = None,
     fecha_fin: str = None,
@@ -552,80 +529,47 @@ async def obtener_tendencias(
     token: dict = Depends(require_permission("elevado")),
 ):
     try:
-        match = _base_match(periodo, sucursal_id, fecha_inicio, fecha_fin)
-        match["was_deuda"] = {"$ne": True}
-
-        pipeline_horas = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": {"$hour": "$fecha_venta"},
-                    "total": {"$sum": "$total"},
-                    "num_ventas": {"$sum": 1},
-                }
-            },
-            {"$sort": {"_id": 1}},
-        ]
+        return await _cancelaciones(_rango_dias(periodo, fecha_inicio, fecha_fin), sucursal_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener cancelaciones: {str(e)}",
+        )
 
-        pipeline_dias = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": {"$dayOfWeek": "$fecha_venta"},
-                    "total": {"$sum": "$total"},
-                    "num_ventas": {"$sum": 1},
-                }
-            },
-            {"$sort": {"_id": 1}},
-        ]
 
-        pipeline_serie = [
-            {"$match": match},
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": "$fecha_venta",
-                        }
-                    },
-                    "total": {"$sum": "$total"},
-                    "num_ventas": {"$sum": 1},
-                }
-            },
-            {"$sort": {"_id": 1}},
-        ]
+# ─────────────────────────── TENDENCIAS ────────────────────────────────
+async def _tendencias(rango, sucursal_id: str | None = None) -> dict:
+    async def calcular():
+        resultado = await _agregar(_pipeline_tendencias(rango, sucursal_id), VENTAS_POR_HORA)
 
-        resultado_horas = list(db_client.pbstation.ventas.aggregate(pipeline_horas))
-        resultado_dias = list(db_client.pbstation.ventas.aggregate(pipeline_dias))
-        resultado_serie = list(db_client.pbstation.ventas.aggregate(pipeline_serie))
+        horas: dict[int, list] = {}
+        dias_semana: dict[int, list] = {}
+        dias: dict[datetime, list] = {}
+        for r in resultado:
+            dia = r["_id"]["dia"]
+            total = _decimal128_to_float(r["total"])
+            # Mismo numero que $dayOfWeek: 1 = domingo ... 7 = sabado
+            for grupo, clave in ((horas, r["_id"]["hora"]), (dias_semana, dia.isoweekday() % 7 + 1), (dias, dia)):
+                suma = grupo.setdefault(clave, [0.0, 0])
+                suma[0] += total
+                suma[1] += r["num_ventas"]
 
         dias_semana_map = {1: "Domingo", 2: "Lunes", 3: "Martes", 4: "Miércoles", 5: "Jueves", 6: "Viernes", 7: "Sábado"}
 
-        por_hora = []
-        for r in resultado_horas:
-            por_hora.append({
-                "hora": r["_id"],
-                "total": round(_decimal128_to_float(r["total"]), 2),
-                "num_ventas": r["num_ventas"],
-            })
+        por_hora = [
+            {"hora": hora, "total": round(total, 2), "num_ventas": num}
+            for hora, (total, num) in sorted(horas.items())
+        ]
 
-        por_dia = []
-        for r in resultado_dias:
-            por_dia.append({
-                "dia_semana": r["_id"],
-                "dia_nombre": dias_semana_map.get(r["_id"], "?"),
-                "total": round(_decimal128_to_float(r["total"]), 2),
-                "num_ventas": r["num_ventas"],
-            })
+        por_dia = [
+            {"dia_semana": dia, "dia_nombre": dias_semana_map.get(dia, "?"), "total": round(total, 2), "num_ventas": num}
+            for dia, (total, num) in sorted(dias_semana.items())
+        ]
 
-        serie_diaria = []
-        for r in resultado_serie:
-            serie_diaria.append({
-                "fecha": r["_id"],
-                "total": round(_decimal128_to_float(r["total"]), 2),
-                "num_ventas": r["num_ventas"],
-            })
+        serie_diaria = [
+            {"fecha": dia.strftime("%Y-%m-%d"), "total": round(total, 2), "num_ventas": num}
+            for dia, (total, num) in sorted(dias.items())
+        ]
 
         return {
             "por_hora": por_hora,
@@ -633,8 +577,88 @@ async def obtener_tendencias(
             "serie_diaria": serie_diaria,
         }
 
+    return await cache_reportes.obtener("tendencias", rango, sucursal_id, calcular)
+
+
+@router.get("/tendencias")
+async def obtener_tendencias(
+    periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
+    fecha_inicio: str = None,
+    fecha_fin: str = None,
+    sucursal_id: str = None,
+    token: dict = Depends(require_permission("elevado")),
+):
+    try:
+        return await _tendencias(_rango_dias(periodo, fecha_inicio, fecha_fin), sucursal_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener tendencias: {str(e)}",
         )
+
+
+# ─────────────────────────── DASHBOARD ─────────────────────────────────
+async def _medir(tiempos: dict, panel: str, consulta: Awaitable):
+    inicio = time.perf_counter()
+    try:
+        return await consulta
+    finally:
+        tiempos[panel] = round((time.perf_counter() - inicio) * 1000, 2)
+
+
+@router.get("/dashboard")
+async def obtener_dashboard(
+    periodo: str = Query("mes", regex="^(semana|mes|todo|custom)$"),
+    fecha_inicio: str = None,
+    fecha_fin: str = None,
+    sucursal_id: str = None,
+    limite: int = 10,
+    token: dict = Depends(require_permission("elevado")),
+):
+    """
+    Todos los paneles de la pantalla de reportes en una peticion: el token y
+    el periodo se resuelven una vez y los paneles corren a la vez, asi que
+    tarda lo que el mas lento. Cada panel regresa lo mismo que su endpoint
+    (y comparte su cache); por_sucursal, como su endpoint, no filtra por
+    sucursal. Un panel que falla queda en None con su error en `errores`.
+    """
+    inicio = time.perf_counter()
+    try:
+        rango = _rango_dias(periodo, fecha_inicio, fecha_fin)
+        rango_anterior = _rango_anterior(periodo, fecha_inicio, fecha_fin)
+        consultas = {
+            "resumen": _resumen(rango, rango_anterior, sucursal_id),
+            "productos_top": _productos_top(rango, sucursal_id, limite),
+            "clientes_top": _clientes_top(rango, sucursal_id, limite),
+            "metodos_pago": _metodos_pago(rango, sucursal_id),
+            "por_sucursal": _por_sucursal(rango),
+            "cancelaciones": _cancelaciones(rango, sucursal_id),
+            "tendencias": _tendencias(rango, sucursal_id),
+        }
+        tiempos: dict[str, float] = {}
+        resultados = await asyncio.gather(
+            *(_medir(tiempos, panel, consulta) for panel, consulta in consultas.items()),
+            return_exceptions=True,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener dashboard: {str(e)}",
+        )
+
+    paneles, errores = {}, {}
+    for panel, resultado in zip(consultas, resultados):
+        if isinstance(resultado, Exception):
+            print(f"[ERROR] Panel {panel} del dashboard: {resultado}")
+            paneles[panel] = None
+            errores[panel] = str(resultado)
+        else:
+            paneles[panel] = resultado
+    return {
+        **paneles,
+        "errores": errores,
+        "tiempos_ms": {
+            **{panel: tiempos[panel] for panel in consultas},
+            "total": round((time.perf_counter() - inicio) * 1000, 2),
+        },
+    }
@@ -1,25 +1,35 @@
 from typing import Optional
 from bson import ObjectId
 from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, Header, status, Depends
+from fastapi import APIRouter, HTTPException, Header, status, Depends, Request
 from pymongo import ReturnDocument
 from core.database import db_client
 from generador_folio import obtener_siguiente_prefijo
 from models.sucursal import Sucursal
 from schemas.sucursal import sucursales_schema, sucursal_schema
+from core.cambios import registrar_cambio, sincronizar
+from core.versiones import respuesta_condicional
+from models.sincronizacion import SincronizacionCatalogo
 from routers.websocket import manager 
 from validar_token import validar_token 
 
 router = APIRouter(prefix="/sucursales", tags=["sucursales"])
  
 @router.get("/all", response_model=list[Sucursal])
-async def obtener_sucursales(token: str = Depends(validar_token)):
-    return sucursales_schema(db_client.pbstation.sucursales.find({"activo": True}))
+async def obtener_sucursales(request: Request, token: str = Depends(validar_token)):
+    async def obtener():
+        return sucursales_schema(await db_client.pbstation.sucursales.find({"activo": True}).to_list())
+    # 304 sin tocar Mongo si el ETag sigue vigente
+    return await respuesta_condicional(request, "sucursal", obtener, list[Sucursal])
+
+@router.get("/sync", response_model=SincronizacionCatalogo)
+async def sincronizar_sucursales(since: Optional[int] = None, token: str = Depends(validar_token)):
+    return await sincronizar("sucursales", since, sucursales_schema, filtro={"activo": True})
 
 @router.get("/{id}")
 async def obtener_sucursal(id: str, token: str = Depends(validar_token)):
     try:
-        sucursal = search_sucursal("_id", ObjectId(id))
+        sucursal = await search_sucursal("_id", ObjectId(id))
         if sucursal is None:
             raise HTTPException(status_code=404, detail="Sucursal no encontrada")
         return sucursal
@@ -29,16 +39,17 @@ async def obtener_sucursal(id: str, token: str = Depends(validar_token)):
 @router.post("/", response_model=Sucursal, status_code=status.HTTP_201_CREATED) #post
 async def crear_sucursal(sucursal: Sucursal, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
     if sucursal.nombre is not None:
-        if type(search_sucursal("nombre", sucursal.nombre)) == Sucursal:
+        if type(await search_sucursal("nombre", sucursal.nombre)) == Sucursal:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail='La sucursal ya existe en la base de datos.')
     sucursal_dict = dict(sucursal)
     del sucursal_dict["id"] #quitar el id para que no se guarde como null
     # generar prefijo atómico y sobreeescribir cualquier input
-    prefijo = obtener_siguiente_prefijo(db_client.pbstation)
+    prefijo = await obtener_siguiente_prefijo(db_client.pbstation)
     sucursal_dict["prefijo_folio"] = prefijo
-    id = db_client.pbstation.sucursales.insert_one(sucursal_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nueva_sucuesal = sucursal_schema(db_client.pbstation.sucursales.find_one({"_id":id})) #izquierda= que tiene que buscar. derecha= esto tiene que buscar
+    id = (await db_client.pbstation.sucursales.insert_one(sucursal_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nueva_sucuesal = sucursal_schema(await db_client.pbstation.sucursales.find_one({"_id":id})) #izquierda= que tiene que buscar. derecha= esto tiene que buscar
+    await registrar_cambio("sucursales", id)
     await manager.broadcast(
         f"post-sucursal:{str(id)}",
         exclude_connection_id=x_connection_id
@@ -55,7 +66,7 @@ async def actualizar_sucursal(sucursal: Sucursal, token: str = Depends(validar_t
     sucursal_dict = dict(sucursal)
     del sucursal_dict["id"] #eliminar id para no actualizar el id
     try:
-        result = db_client.pbstation.sucursales.find_one_and_replace(
+        result = await db_client.pbstation.sucursales.find_one_and_replace(
             {"_id":ObjectId(sucursal.id)},
             sucursal_dict
         ) 
@@ -63,15 +74,16 @@ async def actualizar_sucursal(sucursal: Sucursal, token: str = Depends(validar_t
             raise HTTPException(status_code=404, detail='Sucursal no encontrada.')
     except:        
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro sucursal (put)')
+    await registrar_cambio("sucursales", sucursal.id)
     await manager.broadcast(
         f"put-sucursal:{str(ObjectId(sucursal.id))}",
         exclude_connection_id=x_connection_id
     )
-    return search_sucursal("_id", ObjectId(sucursal.id))
+    return await search_sucursal("_id", ObjectId(sucursal.id))
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT) #delete path
 async def delete_sucursal(id: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
-    found = db_client.pbstation.sucursales.find_one_and_update(
+    found = await db_client.pbstation.sucursales.find_one_and_update(
         {"_id": ObjectId(id)},
         {"$set": {"activo": False}},
         return_document=ReturnDocument.AFTER
@@ -79,15 +91,16 @@ async def delete_sucursal(id: str, token: str = Depends(validar_token), x_connec
     if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro la sucursal')
     else:
+        await registrar_cambio("sucursales", id)
         await manager.broadcast(
             f"delete-sucursal:{str(id)}",
             exclude_connection_id=x_connection_id
         )
         return {'message':'Desactivado con exito'}
     
-def search_sucursal(field: str, key):
+async def search_sucursal(field: str, key):
     try:
-        sucursal = db_client.pbstation.sucursales.find_one({field: key})
+        sucursal = await db_client.pbstation.sucursales.find_one({field: key})
         if not sucursal:  # Verificar si no se encontró la sucursal
             return None
         return Sucursal(**sucursal_schema(sucursal))  # el ** sirve para pasar los valores del diccionario
@@ -1,60 +1,64 @@
 from typing import Optional
 from bson import ObjectId
 from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, Header, status, Depends
+from fastapi import APIRouter, HTTPException, Header, status, Depends, Request
 from pymongo import ReturnDocument
 from models.cambiar_psw import CambiarPassword
 from models.usuario import Usuario
 from core.database import db_client
 from schemas.usuario import usuario_public_schema, usuario_schema, usuarios_schema
-from passlib.context import CryptContext
+from core.seguridad import hashear_password
+from core.cambios import registrar_cambio, sincronizar
+from core.versiones import respuesta_condicional
+from models.sincronizacion import SincronizacionCatalogo
 from routers.websocket import manager 
-from validar_token import require_permission, revocar_sesiones_usuario, validar_token
-
-# Configuración para hashing de contraseñas
-try:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-except AttributeError:
-    # Suprimir el error relacionado con bcrypt
-    pwd_context = None
+from validar_token import invalidar_usuario_cache, require_permission, revocar_sesiones_usuario, validar_token
 
 router = APIRouter(prefix="/usuarios", tags=["usuarios"])
 
 @router.get("/all")
-async def obtener_usuarios(token: str = Depends(validar_token)):
-    return usuarios_schema(db_client.pbstation.usuarios.find({"activo": True}))
+async def obtener_usuarios(request: Request, token: str = Depends(validar_token)):
+    async def obtener():
+        return usuarios_schema(await db_client.pbstation.usuarios.find({"activo": True}).to_list())
+    # 304 sin tocar Mongo si el ETag sigue vigente
+    return await respuesta_condicional(request, "usuario", obtener)
+
+@router.get("/sync", response_model=SincronizacionCatalogo)
+async def sincronizar_usuarios(since: Optional[int] = None, token: str = Depends(validar_token)):
+    return await sincronizar("usuarios", since, usuarios_schema, filtro={"activo": True})
 
 @router.get("/{id}")
 async def obtener_usuario(id: str, token: str = Depends(validar_token)):
     try:
-        usuarios = search_usuario("_id", ObjectId(id))
+        usuarios = await search_usuario("_id", ObjectId(id))
         if usuarios is None:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        return usuario_public_schema(db_client.pbstation.usuarios.find_one({"_id": ObjectId(id)}))
+        return usuario_public_schema(await db_client.pbstation.usuarios.find_one({"_id": ObjectId(id)}))
     except InvalidId:
         raise HTTPException(status_code=400, detail="Formato de ID inválido")
     
 @router.post("/", status_code=status.HTTP_201_CREATED) #post
 async def crear_usuario(usuario: Usuario, token: dict = Depends(require_permission("elevado")), x_connection_id: Optional[str] = Header(None)):
     usuario.correo = usuario.correo.lower()
-    if type(search_usuario("correo", usuario.correo)) == Usuario:
+    if type(await search_usuario("correo", usuario.correo)) == Usuario:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail='Este Correo ya está asociado a un Usuario')
     usuario.telefono = usuario.telefono
-    if usuario.telefono is not None and type(search_usuario("telefono", usuario.telefono)) == Usuario:
+    if usuario.telefono is not None and type(await search_usuario("telefono", usuario.telefono)) == Usuario:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail='Este Teléfono ya está asociado a un Usuario')
     usuario.correo = usuario.correo.lower()
     usuario_dict = dict(usuario)
-    usuario_dict["psw"] = pwd_context.hash(usuario.psw)  # Encriptar la contraseña
+    usuario_dict["psw"] = await hashear_password(usuario.psw)  # Encriptar la contraseña
     del usuario_dict["id"] #quitar el id para que no se guarde como null
-    id = db_client.pbstation.usuarios.insert_one(usuario_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nuevo_usuario = usuario_schema(db_client.pbstation.usuarios.find_one({"_id":id})) #izquierda= que tiene que buscar. derecha= esto tiene que buscar
+    id = (await db_client.pbstation.usuarios.insert_one(usuario_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nuevo_usuario = usuario_schema(await db_client.pbstation.usuarios.find_one({"_id":id})) #izquierda= que tiene que buscar. derecha= esto tiene que buscar
+    await registrar_cambio("usuarios", id)
     await manager.broadcast(
         f"post-usuario:{str(id)}",
         exclude_connection_id=x_connection_id
     ) #Notificar a todos
-    return usuario_public_schema(db_client.pbstation.usuarios.find_one({"_id":id}))
+    return usuario_public_schema(await db_client.pbstation.usuarios.find_one({"_id":id}))
 
 @router.put("/", status_code=status.HTTP_200_OK)
 async def actualizar_usuario(usuario: Usuario, token: dict = Depends(require_permission("elevado")), x_connection_id: Optional[str] = Header(None)):
@@ -69,7 +73,7 @@ async def actualizar_usuario(usuario: Usuario, token: dict = Depends(require_per
     if "psw" in usuario_dict:
         del usuario_dict["psw"]
     try:
-        result = db_client.pbstation.usuarios.update_one(
+        result = await db_client.pbstation.usuarios.update_one(
             {"_id": ObjectId(usuario.id)}, 
             {"$set": usuario_dict}
         )
@@ -83,15 +87,17 @@ async def actualizar_usuario(usuario: Usuario, token: dict = Depends(require_per
             status_code=status.HTTP_404_NOT_FOUND, 
             detail='No se encontró el usuario (put)'
         )
+    await invalidar_usuario_cache(usuario.id)
+    await registrar_cambio("usuarios", usuario.id)
     await manager.broadcast(
         f"put-usuario:{str(ObjectId(usuario.id))}",
         exclude_connection_id=x_connection_id
     )
-    return usuario_public_schema(db_client.pbstation.usuarios.find_one({"_id": ObjectId(usuario.id)}))
+    return usuario_public_schema(await db_client.pbstation.usuarios.find_one({"_id": ObjectId(usuario.id)}))
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT) #delete path
 async def delete_usuario(id: str, token: dict = Depends(require_permission("elevado")), x_connection_id: Optional[str] = Header(None)):
-    found = db_client.pbstation.usuarios.find_one_and_update(
+    found = await db_client.pbstation.usuarios.find_one_and_update(
         {"_id": ObjectId(id)},
         {"$set": {"activo": False}},
         return_document=ReturnDocument.AFTER
@@ -99,6 +105,8 @@ async def delete_usuario(id: str, token: dict = Depends(require_permission("elev
     if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro el usuario')
     else:
+        await invalidar_usuario_cache(id)
+        await registrar_cambio("usuarios", id)
         await manager.broadcast(
             f"delete-usuario:{str(id)}",
             exclude_connection_id=x_connection_id
@@ -109,20 +117,21 @@ async def delete_usuario(id: str, token: dict = Depends(require_permission("elev
 async def cambiar_password_seguro(datos: CambiarPassword, token: dict = Depends(require_permission("elevado"))):
     try:
         # Buscar el usuario actual
-        usuario_actual = db_client.pbstation.usuarios.find_one({"_id": ObjectId(datos.id)})
+        usuario_actual = await db_client.pbstation.usuarios.find_one({"_id": ObjectId(datos.id)})
         if not usuario_actual:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail='No se encontró el usuario'
             )
         # Encriptar la nueva contraseña
-        nueva_psw_encriptada = pwd_context.hash(datos.nueva_psw)
+        nueva_psw_encriptada = await hashear_password(datos.nueva_psw)
         # Actualizar la contraseña
-        db_client.pbstation.usuarios.update_one(
+        await db_client.pbstation.usuarios.update_one(
             {"_id": ObjectId(datos.id)},
             {"$set": {"psw": nueva_psw_encriptada}}
         )
-        revocar_sesiones_usuario(datos.id)
+        await registrar_cambio("usuarios", datos.id)
+        await revocar_sesiones_usuario(datos.id)
     except HTTPException:
         raise
     except Exception as e:
@@ -132,9 +141,9 @@ async def cambiar_password_seguro(datos: CambiarPassword, token: dict = Depends(
         )
     return {"message": "Contraseña actualizada exitosamente"}
 
-def search_usuario(field: str, key):
+async def search_usuario(field: str, key):
     try:
-        usuario = db_client.pbstation.usuarios.find_one({field: key})
+        usuario = await db_client.pbstation.usuarios.find_one({field: key})
         if not usuario:  # Verificar si no se encontró el usuario
             return None
         return Usuario(**usuario_schema(usuario))  # el ** sirve para pasar los valores del diccionario
@@ -1,25 +1,48 @@
+from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import List, Optional
 from bson import ObjectId
 from bson.errors import InvalidId
-from fastapi import APIRouter, HTTPException, Header, status, Depends
+from fastapi import APIRouter, HTTPException, Header, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from core.database import db_client
 from generador_folio import generar_folio_venta
+from models.cliente import Cliente
 from models.venta import Venta
+from schemas.adeudo import adeudos_schema
+from schemas.cliente import cliente_schema
 from schemas.venta import venta_schema
+from core.acumulados import aplicar_cambio_venta
+from core.cache_reportes import EVENTO_INVALIDAR
+from core.exportacion import FORMATOS
+from core.adeudos import adeudos_de_cliente, quitar_adeudo
+from core.cambios import registrar_cambio
 from routers.websocket import manager
 from bson.decimal128 import Decimal128
 from validar_token import require_permission, validar_token
 
 router = APIRouter(prefix="/ventas", tags=["ventas"])
 
+
+async def _actualizar_reportes(venta_anterior: Optional[dict], venta_actual: Optional[dict]):
+    """Aplica el cambio a los acumulados y avisa a todos los workers que dias de reportes ya no valen."""
+    afectados = await aplicar_cambio_venta(venta_anterior, venta_actual)
+    if not afectados:
+        return
+    try:
+        await manager.publicar_interno(EVENTO_INVALIDAR, {"afectados": afectados})
+    except Exception as e:
+        # Los reportes de este worker se quedan como estaban hasta su TTL
+        print(f"[ERROR] No se pudo publicar la invalidacion de reportes: {e}")
+
+
 @router.get("/caja/{caja_id}", response_model=list[Venta])
 async def obtener_ventas_de_caja(caja_id: str, token: str = Depends(validar_token), orden: str = "asc"):
     try:
         try:
-            caja = db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
+            caja = await db_client.pbstation.cajas.find_one({"_id": ObjectId(caja_id)})
         except Exception:
             raise HTTPException(status_code=400, detail="caja_id inválido")
         if not caja:
@@ -37,7 +60,7 @@ async def obtener_ventas_de_caja(caja_id: str, token: str = Depends(validar_toke
             {"_id": {"$in": cortes_oids}},
             {"ventas_ids": 1}
         )
-        cortes = {c["_id"]: c for c in cortes_cursor}
+        cortes = {c["_id"]: c async for c in cortes_cursor}
         ventas_ids_flat = []
         for corte_id in cortes_oids:
             corte = cortes.get(corte_id)
@@ -48,8 +71,7 @@ async def obtener_ventas_de_caja(caja_id: str, token: str = Depends(validar_toke
             return []
 
         ventas_oids = list({to_oid(v) for v in ventas_ids_flat})
-        ventas_cursor = db_client.pbstation.ventas.find({"_id": {"$in": ventas_oids}})
-        ventas = list(ventas_cursor)
+        ventas = await db_client.pbstation.ventas.find({"_id": {"$in": ventas_oids}}).to_list()
         reverse = (orden.lower() != "asc") 
         ventas_sorted = sorted(ventas, key=lambda v: v.get("fecha_venta") or v["_id"].generation_time, reverse=reverse)
 
@@ -71,7 +93,7 @@ async def obtener_ventas_de_corte(corte_id: str, token: str = Depends(validar_to
         except Exception:
             raise HTTPException(status_code=400, detail="corte_id inválido")
 
-        corte = db_client.pbstation.cortes.find_one({"_id": corte_oid}, {"ventas_ids": 1})
+        corte = await db_client.pbstation.cortes.find_one({"_id": corte_oid}, {"ventas_ids": 1})
         if not corte:
             raise HTTPException(status_code=404, detail="Corte no encontrado")
 
@@ -84,7 +106,7 @@ async def obtener_ventas_de_corte(corte_id: str, token: str = Depends(validar_to
 
         ventas_oids = [to_oid(v) for v in ventas_ids_raw]
         ventas_cursor = db_client.pbstation.ventas.find({"_id": {"$in": ventas_oids}})
-        ventas_map = {str(v["_id"]): v for v in ventas_cursor}
+        ventas_map = {str(v["_id"]): v async for v in ventas_cursor}
         ventas_ordenadas = []
         for v_raw in ventas_ids_raw:
             v = ventas_map.get(str(to_oid(v_raw)))
@@ -101,10 +123,43 @@ async def obtener_ventas_de_corte(corte_id: str, token: str = Depends(validar_to
             detail=f"Error al obtener las ventas del corte: {str(e)}"
         )
     
+@router.get("/exportar")
+async def exportar_ventas(
+    fecha_inicio: str,
+    fecha_fin: str,
+    formato: str = Query("csv", regex="^(csv|xlsx)$"),
+    nivel: str = Query("venta", regex="^(venta|detalle)$"),
+    sucursal_id: Optional[str] = None,
+    token: dict = Depends(require_permission("elevado")),
+):
+    """
+    Ventas de fecha_inicio a fecha_fin (YYYY-MM-DD, inclusive) como archivo
+    CSV o XLSX, una fila por venta o por linea de detalle. Se lee y se manda
+    por lotes (core.exportacion), asi que la memoria no crece con el rango.
+    """
+    try:
+        inicio = datetime.strptime(fecha_inicio, "%Y-%m-%d")
+        fin = datetime.strptime(fecha_fin, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if fin < inicio:
+        raise HTTPException(status_code=400, detail="fecha_fin debe ser igual o posterior a fecha_inicio")
+
+    filtros = {"fecha_venta": {"$gte": inicio, "$lt": fin + timedelta(days=1)}}
+    if sucursal_id:
+        filtros["sucursal_id"] = sucursal_id
+    exportar, media_type = FORMATOS[formato]
+    nombre = f"ventas_{nivel}_{fecha_inicio}_{fecha_fin}.{formato}"
+    return StreamingResponse(
+        exportar(filtros, nivel),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
 @router.get("/{id}")
 async def obtener_venta(id: str, token: str = Depends(validar_token)):
     try:
-        venta = search_venta("_id", ObjectId(id))
+        venta = await search_venta("_id", ObjectId(id))
         if venta is None:
             raise HTTPException(status_code=404, detail="VentaEnviada no encontrada")
         return venta
@@ -131,7 +186,7 @@ async def obtener_ventas_por_ids(
     if sucursal_id:
         query_filter["sucursal_id"] = sucursal_id
     try:
-        ventas_list = list(db_client.pbstation.ventas.find(query_filter))
+        ventas_list = await db_client.pbstation.ventas.find(query_filter).to_list()
         if not ventas_list:
             return []
         def get_fecha_venta(venta):
@@ -166,12 +221,12 @@ async def obtener_ventas_sin_factura_del_mes(
                 return Decimal(str(value.to_decimal()))
             return Decimal(str(value)) if value else Decimal("0")
         
-        ventas = list(db_client.pbstation.ventas.find({
+        ventas = await db_client.pbstation.ventas.find({
             "factura_id": None,
             "liquidado": True,
             "cancelado": {"$ne": True},
             "fecha_venta": {"$gte": fecha_inicio, "$lte": fecha_fin}
-        }))
+        }).to_list()
         
         folios_vistos = set()
         detalles_agrupados = {}
@@ -242,13 +297,13 @@ async def pagar_venta(venta: Venta, corte_id:str, is_deuda:bool,  token: str = D
         corte_oid = ObjectId(corte_id)
     except Exception:
         raise HTTPException(status_code=400, detail="ID de corte invalido")
-    if not db_client.pbstation.cortes.find_one({"_id": corte_oid}):
+    if not await db_client.pbstation.cortes.find_one({"_id": corte_oid}):
         raise HTTPException(status_code=404, detail="Corte no encontrado")
 
     venta_dict = venta.model_dump()
     #generacion de folio
     if not venta_dict.get("folio"):
-        venta_dict["folio"] = generar_folio_venta(db_client.pbstation, venta.sucursal_id)
+        venta_dict["folio"] = await generar_folio_venta(db_client.pbstation, venta.sucursal_id)
     venta_dict["detalles"] = [d.model_dump() for d in venta.detalles]
     del venta_dict["id"] #quitar el id para que no se guarde como null
     venta_dict["subtotal"] = Decimal128(venta_dict["subtotal"])
@@ -273,15 +328,16 @@ async def pagar_venta(venta: Venta, corte_id:str, is_deuda:bool,  token: str = D
         detalle["total"] = Decimal128(detalle["total"])
         if detalle.get("cotizacion_precio") is not None:
             detalle["cotizacion_precio"] = Decimal128(detalle["cotizacion_precio"])
-    id = db_client.pbstation.ventas.insert_one(venta_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    result = db_client.pbstation.cortes.update_one(
+    id = (await db_client.pbstation.ventas.insert_one(venta_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    result = await db_client.pbstation.cortes.update_one(
         {"_id": corte_oid},
         {"$push": {"ventas_ids": id}}
     )
     if result.modified_count == 0:
-        db_client.pbstation.ventas.delete_one({"_id": id})
+        await db_client.pbstation.ventas.delete_one({"_id": id})
         raise HTTPException(status_code=500, detail="No se pudo vincular la venta al corte")
-    nueva_venta = venta_schema(db_client.pbstation.ventas.find_one({"_id":id}))
+    await _actualizar_reportes(None, venta_dict)
+    nueva_venta = venta_schema(await db_client.pbstation.ventas.find_one({"_id":id}))
     if is_deuda: # si es deuda, notificar a los demas
         await manager.broadcast(
             f"delete-venta-deuda:{str(ObjectId(venta.id))}",
@@ -296,20 +352,21 @@ async def marcar_deuda_pagada(venta_id: str, token: str = Depends(validar_token)
     except Exception:
         raise HTTPException(status_code=400, detail="ID de venta inválido")
     try:
-        # Actualizar la venta
-        db_client.pbstation.ventas.update_one(
+        # Actualizar la venta (el estado anterior es para los acumulados de reportes)
+        venta_anterior = await db_client.pbstation.ventas.find_one_and_update(
             {"_id": venta_oid},
-            {"$set": {"liquidado": True}}
+            {"$set": {"liquidado": True}},
+            return_document=ReturnDocument.BEFORE
         )
-        # Obtener y retornar la venta actualizada
-        venta_actualizada = db_client.pbstation.ventas.find_one({"_id": venta_oid})
-        
-        if not venta_actualizada:
+        if not venta_anterior:
             raise HTTPException(status_code=404, detail="Venta no encontrada")
+        venta_actualizada = {**venta_anterior, "liquidado": True}
+        await _actualizar_reportes(venta_anterior, venta_actualizada)
         
         await manager.broadcast(
             f"update-venta:{str(venta_oid)}",
-            exclude_connection_id=x_connection_id
+            exclude_connection_id=x_connection_id,
+            cambios={"liquidado": True}
         )
 
         return Venta(**venta_schema(venta_actualizada))
@@ -340,7 +397,7 @@ async def cancelar_venta(
     
     try:
         # Verificar que la venta existe
-        venta_existente = db_client.pbstation.ventas.find_one({"_id": venta_oid})
+        venta_existente = await db_client.pbstation.ventas.find_one({"_id": venta_oid})
         if not venta_existente:
             raise HTTPException(status_code=404, detail="Venta no encontrada")
         
@@ -375,45 +432,52 @@ async def cancelar_venta(
             cliente_id = venta_existente.get("cliente_id")
             
             if cliente_id:
-                # Convertir a ObjectId si es necesario
                 try:
-                    cliente_oid = ObjectId(cliente_id) if not isinstance(cliente_id, ObjectId) else cliente_id
+                    # Eliminar el adeudo de la venta (y restarlo del resumen del cliente)
+                    adeudo = await quitar_adeudo(cliente_id, venta_oid)
                     
-                    # Verificar que el cliente existe
-                    cliente_existente = db_client.pbstation.clientes.find_one({"_id": cliente_oid})
-                    if cliente_existente:
-                        # Eliminar el adeudo del cliente usando $pull
-                        result = db_client.pbstation.clientes.update_one(
-                            {"_id": cliente_oid},
-                            {"$pull": {"adeudos": {"venta_id": str(venta_oid)}}}
+                    # Si se eliminó el adeudo, notificar por WebSocket
+                    if adeudo is not None:
+                        await registrar_cambio("clientes", cliente_id)
+                        # El cliente actualizado para el protocolo 2 (como PUT /clientes/)
+                        cliente = await db_client.pbstation.clientes.find_one({"_id": ObjectId(cliente_id)})
+                        cliente_actualizado = None
+                        if cliente is not None:
+                            cliente_actualizado = Cliente(**{
+                                **cliente_schema(cliente),
+                                "adeudos": adeudos_schema(await adeudos_de_cliente(cliente_id)),
+                            })
+                        await manager.broadcast(
+                            f"put-cliente:{str(cliente_id)}",
+                            exclude_connection_id=x_connection_id,
+                            datos=cliente_actualizado
                         )
-                        
-                        # Si se eliminó el adeudo, notificar por WebSocket
-                        if result.modified_count > 0:
-                            await manager.broadcast(
-                                f"put-cliente:{str(cliente_oid)}",
-                                exclude_connection_id=x_connection_id
-                            )
                 except Exception as e:
                     # Si hay error al procesar el cliente, continuar con la cancelación de la venta
                     print(f"Advertencia: No se pudo eliminar el adeudo del cliente: {str(e)}")
         
-        # Actualizar la venta
-        db_client.pbstation.ventas.update_one(
-            {"_id": venta_oid},
-            {"$set": update_fields}
+        # Actualizar la venta; el filtro evita cancelarla (y descontarla) dos veces
+        venta_anterior = await db_client.pbstation.ventas.find_one_and_update(
+            {"_id": venta_oid, "cancelado": {"$ne": True}},
+            {"$set": update_fields},
+            return_document=ReturnDocument.BEFORE
         )
+        if not venta_anterior:
+            raise HTTPException(status_code=400, detail="La venta ya está cancelada")
+        venta_actualizada = {**venta_anterior, **update_fields}
+        await _actualizar_reportes(venta_anterior, venta_actualizada)
         
-        # Obtener y retornar la venta actualizada
-        venta_actualizada = db_client.pbstation.ventas.find_one({"_id": venta_oid})
+        venta_modelo = Venta(**venta_schema(venta_actualizada))
         
         # Notificar por WebSocket la actualización de la venta
         await manager.broadcast(
             f"update-venta:{str(venta_oid)}",
-            exclude_connection_id=x_connection_id
+            exclude_connection_id=x_connection_id,
+            datos=venta_modelo,
+            anterior=Venta(**venta_schema(venta_existente))
         )
         
-        return Venta(**venta_schema(venta_actualizada))
+        return venta_modelo
         
     except HTTPException:
         raise
@@ -491,7 +555,7 @@ async def actualizar_factura_ventas_bulk(
     try:
         # Actualizar todas las ventas que coincidan con los folios (MUY EFICIENTE)
         # Esto actualizará TODAS las ventas que tengan esos folios, incluso si hay duplicados
-        result = db_client.pbstation.ventas.update_many(
+        result = await db_client.pbstation.ventas.update_many(
             {"folio": {"$in": request.folios}},
             {"$set": {"factura_id": request.factura_id.strip()}}
         )
@@ -507,10 +571,11 @@ async def actualizar_factura_ventas_bulk(
         )
         
         # Notificar por WebSocket para cada venta actualizada
-        for venta in ventas_actualizadas:
+        async for venta in ventas_actualizadas:
             await manager.broadcast(
                 f"update-venta:{str(venta['_id'])}",
-                exclude_connection_id=x_connection_id
+                exclude_connection_id=x_connection_id,
+                cambios={"factura_id": request.factura_id.strip()}
             )
         
         return {
@@ -533,7 +598,7 @@ async def actualizar_factura_ventas_bulk(
 async def buscar_venta_por_folio(folio: str, token: str = Depends(validar_token)):
     try:
         # Buscar solo ventas liquidadas con el folio especificado
-        venta = db_client.pbstation.ventas.find_one({
+        venta = await db_client.pbstation.ventas.find_one({
             "folio": folio.upper()
             #"liquidado": True
         })
@@ -554,9 +619,9 @@ async def buscar_venta_por_folio(folio: str, token: str = Depends(validar_token)
             detail=f"Error al buscar la venta por folio: {str(e)}"
         )
 
-def search_venta(field: str, key):
+async def search_venta(field: str, key):
     try:
-        venta = db_client.pbstation.ventas.find_one({field: key})
+        venta = await db_client.pbstation.ventas.find_one({field: key})
         if not venta:  # Verificar si no se encontró la venta
             return None
         return Venta(**venta_schema(venta))  # el ** sirve para pasar los valores del diccionario
@@ -587,7 +652,7 @@ async def obtener_ventas_liquidadas_sin_factura_por_dia(
         }).sort("fecha_venta", DESCENDING)
         
         ventas = []
-        for venta in ventas_cursor:
+        async for venta in ventas_cursor:
             ventas.append(Venta(**venta_schema(venta)))
         
         return ventas
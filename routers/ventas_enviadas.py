@@ -13,12 +13,12 @@ router = APIRouter(prefix="/ventas_enviadas", tags=["ventas_enviadas"])
 
 @router.get("/all", response_model=list[VentaEnviada])
 async def obtener_ventas(token: str = Depends(validar_token)):
-    return ventas_enviadas_schema(db_client.pbstation.ventas_enviadas.find())
+    return ventas_enviadas_schema(await db_client.pbstation.ventas_enviadas.find().to_list())
 
 @router.get("/{id}")
 async def obtener_venta(id: str, token: str = Depends(validar_token)):
     try:
-        venta = search_venta("_id", ObjectId(id))
+        venta = await search_venta("_id", ObjectId(id))
         if venta is None:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         return venta
@@ -43,8 +43,8 @@ async def crear_venta(venta: VentaEnviada, token: str = Depends(validar_token),
         if detalle.get("cotizacion_precio") is not None:
             detalle["cotizacion_precio"] = Decimal128(detalle["cotizacion_precio"])
         detalle.pop("id", None)  # ✅ eliminar el duplicado
-    id = db_client.pbstation.ventas_enviadas.insert_one(venta_dict).inserted_id #mongodb crea automaticamente el id como "_id"
-    nueva_venta = venta_enviada_schema(db_client.pbstation.ventas_enviadas.find_one({"_id":id}))
+    id = (await db_client.pbstation.ventas_enviadas.insert_one(venta_dict)).inserted_id #mongodb crea automaticamente el id como "_id"
+    nueva_venta = venta_enviada_schema(await db_client.pbstation.ventas_enviadas.find_one({"_id":id}))
     await manager.broadcast_to_sucursal(
         message=f"ventaenviada:{str(venta_dict['sucursal_id'])}",
         sucursal_id=str(venta_dict['sucursal_id']),
@@ -54,7 +54,7 @@ async def crear_venta(venta: VentaEnviada, token: str = Depends(validar_token),
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT) #delete path
 async def detele_venta(id: str, sucursal: str, token: str = Depends(validar_token), x_connection_id: Optional[str] = Header(None)):
-     found = db_client.pbstation.ventas_enviadas.find_one_and_delete({"_id": ObjectId(id)})
+     found = await db_client.pbstation.ventas_enviadas.find_one_and_delete({"_id": ObjectId(id)})
      if not found:
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontro la venta')
      else:
@@ -65,9 +65,9 @@ async def detele_venta(id: str, sucursal: str, token: str = Depends(validar_toke
         )
          return {'message':'Eliminada con exito'} 
      
-def search_venta(field: str, key):
+async def search_venta(field: str, key):
     try:
-        venta = db_client.pbstation.ventas_enviadas.find_one({field: key})
+        venta = await db_client.pbstation.ventas_enviadas.find_one({field: key})
         if not venta:  # Verificar si no se encontró la venta
             return None
         return VentaEnviada(**venta_enviada_schema(venta))  # el ** sirve para pasar los valores del diccionario
@@ -1,30 +1,54 @@
 from core.websocket_manager import ConnectionManager
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
 from typing import Optional
-from validar_token import decodificar_jwt
+from validar_token import EVENTO_INVALIDAR_SESIONES, decodificar_jwt, registrar_invalidacion_sesiones
 from core.database import db_client
+from core.metricas import registro, ws_conexiones
+from core.catalogo_productos import catalogo_productos
+from core.cache_reportes import EVENTO_INVALIDAR, cache_reportes
 
 # WebSocket manager
 manager = ConnectionManager()
+# Los cambios de productos (de este u otro worker) se releen en el catalogo en memoria
+manager.observadores.append(catalogo_productos.registrar_mensaje)
+# Los reportes cacheados se tiran cuando cambian sus ventas o los nombres que muestran
+manager.observadores.append(cache_reportes.registrar_mensaje)
+manager.observadores_internos.setdefault(EVENTO_INVALIDAR, []).append(cache_reportes.registrar_evento)
+# Sesiones revocadas y usuarios editados/desactivados en cualquier worker
+manager.observadores_internos.setdefault(EVENTO_INVALIDAR_SESIONES, []).append(registrar_invalidacion_sesiones)
+
+
+def _recolectar_conexiones_ws():
+    por_sucursal = {(s,): len(c) for s, c in manager.sucursal_connections.items()}
+    sin_sucursal = len(manager.active_connections) - sum(por_sucursal.values())
+    if sin_sucursal:
+        por_sucursal[("(sin sucursal)",)] = sin_sucursal
+    ws_conexiones.reemplazar(por_sucursal)
+
+
+registro.agregar_recolector(_recolectar_conexiones_ws)
 
 router = APIRouter()
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, sucursal_id: Optional[str] = Query(None), token: Optional[str] = Query(None)):
-    if not _validar_ws_token(token):
+async def websocket_endpoint(websocket: WebSocket, sucursal_id: Optional[str] = Query(None), token: Optional[str] = Query(None), protocolo: int = Query(1), temas: Optional[str] = Query(None), ultimo_seq: Optional[int] = Query(None), epoca: Optional[str] = Query(None)):
+    if not await _validar_ws_token(token):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
     # Conectar y obtener el connection_id único generado por el manager
-    connection_id = await manager.connect(websocket, sucursal_id)
+    connection_id = await manager.connect(websocket, sucursal_id, protocolo, _parsear_temas(temas))
     
     try:
         # IMPORTANTE: Enviar el connection_id al cliente inmediatamente
-        await manager.send_personal_message(f"connection_id:{connection_id}", websocket)
+        await manager.send_personal_message(manager.mensaje_connection_id(connection_id, protocolo), websocket)
+        # Protocolo 2: reenviar lo que se perdió desde ultimo_seq (o pedir resync)
+        manager.reanudar(websocket, ultimo_seq, epoca)
         
         while True:
             data = await websocket.receive_text()
+            manager.registrar_actividad(websocket, data)
             # Aquí puedes manejar mensajes entrantes si quieres (opcional)
-            if data != 'ping':
+            if data not in ('ping', 'pong'):
                 print(f"Mensaje recibido de cliente {connection_id} {'(sucursal ' + sucursal_id + ')' if sucursal_id else '(sin sucursal)'}: {data}")
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -32,31 +56,38 @@ async def websocket_endpoint(websocket: WebSocket, sucursal_id: Optional[str] =
 
 # Endpoint alternativo con sucursal en la ruta (opcional)
 @router.websocket("/ws/{sucursal_id}")
-async def websocket_endpoint_with_sucursal(websocket: WebSocket, sucursal_id: str, token: Optional[str] = Query(None)):
-    if not _validar_ws_token(token):
+async def websocket_endpoint_with_sucursal(websocket: WebSocket, sucursal_id: str, token: Optional[str] = Query(None), protocolo: int = Query(1), temas: Optional[str] = Query(None), ultimo_seq: Optional[int] = Query(None), epoca: Optional[str] = Query(None)):
+    if not await _validar_ws_token(token):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
     # Conectar y obtener el connection_id único generado por el manager
-    connection_id = await manager.connect(websocket, sucursal_id)
+    connection_id = await manager.connect(websocket, sucursal_id, protocolo, _parsear_temas(temas))
     
     try:
         # IMPORTANTE: Enviar el connection_id al cliente inmediatamente
-        await manager.send_personal_message(f"connection_id:{connection_id}", websocket)
+        await manager.send_personal_message(manager.mensaje_connection_id(connection_id, protocolo), websocket)
+        # Protocolo 2: reenviar lo que se perdió desde ultimo_seq (o pedir resync)
+        manager.reanudar(websocket, ultimo_seq, epoca)
         
         while True:
             data = await websocket.receive_text()
-            if data != 'ping':
+            manager.registrar_actividad(websocket, data)
+            if data not in ('ping', 'pong'):
                 print(f"Mensaje recibido de cliente {connection_id} (sucursal {sucursal_id}): {data}")
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         print(f"Cliente {connection_id} desconectado de sucursal {sucursal_id}")
 
-def _validar_ws_token(token: Optional[str]) -> bool:
+def _parsear_temas(temas: Optional[str]) -> list[str]:
+    """`?temas=cliente,pedido,venta:<id>` -> lista de temas (vacía = todos)."""
+    return [t for t in (temas or "").split(",") if t.strip()]
+
+async def _validar_ws_token(token: Optional[str]) -> bool:
     if not token:
         return False
     try:
         payload = decodificar_jwt(token)
-        session = db_client.pbstation.sesiones.find_one({"session_id": payload.get("sid")})
+        session = await db_client.pbstation.sesiones.find_one({"session_id": payload.get("sid")})
         return bool(session and not session.get("revoked"))
     except Exception:
         return False
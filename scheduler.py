@@ -1,6 +1,7 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from core.database import db_client
+from core.database import con_reintentos, db_client
 from core.pedidos_archivos import limpiar_archivos_huerfanos
+from core.metricas import medir_job
 from datetime import datetime
 from pytz import timezone
 from routers.websocket import manager
@@ -8,6 +9,7 @@ from routers.websocket import manager
 # Conexión a tu base de datos MongoDB
 db = db_client.pbstation
 
+@medir_job("verificar_cotizaciones_vencidas")
 async def verificar_cotizaciones_vencidas():
     print("Verificando cotizaciones vencidas...")
     zona = timezone("America/Hermosillo")
@@ -18,13 +20,14 @@ async def verificar_cotizaciones_vencidas():
     cotizaciones = db.cotizaciones.find({"vigente": True})
 
     vencidas = []
-    for c in cotizaciones:
+    async for c in cotizaciones:
         fecha = c["fecha_cotizacion"]
         if fecha < inicio_mes:
             vencidas.append(c["_id"])
 
     if vencidas:
-        db.cotizaciones.update_many(
+        await con_reintentos(
+            db.cotizaciones.update_many,
             {"_id": {"$in": vencidas}},
             {"$set": {"vigente": False}}
         )
@@ -32,9 +35,10 @@ async def verificar_cotizaciones_vencidas():
         print(f"Actualizadas {len(vencidas)} cotizaciones como vencidas")
 
 
+@medir_job("limpiar_uploads_huerfanos")
 async def limpiar_uploads_huerfanos():
     print("Limpiando archivos huerfanos de pedidos...")
-    resultado = limpiar_archivos_huerfanos(db)
+    resultado = await limpiar_archivos_huerfanos(db)
     print(
         "Limpieza de uploads completada: "
         f"{resultado['archivos_eliminados']} archivos, "
@@ -15,11 +15,30 @@ def cliente_schema(cliente) -> dict:
         "no_int":cliente["no_int"],
         "colonia":cliente["colonia"],
         "localidad":cliente["localidad"],
-        "adeudos": adeudos_schema(cliente["adeudos"]) if "adeudos" in cliente else [],
+        # Esquema anterior embebia la lista; ahora solo llega si se pide (core.adeudos)
+        "adeudos": adeudos_schema(cliente["adeudos"]) if "adeudos" in cliente else None,
+        "adeudo_total": float(cliente["adeudo_total"].to_decimal()) if "adeudo_total" in cliente else 0.0,
+        "num_adeudos": cliente.get("num_adeudos", 0),
         "protegido": cliente.get("protegido", False),
         "frecuente": cliente.get("frecuente", False),
         "activo": cliente.get("activo", True)
     }
 
 def clientes_schema(clientes) -> list:
-    return [cliente_schema(cliente) for cliente in clientes]
\ No newline at end of file
+    return [cliente_schema(cliente) for cliente in clientes]
+
+# Campos que trae /clientes/buscar; se usa tambien como proyeccion de la consulta
+CAMPOS_RESUMEN = ("nombre", "correo", "telefono", "razon_social", "rfc", "adeudo_total", "frecuente", "activo")
+
+def cliente_resumen_schema(cliente) -> dict:
+    return {
+        "id": str(cliente["_id"]),
+        "nombre": cliente["nombre"],
+        "correo": cliente.get("correo"),
+        "telefono": cliente.get("telefono"),
+        "razon_social": cliente.get("razon_social"),
+        "rfc": cliente.get("rfc"),
+        "adeudo_total": float(cliente["adeudo_total"].to_decimal()) if "adeudo_total" in cliente else 0.0,
+        "frecuente": cliente.get("frecuente", False),
+        "activo": cliente.get("activo", True),
+    }
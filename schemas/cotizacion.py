@@ -18,4 +18,27 @@ def cotizacion_schema(cotizacion) -> dict:
     }
 
 def cotizaciones_schema(cotizaciones) -> list:
-    return [cotizacion_schema(cotizacion) for cotizacion in cotizaciones]
\ No newline at end of file
+    return [cotizacion_schema(cotizacion) for cotizacion in cotizaciones]
+
+# Campos que lee /cotizaciones/lista sin detalles (proyeccion de Mongo)
+CAMPOS_RESUMEN = ("folio", "cliente_id", "usuario_id", "sucursal_id", "fecha_cotizacion", "comentarios_venta",
+                  "subtotal", "descuento", "iva", "total", "vigente")
+
+def cotizacion_resumen_schema(cotizacion) -> dict:
+    return {
+        "id": str(cotizacion["_id"]),
+        "folio": cotizacion.get("folio"),
+        "cliente_id": cotizacion["cliente_id"],
+        "usuario_id": cotizacion["usuario_id"],
+        "sucursal_id": cotizacion["sucursal_id"],
+        "fecha_cotizacion": cotizacion["fecha_cotizacion"],
+        "comentarios_venta": cotizacion.get("comentarios_venta"),
+        "subtotal": float(cotizacion["subtotal"].to_decimal()),
+        "descuento": float(cotizacion["descuento"].to_decimal()),
+        "iva": float(cotizacion["iva"].to_decimal()),
+        "total": float(cotizacion["total"].to_decimal()),
+        "vigente": cotizacion["vigente"]
+    }
+
+def cotizaciones_resumen_schema(cotizaciones) -> list:
+    return [cotizacion_resumen_schema(cotizacion) for cotizacion in cotizaciones]
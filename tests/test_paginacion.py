@@ -0,0 +1,139 @@
+"""
+Pruebas de core.paginacion: cursores y filtro `despues` sin Mongo.
+
+_cumple() evalua los filtros que arma filtro_despues con las reglas de Mongo
+que importan aqui: un campo faltante es null, $lt/$gt no comparan null con
+valores y, al ordenar, null va antes que cualquier valor.
+"""
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+from core.paginacion import codificar_cursor, decodificar_cursor, filtro_despues
+
+
+def _cumple(documento: dict, filtro: dict) -> bool:
+    for clave, condicion in filtro.items():
+        if clave == "$or":
+            if not any(_cumple(documento, f) for f in condicion):
+                return False
+            continue
+        if clave == "$and":
+            if not all(_cumple(documento, f) for f in condicion):
+                return False
+            continue
+        valor = documento.get(clave)
+        if not isinstance(condicion, dict):
+            if valor != condicion:
+                return False
+            continue
+        for operador, referencia in condicion.items():
+            if operador == "$ne":
+                cumple = valor != referencia
+            elif valor is None or referencia is None:
+                cumple = False
+            elif operador == "$lt":
+                cumple = valor < referencia
+            else:
+                cumple = valor > referencia
+            if not cumple:
+                return False
+    return True
+
+
+def _ordenar(documentos: list[dict], campo: str, direccion: int) -> list[dict]:
+    def clave(d):
+        return (d.get(campo) is not None, d.get(campo) or 0, d["_id"])
+    return sorted(documentos, key=clave, reverse=direccion == DESCENDING)
+
+
+def _recorrer(documentos: list[dict], campo: str, direccion: int, tamano: int) -> list:
+    """Ids en el orden en que salen pagina por pagina, como paginar()."""
+    ordenados = _ordenar(documentos, campo, direccion)
+    vistos, cursor = [], None
+    while True:
+        candidatos = ordenados
+        if cursor is not None:
+            posicion = decodificar_cursor(cursor, campo)
+            condicion = filtro_despues(campo, posicion, direccion)
+            candidatos = [d for d in ordenados if _cumple(d, condicion)]
+        pagina = candidatos[:tamano]
+        vistos.extend(d["_id"] for d in pagina)
+        if len(candidatos) <= tamano:
+            return vistos
+        cursor = codificar_cursor(campo, pagina[-1])
+
+
+DOCUMENTOS = [
+    {"_id": 1, "fecha": 30},
+    {"_id": 2, "fecha": None},
+    {"_id": 3, "fecha": 10},
+    {"_id": 4},
+    {"_id": 5, "fecha": 30},
+    {"_id": 6, "fecha": 20},
+    {"_id": 7, "fecha": None},
+    {"_id": 8, "fecha": 30},
+]
+
+
+@pytest.mark.parametrize("direccion", [DESCENDING, ASCENDING])
+@pytest.mark.parametrize("tamano", [1, 2, 3])
+def test_recorrido_con_nulos_y_empates(direccion, tamano):
+    esperado = [d["_id"] for d in _ordenar(DOCUMENTOS, "fecha", direccion)]
+    assert _recorrer(DOCUMENTOS, "fecha", direccion, tamano) == esperado
+
+
+def test_nulos_al_final_en_descendente():
+    condicion = filtro_despues("fecha", [10, 3], DESCENDING)
+    assert sorted(d["_id"] for d in DOCUMENTOS if _cumple(d, condicion)) == [2, 4, 7]
+
+
+def test_nulos_al_principio_en_ascendente():
+    condicion = filtro_despues("fecha", [None, 4], ASCENDING)
+    assert sorted(d["_id"] for d in DOCUMENTOS if _cumple(d, condicion)) == [1, 3, 5, 6, 7, 8]
+
+
+@pytest.mark.parametrize("direccion,esperados", [(DESCENDING, [1, 2, 3, 4, 6, 7]), (ASCENDING, [8])])
+def test_desempate_por_id(direccion, esperados):
+    condicion = filtro_despues("fecha", [30, 5], direccion)
+    assert sorted(d["_id"] for d in DOCUMENTOS if _cumple(d, condicion)) == esperados
+
+
+def test_orden_por_id():
+    assert filtro_despues("_id", [5], DESCENDING) == {"_id": {"$lt": 5}}
+    assert filtro_despues("_id", [5], ASCENDING) == {"_id": {"$gt": 5}}
+
+
+def test_cursor_conserva_tipos_bson():
+    documento = {"_id": ObjectId(), "fecha_entregado": datetime(2026, 1, 2, 3, 4, 5)}
+    cursor = codificar_cursor("fecha_entregado", documento)
+    assert decodificar_cursor(cursor, "fecha_entregado") == [documento["fecha_entregado"], documento["_id"]]
+    sin_valor = {"_id": documento["_id"]}
+    assert decodificar_cursor(codificar_cursor("fecha_entregado", sin_valor), "fecha_entregado") == [None, sin_valor["_id"]]
+
+
+@pytest.mark.parametrize("campo_cursor,campo_listado", [
+    ("fecha", "fecha_entregado"),
+    ("_id", "fecha"),
+    ("fecha", "_id"),
+])
+def test_rechaza_cursor_de_otro_listado(campo_cursor, campo_listado):
+    cursor = codificar_cursor(campo_cursor, {"_id": ObjectId(), "fecha": 1})
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor, campo_listado)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", [
+    "%%%",
+    base64.urlsafe_b64encode(b"no es json").decode("ascii"),
+    base64.urlsafe_b64encode(b'{"campo": "fecha"}').decode("ascii"),
+])
+def test_rechaza_cursor_corrupto(cursor):
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor, "fecha")
+    assert error.value.status_code == 400
@@ -13,7 +13,8 @@ from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from core.database import db_client
+from core.cache import TTLCache
+from core.database import con_reintentos, db_client
 from schemas.usuario import usuario_public_schema
 
 dotenv_path = os.path.join(os.path.dirname(__file__), "config.env")
@@ -29,6 +30,17 @@ JWT_ALGORITHM = "HS256"
 SESSION_HOURS = 12
 PERMISSION_LEVELS = {"normal": 1, "elevado": 2, "admin": 3}
 
+# Cache de sesiones validadas: session_id -> (sesion, usuario).
+# Revocar una sesión o editar/desactivar un usuario publica EVENTO_INVALIDAR_SESIONES
+# por el backplane y cada worker tira sus entradas; el TTL acota solo los
+# cambios hechos a mano en la base.
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", 2000))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+EVENTO_INVALIDAR_SESIONES = "invalidar-sesiones"
+_sesiones_cache = TTLCache(AUTH_CACHE_MAX, AUTH_CACHE_TTL)
+# Sube con cada invalidación: una validación que leyó la base antes no se guarda
+_generacion_cache = 0
+
 security = HTTPBearer(auto_error=False)
 
 
@@ -89,13 +101,13 @@ def decodificar_jwt(token: str) -> dict:
     return payload
 
 
-def crear_sesion(usuario: dict) -> dict:
+async def crear_sesion(usuario: dict) -> dict:
     now = _utc_now()
     expires_at = now + timedelta(hours=SESSION_HOURS)
     session_id = secrets.token_urlsafe(32)
     user_id = str(usuario["_id"])
 
-    db_client.pbstation.sesiones.insert_one(
+    await db_client.pbstation.sesiones.insert_one(
         {
             "session_id": session_id,
             "user_id": user_id,
@@ -122,18 +134,57 @@ def crear_sesion(usuario: dict) -> dict:
     }
 
 
-def revocar_sesion(session_id: str) -> None:
-    db_client.pbstation.sesiones.update_one(
+async def revocar_sesion(session_id: str) -> None:
+    _quitar_de_cache(session_ids=[session_id])
+    await db_client.pbstation.sesiones.update_one(
         {"session_id": session_id},
         {"$set": {"revoked": True, "revoked_at": _naive_utc(_utc_now())}},
     )
+    await _avisar_workers({"session_ids": [session_id]})
 
 
-def revocar_sesiones_usuario(user_id: str) -> None:
-    db_client.pbstation.sesiones.update_many(
+async def revocar_sesiones_usuario(user_id: str) -> None:
+    _quitar_de_cache(user_ids=[str(user_id)])
+    await db_client.pbstation.sesiones.update_many(
         {"user_id": user_id, "revoked": False},
         {"$set": {"revoked": True, "revoked_at": _naive_utc(_utc_now())}},
     )
+    await _avisar_workers({"user_ids": [str(user_id)]})
+
+
+async def invalidar_usuario_cache(user_id: str) -> None:
+    """Elimina de la cache de todos los workers las sesiones del usuario (tras editarlo o desactivarlo)."""
+    _quitar_de_cache(user_ids=[str(user_id)])
+    await _avisar_workers({"user_ids": [str(user_id)]})
+
+
+def _quitar_de_cache(session_ids=(), user_ids=()) -> None:
+    global _generacion_cache
+    _generacion_cache += 1
+    for session_id in session_ids:
+        _sesiones_cache.pop(session_id)
+    if user_ids:
+        for session_id, (session, _) in _sesiones_cache.items():
+            if session.get("user_id") in user_ids:
+                _sesiones_cache.pop(session_id)
+
+
+async def _avisar_workers(datos: dict) -> None:
+    # Import diferido: routers.websocket importa este modulo
+    from routers.websocket import manager
+    try:
+        await manager.publicar_interno(EVENTO_INVALIDAR_SESIONES, datos)
+    except Exception as e:
+        print(f"[ERROR] No se pudo publicar la invalidacion de sesiones: {e}")
+
+
+def registrar_invalidacion_sesiones(datos: dict) -> None:
+    """Observador interno del ConnectionManager para EVENTO_INVALIDAR_SESIONES."""
+    _quitar_de_cache(datos.get("session_ids") or (), datos.get("user_ids") or ())
+
+
+def estadisticas_cache_sesiones() -> dict:
+    return _sesiones_cache.stats()
 
 
 def _auth_error(code: str, message: str) -> HTTPException:
@@ -144,7 +195,7 @@ def _auth_error(code: str, message: str) -> HTTPException:
     )
 
 
-def validar_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def validar_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     if credentials is None or credentials.scheme.lower() != "bearer":
         raise _auth_error("TOKEN_MISSING", "Token requerido")
 
@@ -154,22 +205,34 @@ def validar_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     if not user_id or not session_id:
         raise _auth_error("TOKEN_INVALID", "Token incompleto")
 
-    session = db_client.pbstation.sesiones.find_one({"session_id": session_id})
+    generacion = _generacion_cache
+    cached = _sesiones_cache.get(session_id)
+    if cached is not None:
+        session, usuario = cached
+    else:
+        session = await con_reintentos(db_client.pbstation.sesiones.find_one, {"session_id": session_id})
+        usuario = None
+
     if not session or session.get("revoked"):
         raise _auth_error("SESSION_REVOKED", "Sesion revocada")
 
     expires_at = session.get("expires_at")
     if expires_at and datetime.utcnow() > expires_at:
-        revocar_sesion(session_id)
+        await revocar_sesion(session_id)
         raise _auth_error("TOKEN_EXPIRED", "Sesion expirada")
 
-    try:
-        usuario = db_client.pbstation.usuarios.find_one({"_id": ObjectId(user_id)})
-    except InvalidId:
-        raise _auth_error("TOKEN_INVALID", "Usuario invalido")
-    if not usuario or not usuario.get("activo", True):
-        raise _auth_error("USER_INACTIVE", "Usuario inactivo")
-
+    if usuario is None:
+        try:
+            usuario = await con_reintentos(db_client.pbstation.usuarios.find_one, {"_id": ObjectId(user_id)})
+        except InvalidId:
+            raise _auth_error("TOKEN_INVALID", "Usuario invalido")
+        if not usuario or not usuario.get("activo", True):
+            raise _auth_error("USER_INACTIVE", "Usuario inactivo")
+        if generacion == _generacion_cache:
+            _sesiones_cache.set(session_id, (session, usuario))
+
+    # Copia para que los endpoints no modifiquen el documento cacheado
+    usuario = dict(usuario)
     usuario["session_id"] = session_id
     return usuario
 
@@ -177,7 +240,7 @@ def validar_token(credentials: HTTPAuthorizationCredentials = Depends(security))
 def require_permission(required: str) -> Callable:
     required_level = PERMISSION_LEVELS[required]
 
-    def dependency(usuario: dict = Depends(validar_token)) -> dict:
+    async def dependency(usuario: dict = Depends(validar_token)) -> dict:
         current_level = PERMISSION_LEVELS.get(usuario.get("permisos", "normal"), 0)
         if current_level < required_level:
             raise HTTPException(